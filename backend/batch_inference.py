@@ -0,0 +1,145 @@
+# batch_inference.py
+
+import logging
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class _PendingBatch:
+    """Una richiesta in attesa: le righe da classificare e l'evento su cui attende il chiamante."""
+
+    __slots__ = ('rows', 'event', 'result', 'error')
+
+    def __init__(self, rows, event):
+        self.rows = rows
+        self.event = event
+        self.result = None
+        self.error = None
+
+
+class MicroBatcher:
+    """
+    Raccoglie i vettori di landmark che arrivano nello stesso momento da richieste diverse
+    e li classifica con un unico forward pass del modello.
+
+    Il batch parte quando si raggiungono `max_batch_size` righe oppure quando la richiesta
+    più vecchia ha atteso `max_wait_ms` millisecondi. Ogni chiamante riceve solo le proprie righe.
+
+    Le primitive di concorrenza sono iniettabili, così con Flask-SocketIO si possono passare
+    `socketio.start_background_task`, `socketio.sleep` e l'evento di engineio: sotto eventlet
+    il loop del batcher diventa un greenlet e non blocca l'hub.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=32, max_wait_ms=4,
+                 start_background_task=None, sleep=None, event_factory=None):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size deve essere almeno 1.")
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max(max_wait_ms, 0) / 1000.0
+
+        self._start_background_task = start_background_task or self._start_thread
+        self._sleep = sleep or time.sleep
+        self._event_factory = event_factory or threading.Event
+
+        self._lock = threading.Lock()
+        self._queue = []
+        self._queued_rows = 0
+        self._work = self._event_factory()
+        self._started = False
+
+        # Statistiche semplici per il logging / diagnostica
+        self.batches_run = 0
+        self.rows_run = 0
+
+    @staticmethod
+    def _start_thread(target):
+        thread = threading.Thread(target=target, name='micro-batcher', daemon=True)
+        thread.start()
+        return thread
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        self._start_background_task(self._loop)
+
+    def predict(self, rows):
+        """
+        Accoda le righe (array 2D o lista di vettori) e attende le probabilità corrispondenti.
+        Ritorna un array numpy con una riga di output per ogni riga in input.
+        """
+        rows = np.asarray(rows, dtype=np.float32)
+        if rows.ndim == 1:
+            rows = rows.reshape(1, -1)
+        if len(rows) == 0:
+            return np.empty((0, 0), dtype=np.float32)
+
+        self._ensure_started()
+        request = _PendingBatch(rows, self._event_factory())
+        with self._lock:
+            self._queue.append(request)
+            self._queued_rows += len(rows)
+        self._work.set()
+
+        request.event.wait()
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def _take_batch(self):
+        """Estrae dalla coda richieste intere fino a riempire al massimo un batch."""
+        with self._lock:
+            batch = []
+            rows = 0
+            while self._queue:
+                next_request = self._queue[0]
+                if batch and rows + len(next_request.rows) > self.max_batch_size:
+                    break
+                batch.append(self._queue.pop(0))
+                rows += len(next_request.rows)
+            self._queued_rows -= rows
+            if not self._queue:
+                self._work.clear()
+            return batch
+
+    def _loop(self):
+        while True:
+            self._work.wait()
+
+            # Finestra di raccolta: si attende al più max_wait, uscendo prima se il batch è pieno
+            deadline = time.monotonic() + self.max_wait
+            while self._queued_rows < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._sleep(min(remaining, 0.001))
+
+            batch = self._take_batch()
+            if batch:
+                self._run_batch(batch)
+
+    def _run_batch(self, batch):
+        try:
+            input_batch = np.concatenate([r.rows for r in batch], axis=0)
+            output = np.asarray(self.predict_fn(input_batch))
+            self.batches_run += 1
+            self.rows_run += len(input_batch)
+
+            start = 0
+            for request in batch:
+                end = start + len(request.rows)
+                request.result = output[start:end]
+                start = end
+        except Exception as e:
+            logger.error(f"Errore nel batch di inferenza: {e}")
+            for request in batch:
+                request.error = e
+        finally:
+            for request in batch:
+                request.event.set()
@@ -0,0 +1,536 @@
+# benchmark.py
+#
+# Benchmark riproducibili dei percorsi caldi del backend, con risultati in JSON da confrontare
+# tra commit sulla stessa macchina (Linux, solo CPU):
+#   predict    /predict/ su un corpus fisso di JPEG di dimensioni e orientamenti EXIF diversi
+#              (più il solo decode, che non richiede MediaPipe)
+#   landmarks  landmark -> feature -> modello, come /predict-landmarks
+#   lobby      gestori Socket.IO delle lobby su Supabase in memoria (SUPABASE_FAKE)
+#   scarabeo   validazione e punteggio delle mosse su partite registrate (generate con seed fisso)
+#
+# Ogni suite gira in un processo separato, così il picco di RSS è quello della suite.
+#
+# Uso:
+#   python benchmark.py [--suite predict,landmarks,lobby,scarabeo] [--iterations 200]
+#                       [--images cartella_jpeg] [--output risultati.json] [--baseline vecchi.json]
+
+import argparse
+import json
+import math
+import os
+import platform as platform_module
+import random
+import resource
+import subprocess
+import sys
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+HAND_IMAGE = os.path.join(BACKEND_DIR, '..', 'assets', 'playing_hand.png')
+# Modello versionato nel repository, usato se quello configurato in backend.py non c'è
+FALLBACK_MODEL = 'model_trained_100_cell.h5'
+SUITES = ('predict', 'landmarks', 'lobby', 'scarabeo')
+
+# Dimensioni (larghezza x altezza, verticale) del corpus sintetico
+CORPUS_SIZES = ((240, 320), (480, 640), (720, 1280), (1080, 1920))
+# (orientamento EXIF, piattaforma): come le salvano le fotocamere dei telefoni
+CORPUS_ORIENTATIONS = ((1, 'ios'), (6, 'ios'), (3, 'ios'), (8, 'ios'), (1, 'android'))
+
+# Variabili d'ambiente che cambiano i risultati: salvate nel report per confrontare solo run omogenei
+CONFIG_ENV = ('MODEL_BACKEND', 'DETECTOR_MAX_SIDE', 'VISION_WORKERS', 'PREDICT_BATCH_SIZE',
+              'PREDICT_BATCH_WAIT_MS', 'HAND_TRACKER_POOL_SIZE', 'WORD_SOURCE', 'LOBBY_FLUSH_INTERVAL',
+              'BCRYPT_ROUNDS', 'USER_CACHE_TTL', 'LOBBY_FEED_TICK', 'SUPABASE_POOL_SIZE')
+
+
+# ------------------------------------------------------------ misure
+
+class Recorder:
+    """Latenze per caso (secondi), raccolte con `with recorder.time('caso'):`."""
+
+    def __init__(self):
+        self.samples = {}
+        self.extra = {}
+
+    @contextmanager
+    def time(self, case):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.samples.setdefault(case, []).append(time.perf_counter() - start)
+
+    def summary(self):
+        return {case: dict(summarize(values), **self.extra.get(case, {}))
+                for case, values in self.samples.items()}
+
+
+@contextmanager
+def _nothing():
+    # Al posto di recorder.time() durante il riscaldamento
+    yield
+
+
+def percentile(sorted_values, p):
+    """Percentile nearest-rank di una lista già ordinata."""
+    index = max(0, math.ceil(p / 100 * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+def summarize(values):
+    ordered = sorted(values)
+    total = sum(ordered)
+    return {
+        'n': len(ordered),
+        'throughput_per_s': round(len(ordered) / total, 2) if total > 0 else None,
+        'mean_ms': round(total / len(ordered) * 1000, 4),
+        'p50_ms': round(percentile(ordered, 50) * 1000, 4),
+        'p95_ms': round(percentile(ordered, 95) * 1000, 4),
+        'p99_ms': round(percentile(ordered, 99) * 1000, 4),
+        'max_ms': round(ordered[-1] * 1000, 4)
+    }
+
+
+def peak_rss_mb():
+    # ru_maxrss è in KiB su Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def _import_backend():
+    """Importa backend.py con Supabase in memoria e sottosistemi caricati al primo uso."""
+    os.environ['SUPABASE_FAKE'] = '1'
+    os.environ.setdefault('STARTUP_MODE', 'lazy')
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    os.chdir(BACKEND_DIR)
+    import backend
+    return backend
+
+
+def _select_model(backend, options):
+    """Imposta il modello da caricare (--model, quello di backend.py o FALLBACK_MODEL) e ne ritorna il percorso."""
+    path = options.get('model') or backend.model_path
+    if not options.get('model') and not os.path.exists(path):
+        path = FALLBACK_MODEL
+    backend.model_path = path
+    return path
+
+
+def _access_token(backend, user_id):
+    from flask_jwt_extended import create_access_token
+    with backend.app.app_context():
+        return create_access_token(identity=user_id)
+
+
+# ------------------------------------------------------------ corpus di immagini
+
+def _exif_segment(orientation):
+    """Segmento APP1 con il solo tag Orientation (TIFF little endian, un IFD con una voce)."""
+    tiff = (b'II*\x00' + (8).to_bytes(4, 'little') + (1).to_bytes(2, 'little')
+            + (0x0112).to_bytes(2, 'little') + (3).to_bytes(2, 'little') + (1).to_bytes(4, 'little')
+            + orientation.to_bytes(2, 'little') + b'\x00\x00' + (0).to_bytes(4, 'little'))
+    payload = b'Exif\x00\x00' + tiff
+    return b'\xff\xe1' + (len(payload) + 2).to_bytes(2, 'big') + payload
+
+
+def _stored_pixels(upright, orientation, platform):
+    """Pixel come li salva il telefono, dato il fotogramma dritto che il backend deve ricostruire."""
+    import cv2
+    if orientation == 6:
+        return cv2.rotate(upright, cv2.ROTATE_90_COUNTERCLOCKWISE)
+    if orientation == 8:
+        return cv2.rotate(upright, cv2.ROTATE_90_CLOCKWISE)
+    if orientation == 3:
+        return cv2.rotate(upright, cv2.ROTATE_180)
+    if platform == 'android':
+        # Android invia il fotogramma in orizzontale, il backend lo ruota in verticale
+        return cv2.rotate(upright, cv2.ROTATE_90_CLOCKWISE)
+    return upright
+
+
+def build_corpus(images_dir=None, platform='ios', seed=0):
+    """
+    Lista di (nome, bytes JPEG, piattaforma). Con `images_dir` usa i JPEG della cartella così come
+    sono; altrimenti genera il corpus sintetico dall'immagine della mano negli asset, con rumore
+    fisso (seed) perché la compressione somigli a quella di una fotocamera.
+    """
+    if images_dir:
+        names = sorted(n for n in os.listdir(images_dir) if n.lower().endswith(('.jpg', '.jpeg')))
+        corpus = []
+        for name in names:
+            with open(os.path.join(images_dir, name), 'rb') as f:
+                corpus.append((name, f.read(), platform))
+        if not corpus:
+            raise ValueError(f"Nessun JPEG in {images_dir}.")
+        return corpus
+
+    import cv2
+    source = cv2.imread(HAND_IMAGE, cv2.IMREAD_COLOR)
+    if source is None:
+        raise FileNotFoundError(f"Immagine della mano non trovata: {HAND_IMAGE}")
+    rng = np.random.default_rng(seed)
+    corpus = []
+    for width, height in CORPUS_SIZES:
+        upright = np.full((height, width, 3), 200, dtype=np.uint8)
+        side = min(width, height)
+        hand = cv2.resize(source, (side, side), interpolation=cv2.INTER_AREA)
+        top = (height - side) // 2
+        upright[top:top + side, :side] = hand
+        noise = rng.normal(0, 6, upright.shape)
+        upright = np.clip(upright + noise, 0, 255).astype(np.uint8)
+        for orientation, frame_platform in CORPUS_ORIENTATIONS:
+            ok, encoded = cv2.imencode('.jpg', _stored_pixels(upright, orientation, frame_platform),
+                                       [cv2.IMWRITE_JPEG_QUALITY, 85])
+            if not ok:
+                raise RuntimeError("Codifica JPEG non riuscita.")
+            data = encoded.tobytes()
+            if orientation != 1:
+                data = data[:2] + _exif_segment(orientation) + data[2:]
+            corpus.append((f"{width}x{height}/exif{orientation}/{frame_platform}", data, frame_platform))
+    return corpus
+
+
+# ------------------------------------------------------------ suite
+
+def bench_predict(options):
+    backend = _import_backend()
+    from vision_pipeline import correct_image_orientation
+    model_path = _select_model(backend, options)
+    backend.subsystems.get('opencv')
+    backend.subsystems.get('model')
+
+    corpus = build_corpus(options.get('images'), options.get('platform', 'ios'), options['seed'])
+    iterations, warmup = options['iterations'], options['warmup']
+    recorder = Recorder()
+    report = {'model': model_path, 'corpus': [{'name': name, 'bytes': len(data)} for name, data, _ in corpus]}
+
+    for name, data, platform in corpus:
+        for i in range(warmup + iterations):
+            if i < warmup:
+                correct_image_orientation(data, platform, backend.DETECTOR_MAX_SIDE)
+                continue
+            with recorder.time(f"decode/{name}"):
+                frame = correct_image_orientation(data, platform, backend.DETECTOR_MAX_SIDE)
+            if frame is None:
+                raise RuntimeError(f"Decode non riuscito per {name}.")
+
+    try:
+        backend.subsystems.get('vision_workers' if backend.VISION_WORKERS > 0 else 'hands')
+    except Exception as e:
+        # Senza MediaPipe (o con i worker non avviabili) resta misurato solo il decode
+        report['predict_skipped'] = f"{type(e).__name__}: {e}"
+        report['cases'] = recorder.summary()
+        return report
+
+    client = backend.app.test_client()
+    headers = {'Authorization': f"Bearer {_access_token(backend, 'bench-user')}"}
+    for name, data, platform in corpus:
+        stages = {}
+        outcomes = {}
+        for i in range(warmup + iterations):
+            measured = i >= warmup
+            with (recorder.time(f"predict/{name}") if measured else _nothing()):
+                response = client.post(f"/predict/?platform={platform}&mode=static", data=data,
+                                       content_type='image/jpeg', headers=headers)
+            body = response.get_json() or {}
+            if response.status_code != 200:
+                raise RuntimeError(f"/predict/ ha risposto {response.status_code} per {name}: {body}")
+            if measured:
+                outcome = 'hands' if body['predictions'] else 'no_hands'
+                outcomes[outcome] = outcomes.get(outcome, 0) + 1
+                for stage, ms in body.get('timings', {}).items():
+                    stages.setdefault(stage, []).append(ms)
+        recorder.extra[f"predict/{name}"] = {
+            'outcomes': outcomes,
+            'stages_mean_ms': {stage: round(sum(v) / len(v), 4) for stage, v in stages.items()}
+        }
+    report['cases'] = recorder.summary()
+    return report
+
+
+def _synthetic_hand(rng, num_landmarks):
+    """Landmark normalizzati attorno a un centro casuale, come quelli di MediaPipe."""
+    center = rng.uniform(0.3, 0.7, size=2)
+    points = center + rng.normal(0, 0.08, size=(num_landmarks, 2))
+    return [[float(x), float(y)] for x, y in np.clip(points, 0, 1)]
+
+
+def bench_landmarks(options):
+    backend = _import_backend()
+    model_path = _select_model(backend, options)
+    rng = np.random.default_rng(options['seed'])
+    iterations, warmup = options['iterations'], options['warmup']
+    recorder = Recorder()
+
+    def hand(handedness):
+        return {'landmarks': _synthetic_hand(rng, backend.NUM_HAND_LANDMARKS), 'handedness': handedness}
+
+    payloads = {
+        '1_hand': [{'hands': [hand('Right')]} for _ in range(16)],
+        '2_hands': [{'hands': [hand('Right'), hand('Left')]} for _ in range(16)]
+    }
+    input_length = backend.model.input_shape[1]
+    rows = np.array([backend.build_feature_vector([x for x, _ in p['hands'][0]['landmarks']],
+                                                  [y for _, y in p['hands'][0]['landmarks']], input_length)
+                     for p in payloads['1_hand']], dtype=np.float32)
+
+    for i in range(warmup + iterations):
+        measured = i >= warmup
+        row = rows[i % len(rows)][None, :]
+        # Solo il forward pass, senza la finestra di raccolta del micro-batcher
+        with (recorder.time('model/batch1') if measured else _nothing()):
+            backend.model.predict(row, verbose=0)
+        for case, cases in payloads.items():
+            with (recorder.time(f"pipeline/{case}") if measured else _nothing()):
+                backend.predict_from_landmarks(cases[i % len(cases)])
+
+    return {'cases': recorder.summary(), 'model': model_path, 'batch_wait_ms': backend.PREDICT_BATCH_WAIT_MS}
+
+
+def _received(client, name):
+    return [m['args'][0] for m in client.get_received() if m['name'] == name]
+
+
+def bench_lobby(options):
+    backend = _import_backend()
+    fake = backend.supabase.client
+    fake.latency = options.get('db_latency_ms', 0) / 1000
+    num_players = options.get('players', 4)
+    iterations, warmup = options['iterations'], options['warmup']
+    recorder = Recorder()
+
+    user_ids = [f"bench-{i}" for i in range(num_players)]
+    fake.tables['users'] = [{'id': uid, 'username': f"giocatore{i}", 'email': f"{uid}@bench.local", 'points': 0}
+                            for i, uid in enumerate(user_ids)]
+    tokens = [_access_token(backend, uid) for uid in user_ids]
+
+    def emit(client, event, data, measured):
+        with (recorder.time(event) if measured else _nothing()):
+            client.emit(event, data)
+
+    clients = []
+    for token in tokens:
+        with recorder.time('connect'):
+            client = backend.socketio.test_client(backend.app, query_string=f"token={token}")
+        if not client.is_connected():
+            raise RuntimeError("Connessione Socket.IO rifiutata.")
+        client.get_received()
+        clients.append(client)
+    creator, others = clients[0], clients[1:]
+
+    for i in range(warmup + iterations):
+        measured = i >= warmup
+        emit(creator, 'create_lobby', {'lobby_name': f"bench {i}", 'type': 'pub', 'num_players': num_players},
+             measured)
+        created = _received(creator, 'lobby_created')
+        if not created:
+            raise RuntimeError("create_lobby non ha creato la lobby.")
+        lobby_id = created[0]['lobby']['lobby_id']
+
+        for client in others:
+            emit(client, 'join_lobby', {'lobby_id': lobby_id}, measured)
+        for client in others:
+            emit(client, 'toggle_ready', {'lobby_id': lobby_id, 'is_ready': True}, measured)
+        emit(others[0], 'get_lobbies', None, measured)
+        emit(others[0], 'query_lobbies', {'type': 'pub', 'has_free_seats': True, 'limit': 20}, measured)
+        for client in clients:
+            emit(client, 'vote_mode', {'lobby_id': lobby_id, 'mode': 'facile'}, measured)
+        for client in clients:
+            emit(client, 'player_on_game_screen', {'lobby_id': lobby_id}, measured)
+        for client in reversed(clients):
+            emit(client, 'leave_lobby', {'lobby_id': lobby_id}, measured)
+
+        # Scrittura differita delle lobby su Supabase, come la farebbe il flush periodico
+        with (recorder.time('lobby_flush') if measured else _nothing()):
+            backend.lobby_registry.flush()
+        for client in clients:
+            client.get_received()
+
+    for client in clients:
+        client.disconnect()
+    return {'cases': recorder.summary(), 'players': num_players, 'db_latency_ms': options.get('db_latency_ms', 0),
+            'db_requests': fake.requests}
+
+
+def record_scarabeo_games(num_games, seed):
+    """
+    Partite "registrate" riproducibili: mosse (parola, riga, colonna, orientamento) valide per
+    Scarabeo.controllo_mossa, con parole del lessico che incrociano quelle già sul tabellone.
+    """
+    import Scarabeo
+    from lexicon import read_word_list
+    alphabet = set('ABCDEFGHILMNOPQRSTUVZ')
+    words = [w.upper() for w in read_word_list(os.path.join(BACKEND_DIR, 'parole_it.txt'))
+             if set(w.upper()) <= alphabet and len(w) <= 9]
+    rng = random.Random(seed)
+    games = []
+    for _ in range(num_games):
+        board = Scarabeo.crea_tabellone_scarabeo()
+        first = rng.choice(words)
+        moves = [(first, 8, 8 - len(first) // 2, 'O')]
+        Scarabeo.posiziona_parola(board, *moves[0])
+        for _ in range(400):
+            if len(moves) >= 20:
+                break
+            word = rng.choice(words)
+            orientation = rng.choice('OV')
+            r, c = rng.randrange(17), rng.randrange(17)
+            if Scarabeo.controllo_mossa(board, word, r, c, orientation) and any(
+                    board[r + i if orientation == 'V' else r][c + i if orientation == 'O' else c].lettera
+                    for i in range(len(word))):
+                moves.append((word, r, c, orientation))
+                Scarabeo.posiziona_parola(board, word, r, c, orientation)
+        games.append(moves)
+    return games
+
+
+def bench_scarabeo(options):
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    import Scarabeo
+    games = record_scarabeo_games(options.get('games', 20), options['seed'])
+    iterations = max(1, options['iterations'] // 10)
+    recorder = Recorder()
+
+    for _ in range(iterations):
+        for moves in games:
+            with recorder.time('partita'):
+                board = Scarabeo.crea_tabellone_scarabeo()
+                for word, r, c, orientation in moves:
+                    with recorder.time('controllo_mossa'):
+                        valid = Scarabeo.controllo_mossa(board, word, r, c, orientation)
+                    if not valid:
+                        raise RuntimeError(f"Mossa registrata non valida: {word} {r} {c} {orientation}")
+                    tiles = [Scarabeo.Tessera(letter, Scarabeo.punteggio_lettera(letter)) for letter in word]
+                    with recorder.time('calcola_punteggio'):
+                        Scarabeo.calcola_punteggio(board, word, r, c, orientation, tiles)
+                    Scarabeo.posiziona_parola(board, word, r, c, orientation)
+
+    return {'cases': recorder.summary(), 'games': len(games), 'moves': sum(len(m) for m in games)}
+
+
+SUITE_FUNCTIONS = {
+    'predict': bench_predict,
+    'landmarks': bench_landmarks,
+    'lobby': bench_lobby,
+    'scarabeo': bench_scarabeo
+}
+
+
+def run_suite(name, options):
+    """Esegue una suite nel processo corrente e aggiunge tempo totale e picco di RSS."""
+    random.seed(options['seed'])
+    start = time.perf_counter()
+    report = SUITE_FUNCTIONS[name](options)
+    report['wall_s'] = round(time.perf_counter() - start, 3)
+    report['peak_rss_mb'] = peak_rss_mb()
+    return report
+
+
+def run_isolated(name, options):
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+        return pool.submit(run_suite, name, options).result()
+
+
+# ------------------------------------------------------------ report
+
+def environment_info():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=BACKEND_DIR, capture_output=True,
+                                text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform_module.python_version(),
+        'platform': platform_module.platform(),
+        'machine': platform_module.machine(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'config': {name: os.environ[name] for name in CONFIG_ENV if name in os.environ}
+    }
+
+
+def compare(results, baseline, threshold):
+    """Rapporto p50/p95 rispetto a un report precedente; ritorna i casi peggiorati oltre `threshold`."""
+    regressions = []
+    for suite, report in results['suites'].items():
+        old_cases = baseline.get('suites', {}).get(suite, {}).get('cases', {})
+        for case, stats in report.get('cases', {}).items():
+            old = old_cases.get(case)
+            if not old:
+                continue
+            for key in ('p50_ms', 'p95_ms'):
+                if old[key] > 0:
+                    ratio = stats[key] / old[key]
+                    stats[f"{key}_vs_baseline"] = round(ratio, 3)
+                    if ratio > 1 + threshold:
+                        regressions.append(f"{suite}/{case} {key}: {old[key]} -> {stats[key]} ms (x{ratio:.2f})")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark dei percorsi caldi del backend HandUp.")
+    parser.add_argument('--suite', default=','.join(SUITES),
+                        help="Suite separate da virgola: " + ', '.join(SUITES))
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--model', help=f"Modello .h5 (default: quello di backend.py, altrimenti {FALLBACK_MODEL}).")
+    parser.add_argument('--images', help="Cartella di JPEG reali al posto del corpus sintetico.")
+    parser.add_argument('--platform', default='ios', help="Piattaforma dichiarata per i JPEG di --images.")
+    parser.add_argument('--players', type=int, default=4, help="Giocatori per lobby nella suite lobby.")
+    parser.add_argument('--db-latency-ms', type=float, default=0.0,
+                        help="Latenza simulata di ogni richiesta al Supabase in memoria.")
+    parser.add_argument('--in-process', action='store_true',
+                        help="Tutte le suite nello stesso processo (il picco di RSS diventa cumulativo).")
+    parser.add_argument('--output', help="File JSON dei risultati (default: stdout).")
+    parser.add_argument('--baseline', help="Report precedente con cui confrontare p50/p95.")
+    parser.add_argument('--max-regression', type=float, default=0.2,
+                        help="Peggioramento relativo oltre cui l'uscita è 1 (con --baseline).")
+    args = parser.parse_args(argv)
+
+    names = [name.strip() for name in args.suite.split(',') if name.strip()]
+    unknown = [name for name in names if name not in SUITE_FUNCTIONS]
+    if unknown:
+        parser.error(f"Suite sconosciute: {', '.join(unknown)}")
+
+    options = {
+        'iterations': args.iterations,
+        'warmup': args.warmup,
+        'seed': args.seed,
+        'model': args.model,
+        'images': args.images,
+        'platform': args.platform,
+        'players': args.players,
+        'db_latency_ms': args.db_latency_ms
+    }
+    results = {'environment': environment_info(), 'options': options, 'suites': {}}
+    for name in names:
+        print(f"Suite {name}...", file=sys.stderr)
+        results['suites'][name] = run_suite(name, options) if args.in_process else run_isolated(name, options)
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.max_regression)
+        results['regressions'] = regressions
+        for line in regressions:
+            print(f"Regressione: {line}", file=sys.stderr)
+        exit_code = 1 if regressions else 0
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    return exit_code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
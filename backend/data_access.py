@@ -0,0 +1,259 @@
+# data_access.py
+
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from vision_workers import wait_for_future
+
+logger = logging.getLogger(__name__)
+
+
+class DataAccessTimeout(Exception):
+    """La chiamata al database non è terminata entro il timeout."""
+
+
+class _OperationStats:
+    __slots__ = ('calls', 'errors', 'timeouts', 'coalesced', 'total_ms', 'max_ms')
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.coalesced = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def as_dict(self):
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'timeouts': self.timeouts,
+            'coalesced': self.coalesced,
+            'avg_ms': round(self.total_ms / self.calls, 3) if self.calls else 0.0,
+            'max_ms': round(self.max_ms, 3)
+        }
+
+
+class OffloadExecutor:
+    """
+    Executor minimo (`submit`/`shutdown`) che esegue ogni chiamata con `offload(fn, *args)` dentro
+    un task avviato da `start_background_task`, al più `max_workers` alla volta.
+
+    Sotto eventlet i thread di ThreadPoolExecutor sono greenlet; con `offload=eventlet.tpool.execute`
+    le chiamate girano invece su thread del sistema operativo e il task che attende cede l'hub.
+    In quel caso anche `semaphore` deve essere verde (es. eventlet.semaphore.BoundedSemaphore):
+    un semaforo di `threading` senza monkey patching bloccherebbe l'hub, e con esso i task che
+    tengono gli slot in attesa del risultato di tpool.
+    """
+
+    def __init__(self, offload, start_background_task, max_workers, semaphore=threading.BoundedSemaphore):
+        self._offload = offload
+        self._start_background_task = start_background_task
+        self._slots = semaphore(max_workers)
+        self._closed = False
+
+    def submit(self, fn, *args):
+        if self._closed:
+            raise RuntimeError("Executor già chiuso.")
+        future = Future()
+        self._start_background_task(self._run, future, fn, args)
+        return future
+
+    def _run(self, future, fn, args):
+        with self._slots:
+            # Annullato (timeout di chi attendeva) mentre era in coda: non va eseguito
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                future.set_result(self._offload(fn, *args))
+            except BaseException as e:
+                future.set_exception(e)
+
+    def shutdown(self, wait=False, cancel_futures=False):
+        self._closed = True
+
+
+class _PendingQuery:
+    """
+    Registra la catena di chiamate del query builder di supabase-py (select/eq/order/...) e la
+    esegue con `execute()` tramite DataAccess, che la riproduce sul client reale.
+    """
+
+    def __init__(self, data_access, table):
+        self._data_access = data_access
+        self._table = table
+        self._chain = []
+
+    def __getattr__(self, method):
+        def record(*args, **kwargs):
+            self._chain.append((method, args, kwargs))
+            return self
+        return record
+
+    def execute(self):
+        return self._data_access.execute(self._table, self._chain)
+
+
+class DataAccess:
+    """
+    Accesso a Supabase con la stessa interfaccia fluente del client (`table(...).select(...).execute()`).
+
+    - Le chiamate bloccanti girano in un pool limitato di thread (`pool_size`), che condividono il
+      client e quindi il suo pool di connessioni HTTP; chi chiama attende cedendo il controllo con
+      `sleep` (es. socketio.sleep), così sotto eventlet le richieste non si serializzano. Sotto
+      eventlet va passato un `executor` che usi thread veri (OffloadExecutor con tpool.execute);
+      senza, si usa un ThreadPoolExecutor.
+    - Ogni chiamata ha un timeout (`timeout` secondi) oltre il quale solleva DataAccessTimeout.
+    - Letture identiche già in corso vengono accorpate (single-flight): la seconda richiesta
+      riceve la stessa risposta della prima, che quindi non va modificata da chi la riceve.
+    - `insert_many()` e `delete_many()` scrivono molte righe con poche richieste (`batch_size`
+      righe o valori per richiesta).
+    - `observer(table, operation, seconds, outcome)`, se presente, riceve il tempo di attesa di
+      ogni chiamata dal punto di vista di chi chiama (outcome: ok, coalesced, error, timeout).
+    """
+
+    def __init__(self, client, pool_size=8, timeout=10.0, sleep=None, batch_size=500, observer=None,
+                 executor=None):
+        self._client = client
+        self._executor = executor or ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix='supabase')
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self._sleep = sleep or time.sleep
+        self._observer = observer
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._stats = {}
+
+    @property
+    def client(self):
+        return self._client
+
+    def table(self, name):
+        return _PendingQuery(self, name)
+
+    def _run(self, table, chain):
+        query = self._client.table(table)
+        for method, args, kwargs in chain:
+            query = getattr(query, method)(*args, **kwargs)
+        return query.execute()
+
+    def _record(self, key, elapsed_ms=None, error=False, timeout=False, coalesced=False):
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = _OperationStats()
+            if coalesced:
+                stats.coalesced += 1
+                return
+            stats.calls += 1
+            stats.errors += error
+            stats.timeouts += timeout
+            if elapsed_ms is not None:
+                stats.total_ms += elapsed_ms
+                stats.max_ms = max(stats.max_ms, elapsed_ms)
+
+    def execute(self, table, chain):
+        if self._observer is None:
+            return self._execute(table, chain)[0]
+        operation = chain[0][0] if chain else 'select'
+        start = time.perf_counter()
+        outcome = 'error'
+        try:
+            result, shared = self._execute(table, chain)
+            outcome = 'coalesced' if shared else 'ok'
+            return result
+        except DataAccessTimeout:
+            outcome = 'timeout'
+            raise
+        finally:
+            self._observer(table, operation, time.perf_counter() - start, outcome)
+
+    def _execute(self, table, chain):
+        operation = chain[0][0] if chain else 'select'
+        stats_key = (table, operation)
+
+        if operation != 'select':
+            future = self._submit(table, chain)
+            return self._wait(future, stats_key), False
+
+        flight_key = (table, repr(chain))
+        with self._lock:
+            future = self._in_flight.get(flight_key)
+            shared = future is not None
+            if not shared:
+                future = self._in_flight[flight_key] = self._submit(table, chain)
+        if shared:
+            self._record(stats_key, coalesced=True)
+        else:
+            future.add_done_callback(lambda _f: self._forget(flight_key, future))
+        try:
+            return self._wait(future, stats_key, shared=shared), shared
+        except DataAccessTimeout:
+            # Le richieste successive non devono agganciarsi a una lettura bloccata
+            self._forget(flight_key, future)
+            raise
+
+    def _submit(self, table, chain):
+        start = time.perf_counter()
+        try:
+            future = self._executor.submit(self._run, table, chain)
+        except RuntimeError:
+            # Pool già chiuso (es. flush finale durante l'uscita del processo): esecuzione diretta
+            future = Future()
+            try:
+                future.set_result(self._run(table, chain))
+            except Exception as e:
+                future.set_exception(e)
+        future.start_time = start
+        return future
+
+    def _forget(self, flight_key, future):
+        with self._lock:
+            if self._in_flight.get(flight_key) is future:
+                del self._in_flight[flight_key]
+
+    def _wait(self, future, stats_key, shared=False):
+        try:
+            result = wait_for_future(future, self._sleep, timeout=self.timeout)
+        except TimeoutError:
+            if not shared:
+                self._record(stats_key, (time.perf_counter() - future.start_time) * 1000, timeout=True)
+            raise DataAccessTimeout(f"Timeout della chiamata a Supabase ({stats_key[0]}.{stats_key[1]}).")
+        except Exception:
+            if not shared:
+                self._record(stats_key, (time.perf_counter() - future.start_time) * 1000, error=True)
+            raise
+        if not shared:
+            self._record(stats_key, (time.perf_counter() - future.start_time) * 1000)
+        return result
+
+    def insert_many(self, table, rows):
+        """Inserisce `rows` con una richiesta ogni `batch_size` righe; ritorna le righe inserite."""
+        inserted = []
+        for i in range(0, len(rows), self.batch_size):
+            response = self.table(table).insert(rows[i:i + self.batch_size]).execute()
+            inserted.extend(response.data or [])
+        return inserted
+
+    def delete_many(self, table, column, values, **filters):
+        """Elimina le righe con `column` in `values` (più eventuali filtri di uguaglianza), a blocchi."""
+        values = list(values)
+        for i in range(0, len(values), self.batch_size):
+            query = self.table(table).delete()
+            for key, value in filters.items():
+                query = query.eq(key, value)
+            query.in_(column, values[i:i + self.batch_size]).execute()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pool_size': self.pool_size,
+                'in_flight_reads': len(self._in_flight),
+                'operations': {f"{table}.{op}": s.as_dict() for (table, op), s in self._stats.items()}
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
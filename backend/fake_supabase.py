@@ -0,0 +1,174 @@
+# fake_supabase.py
+
+import re
+import threading
+import time
+import uuid
+
+# Valori di default delle colonne, come nello schema Supabase
+DEFAULTS = {
+    'users': {'points': 0},
+    'lobby_players': {'is_ready': False}
+}
+
+# ON DELETE CASCADE: tabella -> [(tabella figlia, colonna che la referenzia)]
+CASCADES = {
+    'lobbies': [('lobby_players', 'lobby_id')],
+    'users': [('lobby_players', 'user_id')]
+}
+
+_EMBED = re.compile(r'(\w+)\(([^)]*)\)')
+
+
+class FakeResponse:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+class _FakeQuery:
+    def __init__(self, db, table):
+        self._db = db
+        self._table = table
+        self._operation = 'select'
+        self._columns = '*'
+        self._count = None
+        self._payload = None
+        self._filters = []
+        self._order = []
+        self._limit = None
+
+    def select(self, columns='*', count=None):
+        self._operation = 'select'
+        self._columns = columns
+        self._count = count
+        return self
+
+    def insert(self, rows):
+        self._operation = 'insert'
+        self._payload = rows
+        return self
+
+    def update(self, values):
+        self._operation = 'update'
+        self._payload = values
+        return self
+
+    def delete(self):
+        self._operation = 'delete'
+        return self
+
+    def _filter(self, predicate):
+        self._filters.append(predicate)
+        return self
+
+    def eq(self, column, value):
+        return self._filter(lambda row: row.get(column) == value)
+
+    def neq(self, column, value):
+        return self._filter(lambda row: row.get(column) != value)
+
+    def gt(self, column, value):
+        return self._filter(lambda row: row.get(column) is not None and row[column] > value)
+
+    def gte(self, column, value):
+        return self._filter(lambda row: row.get(column) is not None and row[column] >= value)
+
+    def lt(self, column, value):
+        return self._filter(lambda row: row.get(column) is not None and row[column] < value)
+
+    def lte(self, column, value):
+        return self._filter(lambda row: row.get(column) is not None and row[column] <= value)
+
+    def in_(self, column, values):
+        values = list(values)
+        return self._filter(lambda row: row.get(column) in values)
+
+    def order(self, column, desc=False):
+        self._order.append((column, desc))
+        return self
+
+    def limit(self, size):
+        self._limit = size
+        return self
+
+    def execute(self):
+        return self._db._execute(self)
+
+
+class FakeSupabase:
+    """
+    Client Supabase in memoria per test e benchmark: supporta il sottoinsieme del query builder
+    usato dal backend (select con count e risorse collegate come `users(username)`, insert,
+    update, delete, filtri eq/neq/gt/gte/lt/lte/in_, order, limit).
+
+    `latency` (secondi) simula il tempo di andata e ritorno di ogni richiesta.
+    """
+
+    def __init__(self, tables=None, latency=0.0):
+        self.tables = {name: [dict(row) for row in rows] for name, rows in (tables or {}).items()}
+        self.latency = latency
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def table(self, name):
+        return _FakeQuery(self, name)
+
+    def _execute(self, query):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.requests += 1
+            rows = self.tables.setdefault(query._table, [])
+            matched = [row for row in rows if all(f(row) for f in query._filters)]
+
+            if query._operation == 'insert':
+                payload = query._payload if isinstance(query._payload, list) else [query._payload]
+                inserted = []
+                for values in payload:
+                    row = dict(DEFAULTS.get(query._table, {}))
+                    row['id'] = str(uuid.uuid4())
+                    row.update(values)
+                    rows.append(row)
+                    inserted.append(dict(row))
+                return FakeResponse(inserted)
+
+            if query._operation == 'update':
+                for row in matched:
+                    row.update(query._payload)
+                return FakeResponse([dict(row) for row in matched])
+
+            if query._operation == 'delete':
+                for row in matched:
+                    rows.remove(row)
+                self._cascade(query._table, matched)
+                return FakeResponse([dict(row) for row in matched])
+
+            for column, desc in reversed(query._order):
+                matched.sort(key=lambda row: (row.get(column) is None, row.get(column)), reverse=desc)
+            count = len(matched) if query._count else None
+            if query._limit is not None:
+                matched = matched[:query._limit]
+            return FakeResponse([self._project(query._table, row, query._columns) for row in matched], count)
+
+    def _cascade(self, table, deleted):
+        for child, column in CASCADES.get(table, []):
+            ids = {row['id'] for row in deleted}
+            children = self.tables.get(child, [])
+            removed = [row for row in children if row.get(column) in ids]
+            if removed:
+                self.tables[child] = [row for row in children if row.get(column) not in ids]
+                self._cascade(child, removed)
+
+    def _project(self, table, row, columns):
+        embeds = _EMBED.findall(columns)
+        plain = [c.strip() for c in _EMBED.sub('', columns).split(',') if c.strip()]
+        result = dict(row) if '*' in plain or not plain else {c: row.get(c) for c in plain}
+        for embedded_table, embedded_columns in embeds:
+            # Convenzione dello schema: lobby_players.user_id -> users.id
+            foreign_key = embedded_table.rstrip('s') + '_id'
+            target = next((r for r in self.tables.get(embedded_table, [])
+                           if r.get('id') == row.get(foreign_key)), None)
+            result[embedded_table] = None if target is None else \
+                self._project(embedded_table, target, embedded_columns)
+        return result
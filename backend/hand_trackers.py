@@ -0,0 +1,161 @@
+# hand_trackers.py
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class TrackerPoolExhausted(Exception):
+    """Tutti i tracker del pool sono in uso e nessuno può essere liberato."""
+
+
+class _TrackerEntry:
+    __slots__ = ('tracker', 'in_use', 'last_used')
+
+    def __init__(self, tracker):
+        self.tracker = tracker
+        self.in_use = False
+        self.last_used = time.monotonic()
+
+
+class HandTrackerPool:
+    """
+    Pool limitato di istanze MediaPipe `Hands`.
+
+    - Tracker di sessione (static_image_mode=False): uno per chiave (utente o sid), così lo stato
+      di tracking tra frame consecutivi appartiene a un solo utente. Quando il pool è pieno si
+      chiude il tracker inattivo usato meno di recente (LRU); quelli inattivi da più di
+      `idle_ttl` secondi vengono chiusi da `evict_idle()`.
+    - Tracker statici (static_image_mode=True) per le richieste singole, condivisi tramite una
+      free-list e usati anche come ripiego quando il pool di sessione è esaurito.
+    """
+
+    def __init__(self, factory, max_size=8, max_static=4, idle_ttl=300):
+        self._factory = factory
+        self.max_size = max_size
+        self.max_static = max_static
+        self.idle_ttl = idle_ttl
+
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()
+        self._static_free = []
+        self._static_created = 0
+
+        self.evictions = 0
+        self.static_fallbacks = 0
+
+    def _close(self, tracker):
+        try:
+            tracker.close()
+        except Exception as e:
+            logger.warning(f"Errore nella chiusura di un tracker: {e}")
+
+    def _evict_lru_locked(self):
+        for key, entry in self._sessions.items():
+            if not entry.in_use:
+                del self._sessions[key]
+                self.evictions += 1
+                return entry.tracker
+        return None
+
+    def checkout(self, key):
+        """Ritorna il tracker di sessione per `key`, creandolo se serve. Solleva TrackerPoolExhausted."""
+        evicted = None
+        with self._lock:
+            entry = self._sessions.get(key)
+            if entry is not None:
+                if entry.in_use:
+                    raise TrackerPoolExhausted(f"Tracker per '{key}' già in uso.")
+                self._sessions.move_to_end(key)
+            else:
+                if len(self._sessions) >= self.max_size:
+                    evicted = self._evict_lru_locked()
+                    if evicted is None:
+                        raise TrackerPoolExhausted("Pool dei tracker esaurito.")
+                entry = _TrackerEntry(self._factory(False))
+                self._sessions[key] = entry
+            entry.in_use = True
+            entry.last_used = time.monotonic()
+
+        if evicted is not None:
+            self._close(evicted)
+        return entry.tracker
+
+    def checkin(self, key):
+        with self._lock:
+            entry = self._sessions.get(key)
+            if entry is not None:
+                entry.in_use = False
+                entry.last_used = time.monotonic()
+
+    def release(self, key):
+        """Chiude e rimuove il tracker di sessione (es. fine sessione o disconnessione)."""
+        with self._lock:
+            entry = self._sessions.pop(key, None)
+        if entry is not None:
+            self._close(entry.tracker)
+
+    def evict_idle(self, now=None):
+        now = now or time.monotonic()
+        expired = []
+        with self._lock:
+            for key, entry in list(self._sessions.items()):
+                if not entry.in_use and now - entry.last_used > self.idle_ttl:
+                    expired.append(self._sessions.pop(key).tracker)
+                    self.evictions += 1
+        for tracker in expired:
+            self._close(tracker)
+        return len(expired)
+
+    @contextmanager
+    def session(self, key):
+        """Usa il tracker di sessione di `key`; se non disponibile ripiega su un tracker statico."""
+        try:
+            tracker = self.checkout(key)
+        except TrackerPoolExhausted:
+            self.static_fallbacks += 1
+            with self.static() as tracker:
+                yield tracker
+            return
+        try:
+            yield tracker
+        finally:
+            self.checkin(key)
+
+    @contextmanager
+    def static(self):
+        """Tracker in static_image_mode per una singola immagine."""
+        with self._lock:
+            if self._static_free:
+                tracker = self._static_free.pop()
+            elif self._static_created < self.max_static:
+                self._static_created += 1
+                tracker = None
+            else:
+                raise TrackerPoolExhausted("Nessun tracker statico disponibile.")
+        if tracker is None:
+            try:
+                tracker = self._factory(True)
+            except Exception:
+                with self._lock:
+                    self._static_created -= 1
+                raise
+        try:
+            yield tracker
+        finally:
+            with self._lock:
+                self._static_free.append(tracker)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'session_trackers': len(self._sessions),
+                'session_in_use': sum(1 for e in self._sessions.values() if e.in_use),
+                'static_trackers': self._static_created,
+                'evictions': self.evictions,
+                'static_fallbacks': self.static_fallbacks
+            }
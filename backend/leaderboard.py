@@ -0,0 +1,122 @@
+# leaderboard.py
+
+import logging
+import threading
+import time
+from bisect import bisect_left, insort
+
+logger = logging.getLogger(__name__)
+
+
+class Leaderboard:
+    """
+    Classifica in memoria ordinata per punti decrescenti.
+
+    Le chiavi (-punti, user_id) sono tenute in un array ordinato: posizione di un utente con
+    una ricerca binaria (O(log n)), pagine e finestre "intorno a me" con uno slice. I dati
+    vengono ricaricati con `load_users()` quando sono più vecchi di `ttl` secondi; le modifiche
+    di punteggio note al server si applicano subito con `update()`.
+    """
+
+    def __init__(self, load_users, ttl=30.0):
+        self._load_users = load_users
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._keys = []
+        self._users = {}
+        self._loaded_at = None
+        self._refreshing = False
+        self._version = 0
+        self._full_list = None
+        self.refreshes = 0
+
+    # ------------------------------------------------------------ caricamento
+
+    def refresh(self):
+        """Ricarica tutti gli utenti (id, username, points) e ricostruisce l'ordinamento."""
+        rows = self._load_users()
+        users = {row['id']: (row.get('username'), row.get('points') or 0) for row in rows}
+        keys = sorted((-points, user_id) for user_id, (_username, points) in users.items())
+        with self._lock:
+            self._users = users
+            self._keys = keys
+            self._loaded_at = time.monotonic()
+            self._version += 1
+            self.refreshes += 1
+        logger.info(f"Classifica ricaricata: {len(keys)} utenti.")
+
+    def _ensure_fresh(self):
+        with self._lock:
+            stale = self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl
+            # Se un altro greenlet sta già ricaricando si servono i dati precedenti (se ci sono)
+            if not stale or (self._refreshing and self._loaded_at is not None):
+                return
+            self._refreshing = True
+        try:
+            self.refresh()
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    # ------------------------------------------------------------ aggiornamenti
+
+    def update(self, user_id, username, points):
+        """Inserisce o aggiorna il punteggio di un utente."""
+        with self._lock:
+            previous = self._users.get(user_id)
+            if previous is not None:
+                self._remove_key_locked(user_id, previous[1])
+                if username is None:
+                    username = previous[0]
+            self._users[user_id] = (username, points)
+            insort(self._keys, (-points, user_id))
+            self._version += 1
+
+    def remove(self, user_id):
+        with self._lock:
+            previous = self._users.pop(user_id, None)
+            if previous is not None:
+                self._remove_key_locked(user_id, previous[1])
+                self._version += 1
+
+    def _remove_key_locked(self, user_id, points):
+        i = bisect_left(self._keys, (-points, user_id))
+        if i < len(self._keys) and self._keys[i] == (-points, user_id):
+            del self._keys[i]
+
+    # ------------------------------------------------------------------ letture
+
+    def _entry(self, key):
+        return {'username': self._users[key[1]][0], 'points': -key[0]}
+
+    def rank(self, user_id):
+        """Ritorna (posizione a partire da 1, punti) oppure (None, None) se l'utente non è in classifica."""
+        self._ensure_fresh()
+        with self._lock:
+            user = self._users.get(user_id)
+            if user is None:
+                return None, None
+            return bisect_left(self._keys, (-user[1], user_id)) + 1, user[1]
+
+    def top(self, offset=0, limit=None):
+        """Pagina della classifica a partire dalla posizione offset + 1."""
+        self._ensure_fresh()
+        with self._lock:
+            if offset == 0 and limit is None:
+                # Classifica completa: la lista serializzata si ricostruisce solo se è cambiato qualcosa
+                if self._full_list is None or self._full_list[0] != self._version:
+                    self._full_list = (self._version, [self._entry(key) for key in self._keys])
+                return self._full_list[1]
+            end = len(self._keys) if limit is None else offset + limit
+            return [self._entry(key) for key in self._keys[offset:end]]
+
+    def around(self, user_id, radius=5):
+        """Finestra di `radius` posizioni sopra e sotto l'utente: (offset della finestra, voci)."""
+        rank, _points = self.rank(user_id)
+        if rank is None:
+            return 0, []
+        offset = max(rank - 1 - radius, 0)
+        return offset, self.top(offset, rank - offset + radius)
+
+    def __len__(self):
+        return len(self._keys)
@@ -0,0 +1,117 @@
+# letter_smoothing.py
+
+import threading
+import time
+from collections import OrderedDict, deque
+
+import numpy as np
+
+
+class HandLetterSmoother:
+    """
+    Ring buffer delle ultime distribuzioni di probabilità di una mano.
+
+    La lettera viene "confermata" quando la media mobile delle probabilità supera `threshold`
+    sulla stessa lettera per `min_frames` frame consecutivi. Dopo una conferma la stessa
+    lettera non viene riconfermata finché la mano non cambia segno o scende sotto soglia
+    (serve per le doppie, es. "PALLA").
+    """
+
+    def __init__(self, window=5, threshold=0.8, min_frames=3):
+        self.window = window
+        self.threshold = threshold
+        self.min_frames = min_frames
+        self.history = deque(maxlen=window)
+        self.candidate = None
+        self.streak = 0
+        self.locked = False
+
+    def reset(self):
+        self.history.clear()
+        self.candidate = None
+        self.streak = 0
+        self.locked = False
+
+    def update(self, probabilities):
+        """Aggiunge un frame; ritorna (indice, confidenza smussata, confermata)."""
+        self.history.append(np.asarray(probabilities, dtype=np.float32))
+        smoothed = np.mean(self.history, axis=0)
+        index = int(np.argmax(smoothed))
+        confidence = float(smoothed[index])
+
+        if confidence < self.threshold:
+            self.candidate = None
+            self.streak = 0
+            self.locked = False
+            return index, confidence, False
+
+        if index != self.candidate:
+            self.candidate = index
+            self.streak = 0
+            self.locked = False
+        self.streak += 1
+
+        if not self.locked and self.streak >= self.min_frames:
+            self.locked = True
+            return index, confidence, True
+        return index, confidence, False
+
+
+class LetterRecognizer:
+    """Smoother separati per mano destra e sinistra di una stessa sessione."""
+
+    def __init__(self, labels, window=5, threshold=0.8, min_frames=3):
+        self.labels = labels
+        self._params = (window, threshold, min_frames)
+        self.hands = {}
+        self.last_seen = time.monotonic()
+
+    def update(self, probabilities, hand_types):
+        """
+        probabilities: una riga per mano (stesso ordine di hand_types).
+        Ritorna la lista delle lettere confermate in questo frame.
+        """
+        self.last_seen = time.monotonic()
+        committed = []
+        for hand_type in list(self.hands):
+            if hand_type not in hand_types:
+                # Mano uscita dall'inquadratura: si riparte da zero
+                self.hands[hand_type].reset()
+
+        for row, hand_type in zip(probabilities, hand_types):
+            smoother = self.hands.get(hand_type)
+            if smoother is None:
+                smoother = self.hands[hand_type] = HandLetterSmoother(*self._params)
+            index, confidence, is_committed = smoother.update(row)
+            if is_committed:
+                committed.append({
+                    'hand_type': hand_type,
+                    'character': self.labels.get(index, ''),
+                    'confidence': confidence * 100
+                })
+        return committed
+
+
+class RecognizerRegistry:
+    """LetterRecognizer per sessione HTTP (utente + session_id), con scadenza per inattività."""
+
+    def __init__(self, factory, max_sessions=1000, idle_ttl=120):
+        self._factory = factory
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self._lock = threading.Lock()
+        self._recognizers = OrderedDict()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            recognizer = self._recognizers.get(key)
+            if recognizer is not None and now - recognizer.last_seen > self.idle_ttl:
+                recognizer = None
+            if recognizer is None:
+                recognizer = self._factory()
+                self._recognizers[key] = recognizer
+            self._recognizers.move_to_end(key)
+            while len(self._recognizers) > self.max_sessions:
+                self._recognizers.popitem(last=False)
+            return recognizer
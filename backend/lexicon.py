@@ -0,0 +1,190 @@
+# lexicon.py
+
+import logging
+import mmap
+import os
+import random
+import re
+import struct
+from abc import ABC, abstractmethod
+from bisect import bisect_right
+
+from word_pool import DIFFICULTY_LENGTHS, normalize_words
+
+logger = logging.getLogger(__name__)
+
+# Formato dell'indice: intestazione (magic, numero di bucket) seguita da (offset, conteggio) per
+# ogni lunghezza 0..MAX_WORD_LENGTH; poi, per ogni lunghezza, le parole ASCII concatenate a
+# larghezza fissa, così l'i-esima parola di lunghezza L sta a offset + i * L senza altre tabelle.
+INDEX_MAGIC = b'HLX1'
+MAX_WORD_LENGTH = 31
+_HEADER = struct.Struct('<4sI')
+_BUCKET = struct.Struct('<II')
+
+_VALID_WORD = re.compile(r'^[a-z]+$')
+
+
+class WordSource(ABC):
+    """Sorgente di parole per una difficoltà: `sample(difficulty, count)` ritorna parole distinte."""
+
+    name = 'base'
+
+    @abstractmethod
+    def sample(self, difficulty, count=10):
+        """Fino a `count` parole distinte per la difficoltà."""
+
+    def stats(self):
+        return {'source': self.name}
+
+
+def read_word_list(path):
+    """Parole di un file di testo (una per riga, righe vuote e commenti '#' ignorati)."""
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            word = line.strip()
+            if word and not word.startswith('#'):
+                yield word
+
+
+def build_index(words, index_path):
+    """
+    Scrive l'indice per lunghezza delle parole valide: minuscole, solo lettere a-z (le parole
+    accentate vengono scartate, non "ripulite", per non produrre parole inesistenti), senza doppioni.
+    """
+    buckets = [set() for _ in range(MAX_WORD_LENGTH + 1)]
+    for word in words:
+        word = word.strip().lower()
+        if _VALID_WORD.match(word) and len(word) <= MAX_WORD_LENGTH:
+            buckets[len(word)].add(word)
+
+    header_size = _HEADER.size + _BUCKET.size * len(buckets)
+    table = []
+    data = []
+    offset = header_size
+    for length, bucket in enumerate(buckets):
+        table.append(_BUCKET.pack(offset, len(bucket)))
+        data.append(''.join(sorted(bucket)).encode('ascii'))
+        offset += length * len(bucket)
+
+    tmp_path = f"{index_path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(_HEADER.pack(INDEX_MAGIC, len(buckets)))
+        f.writelines(table)
+        f.writelines(data)
+    os.replace(tmp_path, index_path)
+    return sum(len(bucket) for bucket in buckets)
+
+
+class LexiconIndex:
+    """Indice in sola lettura mappato in memoria: accesso diretto alla i-esima parola di una lunghezza."""
+
+    def __init__(self, index_path):
+        self.path = index_path
+        with open(index_path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, bucket_count = _HEADER.unpack_from(self._map, 0)
+        if magic != INDEX_MAGIC:
+            self._map.close()
+            raise ValueError(f"Indice lessico non valido: {index_path}")
+        self._buckets = [_BUCKET.unpack_from(self._map, _HEADER.size + i * _BUCKET.size)
+                         for i in range(bucket_count)]
+        self._ranges = {}
+
+    def count(self, length):
+        return self._buckets[length][1] if 0 <= length < len(self._buckets) else 0
+
+    def word(self, length, i):
+        offset = self._buckets[length][0] + i * length
+        return self._map[offset:offset + length].decode('ascii')
+
+    def _range(self, lmin, lmax):
+        # Per un intervallo di lunghezze: inizio cumulativo di ogni bucket e totale delle parole
+        key = (lmin, lmax)
+        cached = self._ranges.get(key)
+        if cached is None:
+            lengths = [length for length in range(lmin, min(lmax, len(self._buckets) - 1) + 1)
+                       if self.count(length)]
+            starts = []
+            total = 0
+            for length in lengths:
+                starts.append(total)
+                total += self.count(length)
+            cached = self._ranges[key] = (lengths, starts, total)
+        return cached
+
+    def size(self, lmin, lmax):
+        return self._range(lmin, lmax)[2]
+
+    def sample(self, lmin, lmax, count, rng=random):
+        """`count` parole distinte di lunghezza lmin..lmax (tutte quelle disponibili se sono meno)."""
+        lengths, starts, total = self._range(lmin, lmax)
+        words = []
+        for i in rng.sample(range(total), min(count, total)):
+            b = bisect_right(starts, i) - 1
+            words.append(self.word(lengths[b], i - starts[b]))
+        return words
+
+    def close(self):
+        self._map.close()
+
+
+def open_index(words_path, index_path):
+    """Apre l'indice, ricostruendolo dall'elenco di parole se manca, è vecchio o non è valido."""
+    if os.path.exists(index_path) and os.path.getmtime(index_path) >= os.path.getmtime(words_path):
+        try:
+            return LexiconIndex(index_path)
+        except (ValueError, struct.error, OSError) as e:
+            logger.warning(f"Indice lessico da ricostruire: {e}")
+    total = build_index(read_word_list(words_path), index_path)
+    logger.info(f"Indice lessico creato da {words_path}: {total} parole.")
+    return LexiconIndex(index_path)
+
+
+class LexiconWordSource(WordSource):
+    """Parole estratte a caso dal lessico locale: nessuna rete, pochi microsecondi per chiamata."""
+
+    name = 'lexicon'
+
+    def __init__(self, index):
+        self.index = index
+        self.served = 0
+
+    def sample(self, difficulty, count=10):
+        lmin, lmax = DIFFICULTY_LENGTHS[difficulty]
+        words = self.index.sample(lmin, lmax, count)
+        self.served += len(words)
+        return words
+
+    def stats(self):
+        return {
+            'source': self.name,
+            'sizes': {difficulty: self.index.size(*lengths) for difficulty, lengths in DIFFICULTY_LENGTHS.items()},
+            'served': self.served
+        }
+
+
+class PromptWordSource(WordSource):
+    """Parole da un generatore esterno (es. il prompt a Gemini), filtrate come quelle del lessico."""
+
+    name = 'prompt'
+
+    def __init__(self, generate):
+        self._generate = generate
+
+    def sample(self, difficulty, count=10):
+        return normalize_words(self._generate(difficulty), difficulty)[:count]
+
+
+class PooledWordSource(WordSource):
+    """Sorgente lenta (es. PromptWordSource) servita attraverso un WordPool riempito in background."""
+
+    name = 'pool'
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    def sample(self, difficulty, count=10):
+        return self.pool.sample(difficulty, count)
+
+    def stats(self):
+        return dict(self.pool.stats(), source=self.name)
@@ -0,0 +1,738 @@
+# loadtest.py
+#
+# Generatore di carico Socket.IO: simula classi di giocatori che seguono il flusso reale delle
+# lobby (create_lobby, join_lobby, toggle_ready, vote_mode, player_on_game_screen, leave_lobby)
+# e misura la latenza di ogni evento (dall'invio all'ack del server), gli errori e la CPU del
+# server, per stimare quante lobby contemporanee regge un singolo worker.
+#
+# Uso:
+#   python loadtest.py --serve --lobbies 10,50,100 --players 4
+#       avvia un server locale su Supabase in memoria (SUPABASE_FAKE) e lo carica a gradini
+#   python loadtest.py --url http://host:5001 --auth login --register --lobbies 20
+#       server esistente: utenti creati con /register e autenticati con /login
+#   python loadtest.py --serve --nodes 1,4 --redis redis://127.0.0.1:6379/0 --lobbies 25,50
+#       scalabilità: lo stesso carico per nodo su 1 e poi su 4 server locali che condividono Redis;
+#       con N nodi ogni gradino ha N volte le lobby. "scaling" confronta la CPU dei server per
+#       classe completata: efficiency = CPU per classe con 1 nodo / CPU per classe con N nodi
+#       (1.0 = lineare: N nodi reggono N volte le classi di uno). flows_per_s è riportato a parte
+#       perché un solo generatore satura prima dei server. Servono almeno N+2 core (nodi, generatore
+#       e Redis): su meno core i nodi si contendono la CPU e l'efficienza misura solo la contesa
+#
+# I client sono greenlet eventlet in un solo processo. Senza il pacchetto opzionale
+# websocket-client usano il long-polling HTTP. Con più nodi i giocatori di una classe si
+# collegano a nodi diversi e seguono 'lobby_redirect' verso il nodo della lobby, come l'app.
+# Ogni nodo locale ha il suo Supabase in memoria: basta perché una lobby resta sul nodo che
+# l'ha creata, ma non copre la presa in carico delle lobby di un nodo caduto.
+
+import argparse
+import importlib.util
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+from benchmark import environment_info, summarize
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+MODES = ('facile', 'medio', 'difficile')
+
+
+class FlowFailed(Exception):
+    """Il flusso di una classe si è interrotto (errore dal server o timeout)."""
+
+
+def _raise_fd_limit():
+    # Ogni client tiene aperta almeno una connessione: si porta il limite soft al massimo consentito
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def mint_tokens(secret, user_ids, expires=timedelta(hours=6)):
+    """JWT di accesso firmati come quelli di /login, senza passare dal server."""
+    from flask import Flask
+    from flask_jwt_extended import JWTManager, create_access_token
+    app = Flask('loadtest')
+    app.config['JWT_SECRET_KEY'] = secret
+    JWTManager(app)
+    with app.app_context():
+        return {user_id: create_access_token(identity=user_id, expires_delta=expires) for user_id in user_ids}
+
+
+def user_ids_for(prefix, count):
+    return [f"{prefix}{i}" for i in range(count)]
+
+
+def user_email(user_id):
+    return f"{user_id}@loadtest.local"
+
+
+# ------------------------------------------------------------ server locale
+
+def serve(args):
+    """Server di prova: backend.py su Supabase in memoria con gli utenti del test già registrati."""
+    os.environ['SUPABASE_FAKE'] = '1'
+    os.environ.setdefault('STARTUP_MODE', 'lazy')
+    if os.getenv('SOCKETIO_MESSAGE_QUEUE'):
+        # La coda dei messaggi su Redis richiede socket cooperativi, come nel worker eventlet di gunicorn
+        import eventlet
+        eventlet.monkey_patch()
+    sys.path.insert(0, BACKEND_DIR)
+    os.chdir(BACKEND_DIR)
+    _raise_fd_limit()
+    import backend
+
+    user_ids = user_ids_for(args.user_prefix, args.users)
+    # Un solo hash per tutti: il costo di bcrypt si paga comunque a ogni /login
+    hashed = backend.password_hasher.hash(args.password)
+    backend.supabase.client.tables['users'] = [
+        {'id': user_id, 'username': f"studente{i}", 'email': user_email(user_id), 'password': hashed, 'points': 0}
+        for i, user_id in enumerate(user_ids)
+    ]
+    with open(args.tokens_file, 'w') as f:
+        json.dump(mint_tokens(backend.app.config['JWT_SECRET_KEY'], user_ids), f)
+
+    backend.logger.info(f"Server di carico su 127.0.0.1:{args.port} con {len(user_ids)} utenti.")
+    backend.socketio.run(backend.app, host='127.0.0.1', port=args.port, max_size=args.server_max_connections)
+
+
+def start_local_nodes(args, num_users, num_nodes, first_port):
+    """`num_nodes` server locali che condividono lo stato delle lobby e la coda dei messaggi su --redis."""
+    nodes = []
+    try:
+        for port in range(first_port, first_port + num_nodes):
+            nodes.append(start_local_server(args, num_users, port, env={
+                'STATE_STORE_URL': args.redis,
+                'SOCKETIO_MESSAGE_QUEUE': args.redis,
+                'NODE_ID': f"loadtest-{port}",
+                'NODE_URL': f"http://127.0.0.1:{port}"
+            }))
+    except Exception:
+        stop_local_servers([process for process, _url, _tokens in nodes])
+        raise
+    return nodes
+
+
+def stop_local_servers(processes):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.wait(timeout=10)
+
+
+def start_local_server(args, num_users, port=None, env=None):
+    port = port or args.port
+    tokens_file = tempfile.NamedTemporaryFile(prefix='loadtest-tokens-', suffix='.json', delete=False).name
+    command = [sys.executable, os.path.abspath(__file__), '--serve-only', '--port', str(port),
+               '--users', str(num_users), '--user-prefix', args.user_prefix, '--password', args.password,
+               '--tokens-file', tokens_file, '--server-max-connections', str(args.server_max_connections)]
+    log = open(f"{args.server_log}.{port}" if env else args.server_log, 'w') if args.server_log else subprocess.DEVNULL
+    process = subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT, env=dict(os.environ, **(env or {})))
+    url = f"http://127.0.0.1:{port}"
+
+    import requests
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Il server di carico è terminato (codice {process.returncode}).")
+        try:
+            if requests.get(f"{url}/metrics", timeout=1).status_code == 200 and os.path.getsize(tokens_file):
+                break
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    else:
+        process.kill()
+        raise RuntimeError("Il server di carico non si è avviato entro 60 secondi.")
+
+    with open(tokens_file) as f:
+        tokens = json.load(f)
+    os.unlink(tokens_file)
+    return process, url, tokens
+
+
+# ------------------------------------------------------------ misure
+
+class LoadStats:
+    """Latenze ed errori per evento. I client sono greenlet nello stesso thread: niente lock."""
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.timeouts = {}
+        # Messaggi ricevuti dai client per evento: mostra il costo dei broadcast (es. lobby_delta)
+        self.received = {}
+        self.redirects = 0
+        self.flows_ok = 0
+        self.flows_failed = 0
+
+    def record(self, event, seconds):
+        self.latencies.setdefault(event, []).append(seconds)
+
+    def error(self, event, message):
+        errors = self.errors.setdefault(event, {})
+        errors[message] = errors.get(message, 0) + 1
+
+    def timeout(self, event):
+        self.timeouts[event] = self.timeouts.get(event, 0) + 1
+
+    def report(self):
+        events = {}
+        for event in sorted(set(self.latencies) | set(self.errors) | set(self.timeouts)):
+            values = self.latencies.get(event)
+            events[event] = dict(summarize(values) if values else {'n': 0},
+                                 errors=self.errors.get(event, {}), timeouts=self.timeouts.get(event, 0))
+        return {'flows_ok': self.flows_ok, 'flows_failed': self.flows_failed, 'events': events,
+                'redirects': self.redirects, 'received': dict(sorted(self.received.items()))}
+
+
+class ProcessSampler:
+    """CPU (% di un core) e RSS di un processo locale, letti da /proc a intervalli regolari."""
+
+    def __init__(self, pid, interval=1.0):
+        self.pid = pid
+        self.interval = interval
+        self.samples = []
+        self._ticks = os.sysconf('SC_CLK_TCK')
+        self._page = os.sysconf('SC_PAGE_SIZE')
+        self._running = False
+
+    def _read(self):
+        with open(f"/proc/{self.pid}/stat") as f:
+            # I campi dopo il nome del comando (tra parentesi): utime e stime sono il 12° e il 13°
+            fields = f.read().rsplit(')', 1)[1].split()
+        with open(f"/proc/{self.pid}/statm") as f:
+            rss = int(f.read().split()[1]) * self._page
+        return (int(fields[11]) + int(fields[12])) / self._ticks, rss
+
+    def run(self):
+        import eventlet
+        self._running = True
+        previous_cpu, _ = self._read()
+        previous_time = time.monotonic()
+        while self._running:
+            eventlet.sleep(self.interval)
+            try:
+                cpu, rss = self._read()
+            except OSError:
+                return
+            now = time.monotonic()
+            self.samples.append((now, (cpu - previous_cpu) / (now - previous_time) * 100, rss))
+            previous_cpu, previous_time = cpu, now
+
+    def stop(self):
+        self._running = False
+
+    def cpu_seconds(self):
+        """CPU usata finora dal processo (utente + sistema), in secondi."""
+        try:
+            return self._read()[0]
+        except OSError:
+            return None
+
+    def summary(self, since, until):
+        window = [(cpu, rss) for t, cpu, rss in self.samples if since <= t <= until]
+        if not window:
+            return None
+        cpu = [c for c, _ in window]
+        return {
+            'samples': len(window),
+            'cpu_mean_percent': round(sum(cpu) / len(cpu), 1),
+            'cpu_max_percent': round(max(cpu), 1),
+            'rss_max_mb': round(max(r for _, r in window) / 2**20, 1)
+        }
+
+
+def merge_metrics(readings):
+    """Somma le letture di /metrics di più nodi."""
+    values = {}
+    for reading in readings:
+        for key, value in reading.items():
+            values[key] = values.get(key, 0) + value
+    return values
+
+
+def read_metrics(url):
+    """Metriche del server (/metrics) come {riga senza valore: valore}; {} se non disponibili."""
+    import requests
+    try:
+        response = requests.get(f"{url}/metrics", timeout=5)
+    except requests.RequestException:
+        return {}
+    if response.status_code != 200:
+        return {}
+    values = {}
+    for line in response.text.splitlines():
+        if line and not line.startswith('#'):
+            key, _, value = line.rpartition(' ')
+            values[key] = float(value)
+    return values
+
+
+def server_event_times(before, after):
+    """Tempo medio dei gestori lato server (e quota sul database) per evento, tra due letture di /metrics."""
+    result = {}
+    for key, total in after.items():
+        if not key.startswith('handup_socket_event_seconds_sum{'):
+            continue
+        labels = key[len('handup_socket_event_seconds_sum'):]
+        count = after.get(f"handup_socket_event_seconds_count{labels}", 0) - before.get(
+            f"handup_socket_event_seconds_count{labels}", 0)
+        if count <= 0:
+            continue
+        handler = total - before.get(key, 0)
+        db_key = f"handup_socket_event_db_seconds_sum{labels}"
+        db = after.get(db_key, 0) - before.get(db_key, 0)
+        event = labels.split('"')[1]
+        result[event] = {'n': int(count), 'handler_mean_ms': round(handler / count * 1000, 4),
+                         'db_mean_ms': round(db / count * 1000, 4)}
+    return result
+
+
+# ------------------------------------------------------------ client simulati (giocatori)
+
+class SimClient:
+    """Un giocatore: un socketio.Client che registra gli eventi ricevuti e misura le proprie chiamate."""
+
+    def __init__(self, user_id, token, stats, timeout):
+        self.user_id = user_id
+        self.token = token
+        self.stats = stats
+        self.timeout = timeout
+        self.sio = self._new_socket()
+        self.transports = None
+        self._arrivals = {}
+        self._waiters = {}
+
+    def _new_socket(self):
+        import socketio
+        sio = socketio.Client(reconnection=False, request_timeout=self.timeout)
+        sio.on('*', self._on_event)
+        return sio
+
+    def _on_event(self, event, *args):
+        self._arrivals[event] = (time.perf_counter(), args[0] if args else None)
+        self.stats.received[event] = self.stats.received.get(event, 0) + 1
+        waiter = self._waiters.pop(event, None)
+        if waiter is not None:
+            waiter.send(True)
+
+    def expect(self, event):
+        """Da chiamare prima dell'azione che provoca `event`, poi wait(event)."""
+        import eventlet.event
+        self._waiters[event] = eventlet.event.Event()
+
+    def wait(self, event):
+        """Attende l'evento annunciato con expect(); ritorna (istante di arrivo, payload)."""
+        import eventlet
+        waiter = self._waiters.get(event)
+        if waiter is not None:
+            with eventlet.Timeout(self.timeout, False):
+                waiter.wait()
+            if not waiter.ready():
+                self.stats.timeout(event)
+                raise FlowFailed(f"{event} non ricevuto entro {self.timeout}s")
+        return self._arrivals[event]
+
+    def connect(self, url, transports):
+        self.transports = transports
+        self.expect('connected')
+        start = time.perf_counter()
+        try:
+            self.sio.connect(f"{url}?token={self.token}", transports=transports, wait_timeout=self.timeout)
+        except Exception as e:
+            self.stats.error('connect', type(e).__name__)
+            raise FlowFailed(f"connessione non riuscita: {e}") from e
+        arrived, _ = self.wait('connected')
+        self.stats.record('connect', arrived - start)
+
+    def call(self, event, data):
+        """Emette l'evento e ne attende l'ack: la latenza comprende il gestore e l'andata/ritorno."""
+        import socketio
+        start = time.perf_counter()
+        try:
+            self.sio.call(event, data, timeout=self.timeout)
+        except socketio.exceptions.TimeoutError:
+            self.stats.timeout(event)
+            raise FlowFailed(f"{event}: nessun ack entro {self.timeout}s")
+        except socketio.exceptions.SocketIOError as e:
+            # Es. connessione chiusa dal server sovraccarico
+            self.stats.error(event, type(e).__name__)
+            raise FlowFailed(f"{event}: {e}") from e
+        self.stats.record(event, time.perf_counter() - start)
+        redirect = self._arrivals.get('lobby_redirect')
+        if redirect is not None and redirect[0] >= start:
+            # La lobby è di un altro nodo: ci si ricollega lì e si ripete l'evento, come l'app
+            self.stats.redirects += 1
+            self.disconnect()
+            self.sio = self._new_socket()
+            self.connect(redirect[1]['url'], self.transports)
+            return self.call(event, data)
+        error = self._arrivals.get('error')
+        if error is not None and error[0] >= start:
+            message = (error[1] or {}).get('error', 'errore')
+            self.stats.error(event, message)
+            raise FlowFailed(f"{event}: {message}")
+        return start
+
+    def disconnect(self):
+        try:
+            self.sio.disconnect()
+        except Exception:
+            pass
+
+
+def _together(clients, action, think_ms, rng):
+    """Esegue `action(client)` per tutti i client in parallelo, ognuno dopo un tempo di reazione casuale."""
+    import eventlet
+
+    def run(client, delay):
+        # Le eccezioni tornano come valore: eventlet stamperebbe il traceback di ogni greenlet fallito
+        eventlet.sleep(delay)
+        try:
+            return action(client), None
+        except FlowFailed as e:
+            return None, e
+
+    threads = [eventlet.spawn(run, client, rng.uniform(0, think_ms) / 1000) for client in clients]
+    results, failure = [], None
+    for thread in threads:
+        result, error = thread.wait()
+        results.append(result)
+        failure = failure or error
+    if failure is not None:
+        raise failure
+    return results
+
+
+def run_classroom(index, members, urls, options, stats):
+    """
+    Una classe: il primo giocatore crea la lobby, gli altri entrano, votano, giocano ed escono.
+    Con più nodi (`urls`) le lobby si distribuiscono tra i nodi e ogni giocatore parte da un nodo diverso.
+    """
+    import eventlet
+    rng = random.Random(options['seed'] * 100003 + index)
+    clients = [SimClient(user_id, token, stats, options['timeout']) for user_id, token in members]
+    first_url = {client: urls[(index + i) % len(urls)] for i, client in enumerate(clients)}
+    creator, students = clients[0], clients[1:]
+    think_ms = options['think_ms']
+    try:
+        _together(clients, lambda c: c.connect(first_url[c], options['transports']), think_ms, rng)
+        for game in range(options['rounds']):
+            creator.expect('lobby_created')
+            creator.call('create_lobby', {'lobby_name': f"Classe {index}.{game}", 'type': 'pub',
+                                          'num_players': len(clients)})
+            lobby_id = creator.wait('lobby_created')[1]['lobby']['lobby_id']
+
+            _together(students, lambda c: c.call('join_lobby', {'lobby_id': lobby_id}), think_ms, rng)
+            _together(students, lambda c: c.call('toggle_ready', {'lobby_id': lobby_id, 'is_ready': True}),
+                      think_ms, rng)
+
+            # Broadcast: dall'ultimo voto inviato all'arrivo di vote_result a ogni giocatore
+            for client in clients:
+                client.expect('vote_result')
+            sent = _together(clients, lambda c: c.call('vote_mode', {'lobby_id': lobby_id, 'mode': rng.choice(MODES)}),
+                             think_ms, rng)
+            for client in clients:
+                stats.record('broadcast:vote_result', client.wait('vote_result')[0] - max(sent))
+
+            for client in clients:
+                client.expect('start_timer')
+            sent = _together(clients, lambda c: c.call('player_on_game_screen', {'lobby_id': lobby_id}),
+                             think_ms, rng)
+            for client in clients:
+                stats.record('broadcast:start_timer', client.wait('start_timer')[0] - max(sent))
+
+            eventlet.sleep(options['game_seconds'])
+            _together(clients, lambda c: c.call('leave_lobby', {'lobby_id': lobby_id}), think_ms, rng)
+        stats.flows_ok += 1
+    except FlowFailed:
+        stats.flows_failed += 1
+    except Exception as e:
+        # Risposta inattesa dal server: la classe conta come fallita, le altre proseguono
+        stats.error('flow', f"{type(e).__name__}: {e}")
+        stats.flows_failed += 1
+    finally:
+        for client in clients:
+            client.disconnect()
+
+
+def login_tokens(url, user_ids, password, register, concurrency, stats):
+    """Token ottenuti da /login (dopo /register se richiesto), come farebbe l'app."""
+    import eventlet
+    import requests
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    def authenticate(user_id):
+        email = user_email(user_id)
+        if register:
+            start = time.perf_counter()
+            response = session.post(f"{url}/register", json={'username': user_id, 'email': email, 'password': password,
+                                                             'confirm_password': password}, timeout=60)
+            # 400 = utente già registrato da un run precedente
+            if response.status_code not in (201, 400):
+                stats.error('http:register', str(response.status_code))
+            else:
+                stats.record('http:register', time.perf_counter() - start)
+        start = time.perf_counter()
+        response = session.post(f"{url}/login", json={'email': email, 'password': password}, timeout=60)
+        if response.status_code != 200:
+            stats.error('http:login', str(response.status_code))
+            return user_id, None
+        stats.record('http:login', time.perf_counter() - start)
+        return user_id, response.json()['access_token']
+
+    pool = eventlet.GreenPool(concurrency)
+    return {user_id: token for user_id, token in pool.imap(authenticate, user_ids) if token}
+
+
+def run_stage(num_lobbies, users, tokens, urls, options, samplers):
+    """Un gradino di carico: `num_lobbies` classi in parallelo sui nodi `urls`, avviate nell'arco di ramp_seconds."""
+    import eventlet
+    stats = LoadStats()
+    players = options['players']
+    metrics_before = merge_metrics(read_metrics(url) for url in urls)
+    cpu_before = [sampler.cpu_seconds() for sampler in samplers]
+    started = time.monotonic()
+
+    threads = []
+    for index in range(num_lobbies):
+        members = [(user_id, tokens[user_id]) for user_id in users[index * players:(index + 1) * players]]
+        delay = options['ramp_seconds'] * index / num_lobbies
+        threads.append(eventlet.spawn_after(delay, run_classroom, index, members, urls, options, stats))
+    for thread in threads:
+        thread.wait()
+
+    finished = time.monotonic()
+    metrics_after = merge_metrics(read_metrics(url) for url in urls)
+    report = dict(stats.report(), lobbies=num_lobbies, clients=num_lobbies * players,
+                  wall_s=round(finished - started, 3),
+                  server_events=server_event_times(metrics_before, metrics_after))
+    report['flows_per_s'] = round(stats.flows_ok / report['wall_s'], 3) if report['wall_s'] else None
+    if len(samplers) == 1:
+        report['server'] = samplers[0].summary(started, finished)
+    elif samplers:
+        report['servers'] = [sampler.summary(started, finished) for sampler in samplers]
+    cpu_after = [sampler.cpu_seconds() for sampler in samplers]
+    if samplers and None not in cpu_before + cpu_after:
+        report['server_cpu_s'] = round(sum(cpu_after) - sum(cpu_before), 3)
+        if stats.flows_ok:
+            report['server_cpu_ms_per_flow'] = round(report['server_cpu_s'] / stats.flows_ok * 1000, 2)
+    return report
+
+
+def scaling_summary(runs):
+    """
+    Per ogni gradino: CPU dei server (somma dei nodi) per classe completata con N nodi ed efficienza
+    rispetto a un nodo (1.0 = lineare: nessun costo di coordinamento tra i nodi), più flows_per_s.
+    """
+    base = next((run for run in runs if run['nodes'] == 1), None)
+    if base is None:
+        return None
+    summary = []
+    for i, base_stage in enumerate(base['stages']):
+        entry = {'lobbies_per_node': base_stage['lobbies'], 'cpu_ms_per_flow': {}, 'efficiency': {},
+                 'flows_per_s': {}}
+        base_cost = base_stage.get('server_cpu_ms_per_flow')
+        for run in runs:
+            stage = run['stages'][i]
+            cost = stage.get('server_cpu_ms_per_flow')
+            entry['cpu_ms_per_flow'][run['nodes']] = cost
+            entry['flows_per_s'][run['nodes']] = stage['flows_per_s']
+            if base_cost and cost:
+                entry['efficiency'][run['nodes']] = round(base_cost / cost, 3)
+        summary.append(entry)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generatore di carico Socket.IO per le lobby di HandUp.")
+    parser.add_argument('--url', help="Server da caricare (es. http://127.0.0.1:5001).")
+    parser.add_argument('--serve', action='store_true',
+                        help="Avvia un server locale su Supabase in memoria con gli utenti del test.")
+    parser.add_argument('--port', type=int, default=5055, help="Porta del server locale (--serve).")
+    parser.add_argument('--server-max-connections', type=int, default=1024,
+                        help="Connessioni contemporanee accettate dal server locale (max_size di eventlet).")
+    parser.add_argument('--server-log', help="File in cui salvare il log del server locale.")
+    parser.add_argument('--server-pid', type=int, help="PID di un server locale già avviato, per misurarne la CPU.")
+    parser.add_argument('--nodes', default='1',
+                        help="Con --serve, numero di server locali; più valori separati da virgola = confronto di scalabilità.")
+    parser.add_argument('--redis', help="Redis condiviso dai server locali di --nodes (stato delle lobby e coda dei messaggi).")
+    parser.add_argument('--lobbies', default='10', help="Lobby contemporanee; più valori separati da virgola = gradini.")
+    parser.add_argument('--players', type=int, default=4, help="Giocatori per lobby (il primo la crea).")
+    parser.add_argument('--rounds', type=int, default=1, help="Partite giocate da ogni classe.")
+    parser.add_argument('--game-seconds', type=float, default=2.0, help="Durata simulata di una partita.")
+    parser.add_argument('--think-ms', type=float, default=200.0, help="Tempo di reazione massimo di un giocatore.")
+    parser.add_argument('--ramp-seconds', type=float, default=5.0, help="Arco di tempo in cui partono le classi.")
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--transports', help="Trasporti Engine.IO, es. websocket oppure polling.")
+    parser.add_argument('--auth', choices=('mint', 'login'), default='mint',
+                        help="mint: JWT firmati localmente; login: token da /login.")
+    parser.add_argument('--register', action='store_true', help="Con --auth login, registra prima gli utenti.")
+    parser.add_argument('--jwt-secret', default=os.getenv('JWT_SECRET_KEY'),
+                        help="Segreto JWT del server per --auth mint senza --serve.")
+    parser.add_argument('--login-concurrency', type=int, default=50)
+    parser.add_argument('--user-prefix', default='loadtest-')
+    parser.add_argument('--password', default='loadtest-password')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--sample-interval', type=float, default=1.0)
+    parser.add_argument('--output', help="File JSON dei risultati (default: stdout).")
+    parser.add_argument('--serve-only', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--users', type=int, default=0, help=argparse.SUPPRESS)
+    parser.add_argument('--tokens-file', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.serve_only:
+        serve(args)
+        return 0
+    if bool(args.url) == args.serve:
+        parser.error("Indicare --url oppure --serve.")
+    stages = [int(n) for n in args.lobbies.split(',') if n.strip()]
+    if args.players < 2:
+        parser.error("Servono almeno 2 giocatori per lobby.")
+    if args.auth == 'mint' and not args.serve and not args.jwt_secret:
+        parser.error("--auth mint verso un server esistente richiede --jwt-secret (o JWT_SECRET_KEY).")
+    node_counts = [int(n) for n in args.nodes.split(',') if n.strip()]
+    scaling = node_counts != [1] or args.redis is not None
+    if scaling:
+        if not args.serve:
+            parser.error("--nodes richiede --serve.")
+        if not args.redis:
+            parser.error("--nodes richiede --redis (stato delle lobby e coda dei messaggi condivisi).")
+        if args.auth != 'mint':
+            parser.error("--nodes supporta solo --auth mint.")
+
+    # I client sono greenlet: socket, thread e sleep di requests/socketio diventano cooperativi
+    import eventlet
+    eventlet.monkey_patch()
+    _raise_fd_limit()
+
+    transports = args.transports.split(',') if args.transports else None
+    if transports is None and importlib.util.find_spec('websocket') is None:
+        # Senza websocket-client ogni client avviserebbe da solo: si sceglie subito il long-polling
+        print("websocket-client non installato: i client usano il long-polling.", file=sys.stderr)
+        transports = ['polling']
+
+    options = {
+        'players': args.players,
+        'rounds': args.rounds,
+        'game_seconds': args.game_seconds,
+        'think_ms': args.think_ms,
+        'ramp_seconds': args.ramp_seconds,
+        'timeout': args.timeout,
+        'transports': transports,
+        'seed': args.seed
+    }
+    if scaling:
+        results = dict({'environment': environment_info(), 'options': dict(options, auth=args.auth)},
+                       **run_scaling(args, stages, node_counts, options))
+        all_stages = [stage for run in results['runs'] for stage in run['stages']]
+    else:
+        results = run_single(args, stages, options)
+        all_stages = results['stages']
+
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    # Se il generatore satura un core i tempi misurati includono la sua attesa, non solo quella del server
+    results['generator'] = {'cpu_s': round(usage.ru_utime + usage.ru_stime, 3),
+                            'peak_rss_mb': round(usage.ru_maxrss / 1024, 1)}
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    return 0 if all(stage['flows_failed'] == 0 for stage in all_stages) else 1
+
+
+def run_single(args, stages, options):
+    """Gradini di carico su un solo server: quello di --url o uno locale (--serve)."""
+    import eventlet
+    num_users = max(stages) * args.players
+    users = user_ids_for(args.user_prefix, num_users)
+    server_process = None
+    server_pid = args.server_pid
+    url = args.url.rstrip('/') if args.url else None
+    if args.serve:
+        print(f"Avvio del server locale per {num_users} utenti...", file=sys.stderr)
+        server_process, url, served_tokens = start_local_server(args, num_users)
+        server_pid = server_process.pid
+
+    results = {'environment': environment_info(), 'options': dict(options, auth=args.auth, url=url),
+               'stages': []}
+
+    samplers = []
+    try:
+        if server_pid:
+            samplers.append(ProcessSampler(server_pid, args.sample_interval))
+            eventlet.spawn(samplers[0].run)
+
+        if args.auth == 'login':
+            auth_stats = LoadStats()
+            tokens = login_tokens(url, users, args.password, args.register, args.login_concurrency, auth_stats)
+            results['auth'] = auth_stats.report()['events']
+            if len(tokens) < num_users:
+                raise RuntimeError(f"Autenticati {len(tokens)} utenti su {num_users}.")
+        elif args.serve:
+            tokens = served_tokens
+        else:
+            tokens = mint_tokens(args.jwt_secret, users)
+
+        for num_lobbies in stages:
+            print(f"Gradino: {num_lobbies} lobby, {num_lobbies * args.players} client...", file=sys.stderr)
+            results['stages'].append(run_stage(num_lobbies, users, tokens, [url], options, samplers))
+    finally:
+        for sampler in samplers:
+            sampler.stop()
+        if server_process is not None:
+            stop_local_servers([server_process])
+    return results
+
+
+def run_scaling(args, stages, node_counts, options):
+    """
+    Gli stessi gradini (in lobby per nodo) su 1..N server locali che condividono --redis: con N nodi
+    ogni gradino ha N volte le lobby. Conviene scegliere --lobbies vicino alla saturazione di un nodo.
+    """
+    import eventlet
+    num_users = max(stages) * args.players * max(node_counts)
+    users = user_ids_for(args.user_prefix, num_users)
+    runs = []
+    first_port = args.port
+    for num_nodes in node_counts:
+        print(f"Avvio di {num_nodes} server locali per {num_users} utenti...", file=sys.stderr)
+        nodes = start_local_nodes(args, num_users, num_nodes, first_port)
+        # Porte nuove a ogni giro: gli indirizzi dei nodi appena fermati restano registrati per LOBBY_CLAIM_TTL
+        first_port += num_nodes
+        processes = [process for process, _url, _tokens in nodes]
+        urls = [url for _process, url, _tokens in nodes]
+        tokens = nodes[0][2]
+        samplers = [ProcessSampler(process.pid, args.sample_interval) for process in processes]
+        for sampler in samplers:
+            eventlet.spawn(sampler.run)
+
+        run = {'nodes': num_nodes, 'urls': urls, 'stages': []}
+        try:
+            for lobbies_per_node in stages:
+                num_lobbies = lobbies_per_node * num_nodes
+                print(f"{num_nodes} nodi, gradino: {num_lobbies} lobby, {num_lobbies * args.players} client...",
+                      file=sys.stderr)
+                run['stages'].append(run_stage(num_lobbies, users, tokens, urls, options, samplers))
+        finally:
+            for sampler in samplers:
+                sampler.stop()
+            stop_local_servers(processes)
+        runs.append(run)
+    return {'runs': runs, 'scaling': scaling_summary(runs)}
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,144 @@
+# lobby_feed.py
+
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class LobbyFeed:
+    """
+    Feed versionato della lista delle lobby.
+
+    Invece di rimandare tutte le lobby a ogni modifica, i gestori segnalano le lobby cambiate con
+    `mark_changed()`; dopo `tick` secondi le modifiche accumulate vengono inviate in un unico
+    evento 'lobby_delta':
+
+        {"seq": n, "added": [lobby, ...], "updated": [lobby, ...], "removed": [lobby_id, ...]}
+
+    `seq` cresce di 1 a ogni delta. Il client parte da uno snapshot ({"seq", "lobbies"}) e applica
+    i delta successivi in ordine; se trova un buco nella sequenza richiede un nuovo snapshot.
+    Le lobby in `added`/`updated` sono complete, quindi applicare due volte lo stesso delta
+    (es. uno snapshot che contiene già modifiche non ancora inviate) non cambia il risultato.
+
+    Con più nodi `next_seq`/`current_seq` leggono un contatore condiviso (es. StateStore), così
+    i delta di tutti i nodi formano un'unica sequenza.
+
+    `known_lobbies()` ritorna le lobby che i client conoscono già (es. quelle ricostruite dal DB
+    dopo un riavvio): le loro prime modifiche escono come `updated` invece che come `added`.
+    Viene letta al primo flush o snapshot, così il registro delle lobby può caricarsi in ritardo.
+
+    Il lock protegge solo lo stato del feed e non viene mai tenuto mentre si chiamano
+    `known_lobbies`, `get_lobby`, `list_lobbies` o `next_seq`/`current_seq`: possono attendere il
+    caricamento del registro o Redis, e chi carica il registro chiama `mark_changed()`.
+    """
+
+    def __init__(self, get_lobby, list_lobbies, emit, start_background_task, sleep, tick=0.05,
+                 next_seq=None, current_seq=None, known_lobbies=None):
+        self._get_lobby = get_lobby
+        self._list_lobbies = list_lobbies
+        self._emit = emit
+        self._start_background_task = start_background_task
+        self._sleep = sleep
+        self.tick = tick
+        self._next_seq = next_seq
+        self._current_seq = current_seq
+        self._known_lobbies = known_lobbies
+
+        self._lock = threading.Lock()
+        self._changed = set()
+        self._known = set()
+        self._scheduled = False
+        self.seq = 0
+        self.deltas_sent = 0
+        self.changes_coalesced = 0
+
+    def mark_changed(self, lobby_id):
+        with self._lock:
+            if lobby_id in self._changed:
+                self.changes_coalesced += 1
+            self._changed.add(lobby_id)
+            if self._scheduled:
+                return
+            self._scheduled = True
+        self._start_background_task(self._run)
+
+    def _run(self):
+        # Un solo task attivo alla volta: i delta escono nell'ordine del loro seq
+        while True:
+            self._sleep(self.tick)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Errore nell'invio del delta delle lobby: {e}")
+            with self._lock:
+                if not self._changed:
+                    self._scheduled = False
+                    return
+
+    def flush(self):
+        """Invia le modifiche accumulate; ritorna il delta inviato o None se non c'era nulla."""
+        with self._lock:
+            if not self._changed:
+                return None
+        self._seed()
+        with self._lock:
+            changed = self._changed
+            self._changed = set()
+
+        # Letture fuori dal lock; un solo task di flush alla volta (_run), quindi niente corse sul seq
+        lobbies = {lobby_id: self._get_lobby(lobby_id) for lobby_id in changed}
+        added, updated, removed = [], [], []
+        with self._lock:
+            for lobby_id, lobby in lobbies.items():
+                if lobby is None:
+                    if lobby_id in self._known:
+                        self._known.discard(lobby_id)
+                        removed.append(lobby_id)
+                elif lobby_id in self._known:
+                    updated.append(lobby)
+                else:
+                    self._known.add(lobby_id)
+                    added.append(lobby)
+
+        if not (added or updated or removed):
+            # Lobby creata e chiusa nello stesso tick: nessuno l'ha mai vista
+            return None
+        seq = self._next_seq() if self._next_seq else self.seq + 1
+        self.seq = seq
+        delta = {'seq': seq, 'added': added, 'updated': updated, 'removed': removed}
+
+        self._emit(delta)
+        self.deltas_sent += 1
+        return delta
+
+    def snapshot(self):
+        """Lista completa delle lobby con il numero di sequenza da cui applicare i delta."""
+        self._seed()
+        # Seq letto prima della lista: i delta tra le due letture vengono riapplicati, senza effetti
+        seq = self._current_seq() if self._current_seq else self.seq
+        lobbies = self._list_lobbies()
+        with self._lock:
+            self._known.update(lobby['lobby_id'] for lobby in lobbies)
+        return {'seq': seq, 'lobbies': lobbies}
+
+    def seed(self, lobby_ids):
+        """Segna come già note ai client le lobby indicate (es. prese in carico da un nodo caduto)."""
+        self._seed()
+        with self._lock:
+            self._known.update(lobby_ids)
+
+    def _seed(self):
+        # known_lobbies() viene chiamata una sola volta, fuori dal lock
+        with self._lock:
+            known_lobbies, self._known_lobbies = self._known_lobbies, None
+        if known_lobbies is not None:
+            try:
+                lobby_ids = known_lobbies()
+            except Exception:
+                # Es. registro non caricato: si riprova al prossimo flush o snapshot
+                with self._lock:
+                    self._known_lobbies = known_lobbies
+                raise
+            with self._lock:
+                self._known.update(lobby_ids)
@@ -0,0 +1,569 @@
+# lobby_store.py
+
+import logging
+import random
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict
+from heapq import merge
+
+logger = logging.getLogger(__name__)
+
+
+class LobbyFull(Exception):
+    """La lobby ha già raggiunto il numero massimo di giocatori."""
+
+
+class WrongLobbyPassword(Exception):
+    """Password errata per una lobby protetta."""
+
+
+class Lobby:
+    """Stato in memoria di una lobby attiva."""
+
+    __slots__ = ('id', 'lobby_id', 'lobby_name', 'type', 'num_players', 'password',
+                 'creator_id', 'players', 'created_at', 'order')
+
+    def __init__(self, id, lobby_id, lobby_name, type, num_players, password, creator_id):
+        self.id = id
+        self.lobby_id = lobby_id
+        self.lobby_name = lobby_name
+        self.type = type
+        self.num_players = num_players
+        self.password = password
+        self.creator_id = creator_id
+        # user_id -> {"user_id", "username", "is_ready"}, in ordine di ingresso
+        self.players = OrderedDict()
+        self.created_at = time.time()
+        # Chiave di ordinamento (crescente) usata come cursore nella paginazione
+        self.order = 0
+
+    @property
+    def is_locked(self):
+        return bool(self.password)
+
+    @property
+    def current_players(self):
+        return len(self.players)
+
+    @property
+    def free_seats(self):
+        return max(self.num_players - len(self.players), 0)
+
+    def to_dict(self):
+        """Formato inviato ai client in 'lobby_snapshot'/'lobby_delta' e da GET /lobbies."""
+        return {
+            "id": self.id,
+            "lobby_id": self.lobby_id,
+            "lobby_name": self.lobby_name,
+            "type": self.type,
+            "num_players": self.num_players,
+            "current_players": self.current_players,
+            "creator": self.creator_id,
+            "is_locked": self.is_locked,
+            "players": [dict(p) for p in self.players.values()]
+        }
+
+    def _persisted_view(self):
+        return {
+            'db_id': self.id,
+            'creator_id': self.creator_id,
+            'players': {uid: p['is_ready'] for uid, p in self.players.items()}
+        }
+
+
+class LobbyRegistry:
+    """
+    Fonte di verità in memoria per le lobby attive: lobby, giocatori, stato "pronto" e creatore.
+
+    Le letture sono O(1) sul codice lobby; per la ricerca con filtri (`query()`) sono mantenuti
+    indici secondari per tipo, lobby protette e posti liberi, ognuno ordinato per creazione
+    (`order`, il cursore di paginazione): una pagina costa una ricerca binaria più le lobby
+    scorse, senza ordinamenti. Le modifiche marcano la lobby come "sporca" e
+    vengono scritte su Supabase (tabelle `lobbies` e `lobby_players`) in batch da `flush()`,
+    chiamata periodicamente da un task in background (write-behind): ad ogni flush lo stato
+    corrente viene confrontato con l'ultimo stato salvato, quindi modifiche che si annullano
+    tra due flush non generano scritture.
+
+    `supabase` è un data_access.DataAccess: le scritture usano i suoi `insert_many()`/`delete_many()`.
+
+    Con `get_usernames(user_ids) -> {user_id: username}` (es. una cache dei profili) `recover()`
+    prende gli username da lì invece che dal join con la tabella `users`.
+    """
+
+    def __init__(self, supabase, get_usernames=None, max_flush_retries=5):
+        self._supabase = supabase
+        self._get_usernames = get_usernames
+        self.max_flush_retries = max_flush_retries
+        self._lock = threading.Lock()
+        self._by_code = {}
+        self._persisted = {}
+        self._dirty = set()
+        self._flush_failures = {}
+        self.flushes = 0
+        self.flush_errors = 0
+        self.flush_dropped = 0
+
+        # Indici secondari: liste ordinate di `order` (cursore di paginazione), più order -> lobby
+        self._next_order = 0
+        self._by_order = {}
+        self._order_keys = []
+        self._by_type = {}
+        self._by_free_seats = {}
+        self._locked = []
+
+    # ------------------------------------------------------------------- indici
+
+    def _index_locked(self, lobby):
+        self._next_order += 1
+        lobby.order = self._next_order
+        self._by_code[lobby.lobby_id] = lobby
+        self._by_order[lobby.order] = lobby
+        insort(self._order_keys, lobby.order)
+        insort(self._by_type.setdefault(lobby.type, []), lobby.order)
+        insort(self._by_free_seats.setdefault(lobby.free_seats, []), lobby.order)
+        if lobby.is_locked:
+            insort(self._locked, lobby.order)
+
+    def _unindex_locked(self, lobby):
+        del self._by_code[lobby.lobby_id]
+        del self._by_order[lobby.order]
+        _remove_sorted(self._order_keys, lobby.order)
+        _remove_indexed(self._by_type, lobby.type, lobby.order)
+        _remove_indexed(self._by_free_seats, lobby.free_seats, lobby.order)
+        if lobby.is_locked:
+            _remove_sorted(self._locked, lobby.order)
+
+    def _reindex_free_seats_locked(self, lobby, old_free_seats):
+        if lobby.free_seats != old_free_seats:
+            _remove_indexed(self._by_free_seats, old_free_seats, lobby.order)
+            insort(self._by_free_seats.setdefault(lobby.free_seats, []), lobby.order)
+
+    # ------------------------------------------------------------------ letture
+
+    def get(self, lobby_code):
+        return self._by_code.get(lobby_code)
+
+    def lobby_dict(self, lobby_code):
+        with self._lock:
+            lobby = self._by_code.get(lobby_code)
+            return lobby.to_dict() if lobby is not None else None
+
+    def codes(self):
+        with self._lock:
+            return list(self._by_code)
+
+    def all_lobbies(self):
+        with self._lock:
+            return [lobby.to_dict() for lobby in self._by_code.values()]
+
+    def player_count(self, lobby_code):
+        lobby = self._by_code.get(lobby_code)
+        return lobby.current_players if lobby else 0
+
+    def query(self, lobby_type=None, is_locked=None, min_free_seats=0, cursor=0, limit=20):
+        """
+        Lobby filtrate per tipo, protezione con password e posti liberi, in ordine di creazione.
+        Ritorna (lista di lobby serializzate, cursore della pagina successiva o None); il cursore
+        va ripassato come `cursor` per continuare.
+        """
+        with self._lock:
+            # Ogni filtro indicizzato è un gruppo di liste ordinate per `order`
+            sources = []
+            if lobby_type is not None:
+                sources.append([self._by_type.get(lobby_type, [])])
+            if is_locked:
+                sources.append([self._locked])
+            if min_free_seats > 0:
+                sources.append([orders for free, orders in self._by_free_seats.items() if free >= min_free_seats])
+
+            if sources:
+                # Si scorre l'indice più selettivo dal cursore in poi (fondendo le sue liste già
+                # ordinate) e si verificano gli altri filtri lobby per lobby
+                orders = merge(*(_orders_after(orders, cursor) for orders in min(sources, key=_total_len)))
+            else:
+                orders = _orders_after(self._order_keys, cursor)
+            candidates = (self._by_order[order] for order in orders)
+
+            page = []
+            has_more = False
+            for lobby in candidates:
+                if lobby_type is not None and lobby.type != lobby_type:
+                    continue
+                if is_locked is not None and lobby.is_locked != is_locked:
+                    continue
+                if lobby.free_seats < min_free_seats:
+                    continue
+                if len(page) == limit:
+                    has_more = True
+                    break
+                page.append(lobby)
+
+            next_cursor = page[-1].order if has_more else None
+            return [lobby.to_dict() for lobby in page], next_cursor
+
+    # ---------------------------------------------------------------- modifiche
+
+    def add_lobby(self, lobby, creator_username):
+        """Registra una lobby appena inserita su DB e vi aggiunge il creatore."""
+        with self._lock:
+            # La riga in `lobbies` esiste già (inserita in modo sincrono), i giocatori no
+            self._persisted[lobby.lobby_id] = {'db_id': lobby.id, 'creator_id': lobby.creator_id, 'players': {}}
+            lobby.players[lobby.creator_id] = {
+                'user_id': lobby.creator_id, 'username': creator_username, 'is_ready': False
+            }
+            self._index_locked(lobby)
+            self._dirty.add(lobby.lobby_id)
+        return lobby
+
+    def add_player(self, lobby_code, user_id, username, password=None):
+        """
+        Aggiunge un giocatore. Ritorna (lobby, già_presente).
+        Solleva KeyError, LobbyFull o WrongLobbyPassword.
+        """
+        with self._lock:
+            lobby = self._by_code.get(lobby_code)
+            if lobby is None:
+                raise KeyError(lobby_code)
+            if user_id in lobby.players:
+                return lobby, True
+            if lobby.current_players >= lobby.num_players:
+                raise LobbyFull(lobby_code)
+            if lobby.password and password != lobby.password:
+                raise WrongLobbyPassword(lobby_code)
+            old_free_seats = lobby.free_seats
+            lobby.players[user_id] = {'user_id': user_id, 'username': username, 'is_ready': False}
+            self._reindex_free_seats_locked(lobby, old_free_seats)
+            self._dirty.add(lobby_code)
+            return lobby, False
+
+    def remove_player(self, lobby_code, user_id):
+        """
+        Rimuove un giocatore. Se la lobby resta vuota viene chiusa; se esce il creatore la
+        ownership passa casualmente a un altro giocatore.
+        Ritorna (lobby, chiusa, nuovo_owner) oppure solleva KeyError.
+        """
+        with self._lock:
+            lobby = self._by_code.get(lobby_code)
+            if lobby is None:
+                raise KeyError(lobby_code)
+            old_free_seats = lobby.free_seats
+            lobby.players.pop(user_id, None)
+            self._reindex_free_seats_locked(lobby, old_free_seats)
+            self._dirty.add(lobby_code)
+
+            if not lobby.players:
+                self._unindex_locked(lobby)
+                return lobby, True, None
+
+            new_owner = None
+            if lobby.creator_id == user_id:
+                new_owner = random.choice(list(lobby.players))
+                lobby.creator_id = new_owner
+            return lobby, False, new_owner
+
+    def set_ready(self, lobby_code, user_id, is_ready):
+        with self._lock:
+            lobby = self._by_code.get(lobby_code)
+            if lobby is None:
+                raise KeyError(lobby_code)
+            player = lobby.players.get(user_id)
+            if player is not None:
+                player['is_ready'] = bool(is_ready)
+                self._dirty.add(lobby_code)
+            return lobby
+
+    # ----------------------------------------------------------- persistenza
+
+    def flush(self):
+        """
+        Scrive su Supabase, in batch, le differenze delle lobby modificate dall'ultimo flush.
+
+        Ogni gruppo di istruzioni (eliminazione lobby, uscite, ingressi, stato "pronto", creatore)
+        viene applicato e registrato per conto suo; un gruppo in batch che fallisce viene ritentato
+        lobby per lobby, così una riga rifiutata (es. una lobby eliminata nel frattempo) blocca solo
+        la propria lobby. Le lobby non salvate tornano "sporche" per il flush successivo, fino a
+        `max_flush_retries` tentativi consecutivi falliti. Ritorna il numero di lobby salvate.
+        """
+        with self._lock:
+            if not self._dirty:
+                return 0
+            dirty = self._dirty
+            self._dirty = set()
+            plan = []
+            for code in dirty:
+                lobby = self._by_code.get(code)
+                current = lobby._persisted_view() if lobby is not None else None
+                plan.append((code, current, self._persisted.get(code)))
+
+        lobby_deletes = []
+        player_deletes = []
+        player_inserts = []
+        ready_updates = []
+        creator_updates = []
+
+        for code, current, persisted in plan:
+            if current is None:
+                if persisted is not None:
+                    # ON DELETE CASCADE rimuove anche le righe di lobby_players
+                    lobby_deletes.append((code, persisted['db_id']))
+                continue
+            db_id = current['db_id']
+            before = persisted['players'] if persisted else {}
+            after = current['players']
+
+            removed = [uid for uid in before if uid not in after]
+            if removed:
+                player_deletes.append((code, (db_id, removed)))
+            ready_by_value = {}
+            for uid, is_ready in after.items():
+                if uid not in before:
+                    player_inserts.append((code, {'lobby_id': db_id, 'user_id': uid, 'is_ready': is_ready}))
+                elif before[uid] != is_ready:
+                    ready_by_value.setdefault(is_ready, []).append(uid)
+            for is_ready, user_ids in ready_by_value.items():
+                ready_updates.append((code, (db_id, is_ready, user_ids)))
+            if persisted and persisted['creator_id'] != current['creator_id']:
+                creator_updates.append((code, (db_id, current['creator_id'])))
+
+        supabase = self._supabase
+        persisted = self._persisted
+
+        def delete_players(item):
+            db_id, user_ids = item
+            supabase.delete_many('lobby_players', 'user_id', user_ids, lobby_id=db_id)
+
+        def update_ready(item):
+            db_id, is_ready, user_ids = item
+            supabase.table('lobby_players').update({'is_ready': is_ready}) \
+                .eq('lobby_id', db_id).in_('user_id', user_ids).execute()
+
+        def update_creator(item):
+            db_id, creator_id = item
+            supabase.table('lobbies').update({'creator_id': creator_id}).eq('id', db_id).execute()
+
+        # Durante il flush una lobby può sparire da _persisted (evict verso un altro nodo, recover):
+        # la sua scrittura è andata a buon fine ma non c'è più uno stato da aggiornare
+        def record_players_deleted(code, item):
+            view = persisted.get(code)
+            if view is not None:
+                for uid in item[1]:
+                    view['players'].pop(uid, None)
+
+        def record_player_inserted(code, row):
+            view = persisted.get(code)
+            if view is not None:
+                view['players'][row['user_id']] = row['is_ready']
+
+        def record_ready(code, item):
+            _db_id, is_ready, user_ids = item
+            view = persisted.get(code)
+            if view is not None:
+                view['players'].update(dict.fromkeys(user_ids, is_ready))
+
+        def record_creator(code, item):
+            view = persisted.get(code)
+            if view is not None:
+                view['creator_id'] = item[1]
+
+        failed = {}
+        self._write_group('lobbies.delete', lobby_deletes, failed,
+                          write_one=lambda db_id: supabase.delete_many('lobbies', 'id', [db_id]),
+                          write_batch=lambda db_ids: supabase.delete_many('lobbies', 'id', db_ids),
+                          record=lambda code, _db_id: persisted.pop(code, None))
+        self._write_group('lobby_players.delete', player_deletes, failed,
+                          write_one=delete_players, record=record_players_deleted)
+        self._write_group('lobby_players.insert', player_inserts, failed,
+                          write_one=lambda row: supabase.insert_many('lobby_players', [row]),
+                          write_batch=lambda rows: supabase.insert_many('lobby_players', rows),
+                          record=record_player_inserted)
+        self._write_group('lobby_players.update', ready_updates, failed,
+                          write_one=update_ready, record=record_ready)
+        self._write_group('lobbies.update', creator_updates, failed,
+                          write_one=update_creator, record=record_creator)
+
+        with self._lock:
+            for code, _current, _persisted in plan:
+                if code not in failed:
+                    self._flush_failures.pop(code, None)
+                    continue
+                attempts = self._flush_failures.get(code, 0) + 1
+                if attempts >= self.max_flush_retries:
+                    # Si rinuncia: _persisted resta allineato al DB, una modifica successiva ritenta da lì
+                    self._flush_failures.pop(code, None)
+                    self.flush_dropped += 1
+                    logger.error(f"Lobby {code} non salvata dopo {attempts} tentativi, modifiche scartate: {failed[code]}")
+                else:
+                    self._flush_failures[code] = attempts
+                    self._dirty.add(code)
+            if failed:
+                self.flush_errors += 1
+            self.flushes += 1
+        return len(plan) - len(failed)
+
+    def _write_group(self, name, items, failed, write_one, record, write_batch=None):
+        """
+        Scrive le modifiche [(codice lobby, payload)] di un gruppo e registra con
+        `record(codice, payload)` quelle salvate. Con `write_batch` si prova prima una scrittura
+        per blocco di `batch_size` modifiche (una sola richiesta, quindi tutta salvata o tutta no);
+        un blocco fallito viene ritentato modifica per modifica. Le lobby già fallite vengono saltate.
+        """
+        items = [(code, payload) for code, payload in items if code not in failed]
+        if write_batch is None or len(items) < 2:
+            self._write_each(name, items, failed, write_one, record)
+            return
+        batch_size = getattr(self._supabase, 'batch_size', len(items))
+        for i in range(0, len(items), batch_size):
+            chunk = items[i:i + batch_size]
+            try:
+                write_batch([payload for _code, payload in chunk])
+            except Exception as e:
+                logger.warning(f"Scrittura in batch di {name} fallita, nuovo tentativo lobby per lobby: {e}")
+                self._write_each(name, chunk, failed, write_one, record)
+                continue
+            with self._lock:
+                for code, payload in chunk:
+                    record(code, payload)
+
+    def _write_each(self, name, items, failed, write_one, record):
+        for code, payload in items:
+            if code in failed:
+                continue
+            try:
+                write_one(payload)
+            except Exception as e:
+                logger.error(f"Errore nel salvataggio della lobby {code} su Supabase ({name}): {e}")
+                failed[code] = e
+                continue
+            with self._lock:
+                record(code, payload)
+
+    def run_write_behind(self, sleep, interval=0.5):
+        """
+        Loop del task in background che esegue flush() ogni `interval` secondi. Un errore
+        inatteso viene registrato e il loop continua, così il salvataggio non si ferma per sempre.
+        """
+        while True:
+            sleep(interval)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Errore inatteso nel salvataggio periodico delle lobby")
+
+    def _read_lobbies(self, lobby_code=None, claim=None):
+        """
+        Lobby (con i giocatori) lette dalle tabelle `lobbies` e `lobby_players`: tutte, oppure
+        solo `lobby_code`. Con `claim(lobby_id)` si tengono solo quelle per cui ritorna True.
+        """
+        query = self._supabase.table('lobbies') \
+            .select('id, lobby_id, lobby_name, type, num_players, password, creator_id')
+        if lobby_code is not None:
+            query = query.eq('lobby_id', lobby_code)
+        by_db_id = {}
+        for row in query.execute().data or []:
+            if claim is not None and not claim(row['lobby_id']):
+                continue
+            by_db_id[row['id']] = Lobby(row['id'], row['lobby_id'], row['lobby_name'], row['type'],
+                                        row['num_players'], row.get('password'), row['creator_id'])
+        if lobby_code is not None and not by_db_id:
+            return []
+
+        columns = 'lobby_id, user_id, is_ready' if self._get_usernames else 'lobby_id, user_id, is_ready, users(username)'
+        query = self._supabase.table('lobby_players').select(columns)
+        if lobby_code is not None:
+            query = query.in_('lobby_id', list(by_db_id))
+        player_rows = query.execute().data or []
+        if self._get_usernames:
+            usernames = self._get_usernames([row['user_id'] for row in player_rows])
+        else:
+            usernames = {row['user_id']: (row.get('users') or {}).get('username') for row in player_rows}
+
+        for row in player_rows:
+            lobby = by_db_id.get(row['lobby_id'])
+            if lobby is None:
+                continue
+            lobby.players[row['user_id']] = {
+                'user_id': row['user_id'],
+                'username': usernames.get(row['user_id']),
+                'is_ready': bool(row.get('is_ready'))
+            }
+        return list(by_db_id.values())
+
+    def _adopt_locked(self, lobby):
+        self._persisted[lobby.lobby_id] = lobby._persisted_view()
+        if lobby.players:
+            self._index_locked(lobby)
+        else:
+            # Lobby rimasta senza giocatori: verrà eliminata al primo flush
+            self._dirty.add(lobby.lobby_id)
+
+    def recover(self, claim=None):
+        """
+        Ricostruisce lo stato in memoria dalle tabelle `lobbies` e `lobby_players` (es. dopo un riavvio).
+        Con `claim(lobby_id)` vengono riprese solo le lobby per cui ritorna True (quelle di questo nodo).
+        """
+        lobbies = self._read_lobbies(claim=claim)
+        with self._lock:
+            self._by_code.clear()
+            self._persisted.clear()
+            self._dirty.clear()
+            self._flush_failures.clear()
+            self._by_order.clear()
+            self._order_keys.clear()
+            self._by_type.clear()
+            self._by_free_seats.clear()
+            self._locked.clear()
+            for lobby in lobbies:
+                self._adopt_locked(lobby)
+        logger.info(f"Stato delle lobby ricostruito da Supabase: {len(self._by_code)} lobby attive.")
+        return len(self._by_code)
+
+    def load_lobby(self, lobby_code):
+        """
+        Carica dal DB una sola lobby (es. presa in carico da un nodo caduto) e la aggiunge al
+        registro. Ritorna la lobby, o None se non esiste più o è rimasta senza giocatori.
+        """
+        lobbies = self._read_lobbies(lobby_code)
+        with self._lock:
+            existing = self._by_code.get(lobby_code)
+            if existing is not None:
+                return existing
+            if not lobbies:
+                return None
+            self._adopt_locked(lobbies[0])
+            return self._by_code.get(lobby_code)
+
+    def evict(self, lobby_code):
+        """Toglie dal registro una lobby passata a un altro nodo, senza salvarne le modifiche pendenti."""
+        with self._lock:
+            lobby = self._by_code.get(lobby_code)
+            if lobby is not None:
+                self._unindex_locked(lobby)
+            self._persisted.pop(lobby_code, None)
+            self._dirty.discard(lobby_code)
+            self._flush_failures.pop(lobby_code, None)
+            return lobby
+
+
+def _orders_after(orders, cursor):
+    """Elementi di una lista ordinata successivi a `cursor`, senza copiarla."""
+    return (orders[i] for i in range(bisect_right(orders, cursor), len(orders)))
+
+
+def _total_len(lists):
+    return sum(len(orders) for orders in lists)
+
+
+def _remove_sorted(orders, order):
+    i = bisect_left(orders, order)
+    if i < len(orders) and orders[i] == order:
+        del orders[i]
+
+
+def _remove_indexed(index, key, order):
+    orders = index.get(key)
+    if orders is not None:
+        _remove_sorted(orders, order)
+        if not orders:
+            del index[key]
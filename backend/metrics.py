@@ -0,0 +1,263 @@
+# metrics.py
+
+import contextvars
+import cProfile
+import io
+import logging
+import pstats
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+
+logger = logging.getLogger(__name__)
+
+# Bucket (secondi) adatti sia alle fasi della pipeline (ms) sia alle chiamate al database
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Tempo passato sul database dal gestore in esecuzione: [secondi, chiamate], uno per greenlet/richiesta
+_db_time = contextvars.ContextVar('db_time', default=None)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Etichette non valide per {self.name}: {sorted(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            lines.extend(self._render_locked())
+        return lines
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _render_locked(self):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in sorted(self._values.items())]
+
+
+class Gauge(_Metric):
+    type = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def _render_locked(self):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in sorted(self._values.items())]
+
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # conteggi per bucket (non cumulativi) + bucket +Inf, somma
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][bisect_left(self.buckets, value)] += 1
+            state[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _render_locked(self):
+        lines = []
+        for key, (counts, total) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, [('le', _format_value(bound))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Metriche del processo esposte in formato testo Prometheus da `render()`.
+
+    Oltre a contatori, gauge e istogrammi registrati una volta, i `collector` vengono chiamati a
+    ogni scrape per leggere valori già tenuti altrove (es. profondità delle code, cache).
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self._register(Counter(name, help, labelnames))
+
+    def gauge(self, name, help, labelnames=()):
+        return self._register(Gauge(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def add_collector(self, collect):
+        """`collect()` aggiorna le gauge prima di ogni render()."""
+        self._collectors.append(collect)
+
+    def render(self):
+        for collect in self._collectors:
+            try:
+                collect()
+            except Exception as e:
+                logger.warning(f"Collector delle metriche non riuscito: {e}")
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+# ------------------------------------------------------------ tempo sul database
+
+def begin_db_tracking():
+    """Da qui in poi il tempo sul database di questo greenlet viene accumulato; ritorna il token per end_db_tracking()."""
+    return _db_time.set([0.0, 0])
+
+
+def end_db_tracking(token):
+    """Chiude l'accumulo aperto da begin_db_tracking(); ritorna [secondi, chiamate]."""
+    accumulator = _db_time.get()
+    _db_time.reset(token)
+    return accumulator
+
+
+@contextmanager
+def track_db_time():
+    """Accumula il tempo delle chiamate al database fatte dentro il blocco; produce [secondi, chiamate]."""
+    token = begin_db_tracking()
+    try:
+        yield _db_time.get()
+    finally:
+        end_db_tracking(token)
+
+
+def add_db_time(seconds):
+    accumulator = _db_time.get()
+    if accumulator is not None:
+        accumulator[0] += seconds
+        accumulator[1] += 1
+
+
+# ------------------------------------------------------------ profilazione
+
+class SlowRequestProfiler:
+    """
+    Profilazione a campione delle richieste lente.
+
+    Una richiesta su `1 / sample_rate` viene eseguita sotto cProfile (una alla volta: cProfile
+    non ammette profiler annidati sullo stesso thread; sotto eventlet il profilo comprende anche
+    gli altri greenlet eseguiti nel frattempo); se dura più di `slow_ms` il riepilogo
+    delle funzioni più costose viene passato a `on_slow(name, elapsed_ms, report)`, che di
+    default lo scrive nel log.
+    """
+
+    def __init__(self, sample_rate=0.0, slow_ms=500.0, top=15, on_slow=None):
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.top = top
+        self._on_slow = on_slow or self._log
+        self._busy = threading.Lock()
+        self.profiled = 0
+        self.reported = 0
+
+    @staticmethod
+    def _log(name, elapsed_ms, report):
+        logger.warning(f"Richiesta lenta '{name}' ({elapsed_ms:.1f} ms):\n{report}")
+
+    @contextmanager
+    def profile(self, name):
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate or not self._busy.acquire(blocking=False):
+            yield
+            return
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Un altro strumento di profilazione è già attivo sul thread
+            profiler = None
+            self._busy.release()
+        if profiler is None:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            self._busy.release()
+            self.profiled += 1
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            if elapsed_ms >= self.slow_ms:
+                self.reported += 1
+                out = io.StringIO()
+                pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(self.top)
+                self._on_slow(name, elapsed_ms, out.getvalue())
+
+    def wrap(self, name):
+        """Decoratore: profila a campione ogni chiamata della funzione."""
+        def decorator(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.profile(name):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
@@ -0,0 +1,255 @@
+# numpy_model.py
+
+import json
+import logging
+import sys
+import time
+
+import h5py
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def _relu(x):
+    return np.maximum(x, 0, out=x)
+
+
+def _softmax(x):
+    x = x - np.max(x, axis=1, keepdims=True)
+    np.exp(x, out=x)
+    x /= np.sum(x, axis=1, keepdims=True)
+    return x
+
+
+def _sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+ACTIVATIONS = {
+    'linear': lambda x: x,
+    None: lambda x: x,
+    'relu': _relu,
+    'softmax': _softmax,
+    'sigmoid': _sigmoid,
+    'tanh': np.tanh,
+}
+
+# Layer che in inferenza non fanno nulla
+PASSTHROUGH_LAYERS = {'InputLayer', 'Dropout', 'GaussianNoise', 'GaussianDropout', 'ActivityRegularization'}
+
+
+class UnsupportedModelError(Exception):
+    """Il file .h5 contiene layer che il backend numpy non sa eseguire."""
+
+
+class NumpyModel:
+    """
+    Forward pass di una rete Sequential densa (Dense / BatchNormalization / Dropout)
+    eseguito con sole matmul numpy.
+
+    I pesi vengono letti una volta dal file .h5 salvato da Keras; le BatchNormalization
+    vengono fuse nella Dense adiacente, quindi ogni layer costa una matmul + bias + attivazione.
+    Espone `input_shape` e `predict(x)` come un keras.Model, così può sostituirlo in backend.py.
+    """
+
+    def __init__(self, layers, input_dim):
+        # layers: lista di (kernel, bias, activation_name)
+        self.layers = layers
+        self.input_shape = (None, input_dim)
+        self.output_shape = (None, layers[-1][0].shape[1] if layers else input_dim)
+
+    @classmethod
+    def from_h5(cls, path):
+        with h5py.File(path, 'r') as f:
+            config = f.attrs['model_config']
+            if isinstance(config, bytes):
+                config = config.decode('utf-8')
+            config = json.loads(config)
+            if config.get('class_name') != 'Sequential':
+                raise UnsupportedModelError(f"Modello {config.get('class_name')} non supportato (solo Sequential).")
+
+            layer_configs = config['config']
+            if isinstance(layer_configs, dict):
+                layer_configs = layer_configs['layers']
+
+            weights_root = f['model_weights'] if 'model_weights' in f else f
+
+            layers = []
+            input_dim = None
+            for layer in layer_configs:
+                class_name = layer['class_name']
+                layer_cfg = layer['config']
+
+                if class_name == 'InputLayer':
+                    shape = layer_cfg.get('batch_shape') or layer_cfg.get('batch_input_shape')
+                    input_dim = shape[-1]
+                    continue
+                if class_name in PASSTHROUGH_LAYERS:
+                    continue
+
+                weights = _read_layer_weights(weights_root, layer_cfg['name'])
+
+                if class_name == 'Dense':
+                    activation = layer_cfg.get('activation', 'linear')
+                    if activation not in ACTIVATIONS:
+                        raise UnsupportedModelError(f"Attivazione '{activation}' non supportata.")
+                    kernel = weights[0].astype(np.float32)
+                    if layer_cfg.get('use_bias', True):
+                        bias = weights[1].astype(np.float32)
+                    else:
+                        bias = np.zeros(kernel.shape[1], dtype=np.float32)
+                    if input_dim is None:
+                        input_dim = kernel.shape[0]
+                    layers.append([kernel, bias, activation])
+
+                elif class_name == 'BatchNormalization':
+                    scale, shift = _batchnorm_affine(layer_cfg, weights)
+                    if layers and layers[-1][2] in ('linear', None):
+                        # Dense lineare seguita da BN: si fonde direttamente nei pesi
+                        layers[-1][0] = layers[-1][0] * scale
+                        layers[-1][1] = layers[-1][1] * scale + shift
+                    else:
+                        # BN dopo un'attivazione: diventa un layer affine diagonale
+                        dim = scale.shape[0]
+                        layers.append([np.diag(scale).astype(np.float32), shift, 'linear'])
+                        if input_dim is None:
+                            input_dim = dim
+                else:
+                    raise UnsupportedModelError(f"Layer '{class_name}' non supportato dal backend numpy.")
+
+        layers = _fuse_affine_layers(layers)
+        return cls([tuple(layer) for layer in layers], input_dim)
+
+    def predict(self, x, verbose=0, batch_size=None):
+        x = np.asarray(x, dtype=np.float32)
+        if x.ndim == 1:
+            x = x.reshape(1, -1)
+        for kernel, bias, activation in self.layers:
+            x = x @ kernel
+            x += bias
+            x = ACTIVATIONS[activation](x)
+        return x
+
+    __call__ = predict
+
+
+def _read_layer_weights(weights_root, layer_name):
+    group = weights_root[layer_name]
+    names = group.attrs.get('weight_names', [])
+    weights = []
+    for name in names:
+        if isinstance(name, bytes):
+            name = name.decode('utf-8')
+        weights.append(np.asarray(group[name]))
+    return weights
+
+
+def _batchnorm_affine(layer_cfg, weights):
+    """Converte una BatchNormalization (in inferenza) in scale * x + shift."""
+    epsilon = layer_cfg.get('epsilon', 1e-3)
+    weights = list(weights)
+    gamma = weights.pop(0) if layer_cfg.get('scale', True) else None
+    beta = weights.pop(0) if layer_cfg.get('center', True) else None
+    moving_mean, moving_variance = weights[0], weights[1]
+
+    scale = 1.0 / np.sqrt(moving_variance + epsilon)
+    if gamma is not None:
+        scale = scale * gamma
+    shift = -moving_mean * scale
+    if beta is not None:
+        shift = shift + beta
+    return scale.astype(np.float32), shift.astype(np.float32)
+
+
+def _fuse_affine_layers(layers):
+    """Unisce un layer affine diagonale (BN dopo attivazione) nella Dense che lo segue."""
+    fused = []
+    i = 0
+    while i < len(layers):
+        kernel, bias, activation = layers[i]
+        is_diag_bn = (activation == 'linear' and kernel.shape[0] == kernel.shape[1]
+                      and np.count_nonzero(kernel - np.diag(np.diagonal(kernel))) == 0)
+        if is_diag_bn and i + 1 < len(layers):
+            next_kernel, next_bias, next_activation = layers[i + 1]
+            scale = np.diagonal(kernel)
+            # (x*scale + shift) @ W + b = x @ (scale[:,None]*W) + (shift @ W + b)
+            fused.append([(scale[:, None] * next_kernel).astype(np.float32),
+                          (bias @ next_kernel + next_bias).astype(np.float32),
+                          next_activation])
+            i += 2
+            continue
+        fused.append([kernel, bias, activation])
+        i += 1
+    return fused
+
+
+def load_classifier(model_path, backend='numpy'):
+    """
+    Carica il classificatore dei segni.
+    backend='numpy' usa NumpyModel (TensorFlow non viene importato); se il modello contiene
+    layer non supportati si ripiega su Keras. backend='keras' usa sempre tensorflow.keras.
+    """
+    if backend == 'numpy':
+        try:
+            return NumpyModel.from_h5(model_path)
+        except UnsupportedModelError as e:
+            logger.warning(f"Backend numpy non utilizzabile ({e}), uso Keras.")
+
+    from tensorflow.keras.models import load_model
+    return load_model(model_path)
+
+
+# Differenza massima ammessa tra le probabilità numpy e quelle di Keras
+PARITY_TOLERANCE = 1e-4
+
+
+def _parity_and_benchmark(model_path, n_samples=2048, repeats=200):
+    """Confronta l'output numpy con Keras e misura il tempo di inferenza dei due backend."""
+    rng = np.random.default_rng(0)
+    np_model = NumpyModel.from_h5(model_path)
+    input_dim = np_model.input_shape[1]
+    # I landmark normalizzati stanno in [0, 1); metà del vettore è zero-padding (seconda mano assente)
+    x = rng.random((n_samples, input_dim), dtype=np.float32)
+    x[: n_samples // 2, input_dim // 2:] = 0
+
+    report = {'model': model_path, 'input_dim': input_dim}
+
+    try:
+        from tensorflow.keras.models import load_model
+        keras_model = load_model(model_path)
+    except ImportError:
+        keras_model = None
+        print("TensorFlow non installato: salto il controllo di parità con Keras.")
+
+    if keras_model is not None:
+        expected = keras_model.predict(x, verbose=0)
+        got = np_model.predict(x)
+        report['max_abs_diff'] = float(np.max(np.abs(expected - got)))
+        report['argmax_agreement'] = float(np.mean(np.argmax(expected, axis=1) == np.argmax(got, axis=1)))
+
+    def bench(fn, batch):
+        fn(batch)  # warmup
+        start = time.perf_counter()
+        for _ in range(repeats):
+            fn(batch)
+        return (time.perf_counter() - start) / repeats * 1e6
+
+    for batch_size in (1, 32):
+        batch = x[:batch_size]
+        report[f'numpy_us_batch{batch_size}'] = round(bench(np_model.predict, batch), 2)
+        if keras_model is not None:
+            report[f'keras_predict_us_batch{batch_size}'] = round(
+                bench(lambda b: keras_model.predict(b, verbose=0), batch), 2)
+
+    print(json.dumps(report, indent=2))
+    if keras_model is not None and (report['max_abs_diff'] > PARITY_TOLERANCE
+                                    or report['argmax_agreement'] < 1.0):
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    # Uso: python numpy_model.py [percorso_modello.h5]
+    path = sys.argv[1] if len(sys.argv) > 1 else 'model_trained_100_cell.h5'
+    sys.exit(_parity_and_benchmark(path))
@@ -0,0 +1,134 @@
+# password_hashing.py
+
+import logging
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+from vision_workers import wait_for_future
+
+logger = logging.getLogger(__name__)
+
+_BCRYPT_COST = re.compile(r'^\$2[abxy]?\$(\d{2})\$')
+
+
+class PasswordHasherBusy(Exception):
+    """Troppe operazioni di hashing già in coda: la richiesta va ritentata più tardi."""
+
+
+class PasswordHasher:
+    """
+    Hashing e verifica bcrypt fuori dall'event loop, con al più `pool_size` operazioni in parallelo.
+
+    Sotto eventlet (monkey patching di gunicorn) i thread di `threading` e di ThreadPoolExecutor
+    sono greenlet: una chiamata bcrypt bloccherebbe comunque l'hub. Il calcolo passa quindi da
+    `offload(fn, *args)`, che deve eseguirlo su un thread del sistema operativo sospendendo solo
+    il chiamante (il backend usa `eventlet.tpool.execute`); senza `offload` si usa un pool di
+    thread proprio, adatto ai processi senza eventlet. bcrypt rilascia il GIL, quindi i thread
+    lavorano in parallelo. Oltre `max_queue` operazioni in attesa le nuove vengono rifiutate con
+    PasswordHasherBusy, invece di accumulare latenza per tutti.
+
+    Con `offload` su tpool anche `semaphore` deve essere verde (es. eventlet.semaphore.BoundedSemaphore):
+    chi attende uno slot su un semaforo di `threading` senza monkey patching fermerebbe l'hub, e
+    con esso tutti i socket, fino al timeout.
+    """
+
+    def __init__(self, rounds=12, pool_size=2, max_queue=64, sleep=None, timeout=30.0, offload=None,
+                 semaphore=threading.BoundedSemaphore):
+        self.rounds = rounds
+        self.pool_size = pool_size
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._sleep = sleep or time.sleep
+        self._executor = None
+        if offload is None:
+            self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix='bcrypt')
+            offload = self._run_in_executor
+        self._offload = offload
+        self._slots = semaphore(pool_size)
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._active = 0
+        self.max_queue_depth = 0
+        self.completed = 0
+        self.rejected = 0
+        self.rehashed = 0
+        self._wait_ms = 0.0
+        self._run_ms = 0.0
+
+    def _run_in_executor(self, fn, *args):
+        return wait_for_future(self._executor.submit(fn, *args), self._sleep, poll_interval=0.005)
+
+    def _call(self, fn, *args):
+        with self._lock:
+            if self._queued >= self.max_queue:
+                self.rejected += 1
+                raise PasswordHasherBusy("Troppe richieste di autenticazione in coda.")
+            self._queued += 1
+            self.max_queue_depth = max(self.max_queue_depth, self._queued)
+
+        submitted = time.perf_counter()
+        acquired = self._slots.acquire(timeout=self.timeout)
+        started = time.perf_counter()
+        with self._lock:
+            self._queued -= 1
+            if acquired:
+                self._active += 1
+                self._wait_ms += (started - submitted) * 1000
+        if not acquired:
+            raise TimeoutError("Timeout in attesa di un thread bcrypt libero.")
+
+        try:
+            return self._offload(fn, *args)
+        finally:
+            self._slots.release()
+            with self._lock:
+                self._active -= 1
+                self.completed += 1
+                self._run_ms += (time.perf_counter() - started) * 1000
+
+    def hash(self, password):
+        """Hash bcrypt (stringa) di `password` con il costo configurato."""
+        return self._call(self._hash, password)
+
+    def _hash(self, password):
+        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(self.rounds)).decode('utf-8')
+
+    def verify(self, password, hashed):
+        return self._call(bcrypt.checkpw, password.encode('utf-8'), hashed.encode('utf-8'))
+
+    def needs_rehash(self, hashed):
+        """True se l'hash è stato calcolato con un costo diverso da quello configurato."""
+        match = _BCRYPT_COST.match(hashed)
+        return match is None or int(match.group(1)) != self.rounds
+
+    def rehash(self, password, hashed):
+        """Nuovo hash se `hashed` usa un costo diverso da quello configurato, altrimenti None."""
+        if not self.needs_rehash(hashed):
+            return None
+        new_hash = self.hash(password)
+        with self._lock:
+            self.rehashed += 1
+        return new_hash
+
+    def stats(self):
+        with self._lock:
+            return {
+                'rounds': self.rounds,
+                'pool_size': self.pool_size,
+                'queue_depth': self._queued,
+                'active': self._active,
+                'max_queue_depth': self.max_queue_depth,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'rehashed': self.rehashed,
+                'avg_wait_ms': round(self._wait_ms / self.completed, 3) if self.completed else 0.0,
+                'avg_run_ms': round(self._run_ms / self.completed, 3) if self.completed else 0.0
+            }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,124 @@
+# recognition_stream.py
+
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class RecognitionSession:
+    """Stato di una sessione di riconoscimento continuo aperta da un socket."""
+
+    def __init__(self, sid, user_id, platform, tracker):
+        self.sid = sid
+        self.user_id = user_id
+        self.platform = platform
+        # Tracker MediaPipe dedicato: in modalità tracking conserva lo stato tra un frame e l'altro
+        self.tracker = tracker
+
+        # Slot dell'ultimo frame ricevuto e non ancora elaborato (backpressure: solo l'ultimo conta)
+        self.pending_frame = None
+        self.pending_seq = None
+        self.busy = False
+        self.closed = False
+
+        # Ultime feature/predizioni, riusate se le mani non si sono mosse
+        self.previous_features = None
+        self.previous_predictions = None
+        self.previous_probabilities = None
+        # Conferma delle lettere (letter_smoothing.LetterRecognizer), creato dal backend
+        self.recognizer = None
+
+        self.frames_received = 0
+        self.frames_dropped = 0
+        self.frames_processed = 0
+
+    def stats(self):
+        return {
+            'frames_received': self.frames_received,
+            'frames_dropped': self.frames_dropped,
+            'frames_processed': self.frames_processed
+        }
+
+
+class RecognitionStreamManager:
+    """
+    Gestisce le sessioni di riconoscimento in streaming su Socket.IO.
+
+    Il client invia frame binari; se il server è ancora occupato con il frame precedente il
+    nuovo frame sostituisce quello in attesa (i frame intermedi vengono scartati), quindi ogni
+    sessione ha al più un frame in elaborazione e uno in coda.
+    """
+
+    def __init__(self, process_frame, emit_result, start_background_task,
+                 create_tracker, release_tracker=None):
+        self._process_frame = process_frame
+        self._emit_result = emit_result
+        self._start_background_task = start_background_task
+        self._create_tracker = create_tracker
+        self._release_tracker = release_tracker
+        self.sessions = {}
+
+    def open(self, sid, user_id, platform):
+        self.close(sid)
+        session = RecognitionSession(sid, user_id, platform, self._create_tracker(sid))
+        self.sessions[sid] = session
+        logger.info(f"Sessione di riconoscimento aperta per utente {user_id} (sid {sid}).")
+        return session
+
+    def close(self, sid):
+        session = self.sessions.pop(sid, None)
+        if session is None:
+            return None
+        session.closed = True
+        session.pending_frame = None
+        if self._release_tracker is not None:
+            self._release_tracker(sid, session.tracker)
+        logger.info(f"Sessione di riconoscimento chiusa per sid {sid}: {session.stats()}")
+        return session
+
+    def push_frame(self, sid, frame_bytes, seq=None):
+        """Accoda un frame. Ritorna False se non esiste una sessione aperta per il socket."""
+        session = self.sessions.get(sid)
+        if session is None:
+            return False
+
+        session.frames_received += 1
+        if session.pending_frame is not None:
+            session.frames_dropped += 1
+        session.pending_frame = frame_bytes
+        session.pending_seq = seq
+
+        if not session.busy:
+            session.busy = True
+            self._start_background_task(self._drain, session)
+        return True
+
+    def _drain(self, session):
+        try:
+            while not session.closed and session.pending_frame is not None:
+                frame_bytes, seq = session.pending_frame, session.pending_seq
+                session.pending_frame = None
+                session.pending_seq = None
+
+                start = time.perf_counter()
+                try:
+                    payload = self._process_frame(session, frame_bytes)
+                except Exception as e:
+                    logger.error(f"Errore nell'elaborazione del frame (sid {session.sid}): {e}")
+                    payload = {'error': 'Errore nell\'elaborazione del frame.'}
+                session.frames_processed += 1
+
+                if session.closed:
+                    break
+                payload['seq'] = seq
+                payload['dropped'] = session.frames_dropped
+                payload['processing_ms'] = round((time.perf_counter() - start) * 1000, 3)
+                self._emit_result(session.sid, payload)
+        finally:
+            session.busy = False
+
+        # Un frame arrivato mentre si usciva dal ciclo non deve restare in coda
+        if not session.closed and session.pending_frame is not None and not session.busy:
+            session.busy = True
+            self._start_background_task(self._drain, session)
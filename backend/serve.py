@@ -0,0 +1,13 @@
+# serve.py
+
+# Avvio del server di sviluppo: `python serve.py` (o `python backend.py`, che passa da qui).
+# Questo modulo, e non backend.py, è __main__: i worker di visione avviati con 'spawn' reimportano
+# __main__ come __mp_main__, e qui l'import di backend sta dietro la guardia. Reimportando backend.py
+# il figlio aprirebbe lo state store, registrerebbe NODE_URL (già preso dal padre), creerebbe
+# SocketIO, il client Supabase e le metriche.
+
+if __name__ == '__main__':
+    from backend import app, logger, socketio
+
+    logger.info("Avvio del server Flask con SocketIO...")
+    socketio.run(app, host='0.0.0.0', port=5001)
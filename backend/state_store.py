@@ -0,0 +1,376 @@
+# state_store.py
+
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryRedis:
+    """
+    Sostituto in-process del sottoinsieme di comandi Redis usato da StateStore (stringhe con
+    scadenza, hash, set, sorted set, INCR, SET NX). Va bene per un solo processo e per i test;
+    con più worker o nodi serve un Redis vero, condiviso.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self._data = {}
+        self._expires = {}
+        self._clock = clock
+        self._lock = threading.Lock()
+
+    def _live_locked(self, key):
+        expires = self._expires.get(key)
+        if expires is not None and expires <= self._clock():
+            self._data.pop(key, None)
+            del self._expires[key]
+        return self._data.get(key)
+
+    def get(self, key):
+        with self._lock:
+            value = self._live_locked(key)
+            return value if isinstance(value, str) else None
+
+    def set(self, key, value, nx=False, ex=None):
+        with self._lock:
+            if nx and self._live_locked(key) is not None:
+                return None
+            self._data[key] = str(value)
+            if ex is not None:
+                self._expires[key] = self._clock() + ex
+            else:
+                self._expires.pop(key, None)
+            return True
+
+    def expire(self, key, seconds):
+        with self._lock:
+            if self._live_locked(key) is None:
+                return False
+            self._expires[key] = self._clock() + seconds
+            return True
+
+    def incr(self, key):
+        with self._lock:
+            value = int(self._live_locked(key) or 0) + 1
+            self._data[key] = str(value)
+            return value
+
+    def delete(self, *keys):
+        with self._lock:
+            removed = 0
+            for key in keys:
+                removed += self._live_locked(key) is not None
+                self._data.pop(key, None)
+                self._expires.pop(key, None)
+            return removed
+
+    def hset(self, key, field, value):
+        with self._lock:
+            hash_ = self._data.setdefault(key, {})
+            added = field not in hash_
+            hash_[field] = str(value)
+            return int(added)
+
+    def hget(self, key, field):
+        with self._lock:
+            return self._data.get(key, {}).get(field)
+
+    def hmget(self, key, fields):
+        with self._lock:
+            hash_ = self._data.get(key, {})
+            return [hash_.get(field) for field in fields]
+
+    def hdel(self, key, *fields):
+        with self._lock:
+            hash_ = self._data.get(key, {})
+            removed = sum(hash_.pop(field, None) is not None for field in fields)
+            if not hash_:
+                self._data.pop(key, None)
+            return removed
+
+    def hgetall(self, key):
+        with self._lock:
+            return dict(self._data.get(key, {}))
+
+    def sadd(self, key, *members):
+        with self._lock:
+            set_ = self._data.setdefault(key, set())
+            added = len(set(members) - set_)
+            set_.update(members)
+            return added
+
+    def scard(self, key):
+        with self._lock:
+            return len(self._data.get(key, ()))
+
+    def zadd(self, key, mapping, nx=False):
+        with self._lock:
+            zset = self._data.setdefault(key, _SortedSet())
+            return sum(zset.add(member, score, nx) for member, score in mapping.items())
+
+    def zscore(self, key, member):
+        with self._lock:
+            zset = self._data.get(key)
+            return zset.scores.get(member) if zset is not None else None
+
+    def zrem(self, key, *members):
+        with self._lock:
+            zset = self._data.get(key)
+            return sum(zset.remove(member) for member in members) if zset is not None else 0
+
+    def zrangebyscore(self, key, min, max, start=None, num=None, withscores=False):
+        with self._lock:
+            zset = self._data.get(key)
+            entries = zset.range_by_score(_score_bound(min), _score_bound(max)) if zset is not None else []
+        if start is not None:
+            entries = entries[start:start + num if num is not None and num >= 0 else None]
+        return entries if withscores else [member for member, _score in entries]
+
+
+class _SortedSet:
+    """Sorted set di MemoryRedis: punteggio per membro più lista ordinata di (punteggio, membro)."""
+
+    def __init__(self):
+        self.scores = {}
+        self._entries = []
+
+    def add(self, member, score, nx):
+        old = self.scores.get(member)
+        if old is not None:
+            if nx:
+                return 0
+            self._entries.remove((old, member))
+        self.scores[member] = float(score)
+        insort(self._entries, (float(score), member))
+        return int(old is None)
+
+    def remove(self, member):
+        score = self.scores.pop(member, None)
+        if score is None:
+            return 0
+        self._entries.remove((score, member))
+        return 1
+
+    def range_by_score(self, low, high):
+        (low, low_open), (high, high_open) = low, high
+        i = bisect_right(self._entries, (low, _MAX_MEMBER)) if low_open else bisect_left(self._entries, (low, ''))
+        result = []
+        for score, member in self._entries[i:]:
+            if score > high or (high_open and score == high):
+                break
+            result.append((member, score))
+        return result
+
+
+# Più grande di qualunque membro (stringa) a parità di punteggio
+_MAX_MEMBER = '\U0010ffff'
+
+
+def _score_bound(value):
+    """Estremo di ZRANGEBYSCORE ('-inf', '+inf', '(5' = escluso, 5) -> (punteggio, escluso)."""
+    if isinstance(value, str):
+        if value in ('-inf', '+inf', 'inf'):
+            return float(value), False
+        if value.startswith('('):
+            return float(value[1:]), True
+    return float(value), False
+
+
+class StateStore:
+    """
+    Stato condiviso delle partite (voti, giocatori nella GameScreen, round corrente), delle
+    lobby visibili a tutti i nodi e dell'affinità lobby -> nodo, su un client Redis o MemoryRedis.
+
+    Ogni passaggio "quando l'ultimo giocatore ha fatto X" si chiude con un DEL della chiave:
+    Redis ritorna 1 a un solo chiamante, quindi un solo worker annuncia il risultato anche se i
+    giocatori della stessa lobby sono collegati a processi diversi.
+
+    L'indirizzo di un nodo e le sue lobby scadono dopo `claim_ttl` secondi se il nodo non li
+    rinnova (`register_node()` e `renew_claims()` a ogni heartbeat): le lobby di un nodo caduto
+    tornano libere e il primo nodo che le richiede le prende in carico.
+    """
+
+    def __init__(self, client, node_id, prefix='handup', claim_ttl=30.0):
+        self._client = client
+        self.node_id = node_id
+        self._prefix = prefix
+        self.claim_ttl = claim_ttl
+
+    def _key(self, *parts):
+        return ':'.join((self._prefix,) + parts)
+
+    def _ttl(self):
+        return max(int(round(self.claim_ttl)), 1)
+
+    def _hold(self, key):
+        """Prende (SET NX) o rinnova la chiave di questo nodo; False se appartiene a un altro nodo."""
+        if self._client.set(key, self.node_id, nx=True, ex=self._ttl()):
+            return True
+        value = self._client.get(key)
+        if value is None:
+            # Scaduta tra SET NX e GET: si riprova una volta
+            return bool(self._client.set(key, self.node_id, nx=True, ex=self._ttl()))
+        if _text(value) != self.node_id:
+            return False
+        self._client.expire(key, self._ttl())
+        return True
+
+    # ------------------------------------------------------------ nodi e affinità
+
+    def register_node(self, url):
+        """
+        Pubblica (o rinnova) l'indirizzo del nodo, usato per reindirizzare i client alla lobby
+        giusta. Ritorna False se lo stesso indirizzo è già di un altro nodo attivo: più worker
+        dietro una sola porta non sono raggiungibili singolarmente.
+        """
+        if not url:
+            return True
+        self._client.set(self._key('node', self.node_id), url, ex=self._ttl())
+        return self._hold(self._key('node_url', url))
+
+    def release_node(self, url):
+        """Ritira l'indirizzo del nodo (arresto ordinato), così un nuovo processo può riusarlo subito."""
+        self._client.delete(self._key('node', self.node_id))
+        if url:
+            self._release(self._key('node_url', url))
+
+    def _release(self, key):
+        value = self._client.get(key)
+        if value is not None and _text(value) == self.node_id:
+            self._client.delete(key)
+
+    def node_url(self, node_id):
+        """Indirizzo del nodo, o None se non è attivo (heartbeat scaduto) o non ne ha uno."""
+        value = self._client.get(self._key('node', node_id))
+        return _text(value) if value is not None else None
+
+    def claim_lobby(self, lobby_id):
+        """Assegna (o riassegna) la lobby a questo nodo se è libera; True se ora è di questo nodo."""
+        return self._hold(self._key('lobby', lobby_id, 'node'))
+
+    def renew_claims(self, lobby_ids):
+        """Rinnova le lobby di questo nodo; ritorna quelle passate nel frattempo a un altro nodo."""
+        return [lobby_id for lobby_id in lobby_ids if not self.claim_lobby(lobby_id)]
+
+    def release_lobbies(self, lobby_ids):
+        """Libera le lobby di questo nodo (arresto ordinato): il primo nodo che le richiede le riprende."""
+        for lobby_id in lobby_ids:
+            self._release(self._key('lobby', lobby_id, 'node'))
+
+    def lobby_node(self, lobby_id):
+        """Nodo che gestisce la lobby, o None se nessun nodo attivo la tiene."""
+        value = self._client.get(self._key('lobby', lobby_id, 'node'))
+        return _text(value) if value is not None else None
+
+    def clear_lobby(self, lobby_id):
+        """Elimina tutto lo stato condiviso della lobby (chiusa), compresa l'affinità."""
+        self._client.delete(*(self._key('lobby', lobby_id, part)
+                              for part in ('node', 'votes', 'vote_players', 'screen', 'round')))
+
+    # ------------------------------------------------------------ votazioni
+
+    def record_vote(self, lobby_id, user_id, mode, num_players):
+        """Salva il voto; ritorna (voti {user_id: modalità}, numero di giocatori fissato al primo voto)."""
+        self._client.set(self._key('lobby', lobby_id, 'vote_players'), num_players, nx=True)
+        self._client.hset(self._key('lobby', lobby_id, 'votes'), user_id, mode)
+        votes = {_text(k): _text(v) for k, v in self._client.hgetall(self._key('lobby', lobby_id, 'votes')).items()}
+        total = self._client.get(self._key('lobby', lobby_id, 'vote_players'))
+        return votes, int(total) if total is not None else num_players
+
+    def close_vote(self, lobby_id):
+        """Chiude la votazione; True solo per il primo chiamante, che deve annunciare il risultato."""
+        closed = self._client.delete(self._key('lobby', lobby_id, 'votes'))
+        self._client.delete(self._key('lobby', lobby_id, 'vote_players'))
+        return closed == 1
+
+    # ------------------------------------------------------------ GameScreen e round
+
+    def mark_on_game_screen(self, lobby_id, user_id):
+        """Segna il giocatore come presente; ritorna (appena aggiunto, giocatori presenti)."""
+        key = self._key('lobby', lobby_id, 'screen')
+        added = self._client.sadd(key, user_id)
+        return bool(added), self._client.scard(key)
+
+    def close_game_screen(self, lobby_id):
+        """Azzera i presenti per la partita successiva; True solo per il primo chiamante."""
+        return self._client.delete(self._key('lobby', lobby_id, 'screen')) == 1
+
+    def get_round(self, lobby_id):
+        value = self._client.get(self._key('lobby', lobby_id, 'round'))
+        return json.loads(value) if value is not None else None
+
+    def set_round(self, lobby_id, round_state):
+        self._client.set(self._key('lobby', lobby_id, 'round'), json.dumps(round_state))
+
+    # ------------------------------------------------------------ lista lobby
+
+    def next_lobby_seq(self):
+        return int(self._client.incr(self._key('lobby_seq')))
+
+    def lobby_seq(self):
+        value = self._client.get(self._key('lobby_seq'))
+        return int(value) if value is not None else 0
+
+    def publish_lobby_delta(self, delta):
+        """
+        Applica un delta del feed alla vista condivisa delle lobby di tutti i nodi. Ogni lobby
+        riceve alla prima pubblicazione un numero d'ordine globale (cursore di `query_lobby_views`).
+        """
+        key = self._key('lobbies')
+        index = self._key('lobby_index')
+        for lobby in delta['added'] + delta['updated']:
+            self._client.hset(key, lobby['lobby_id'], json.dumps(lobby))
+            if self._client.zscore(index, lobby['lobby_id']) is None:
+                order = self._client.incr(self._key('lobby_order'))
+                self._client.zadd(index, {lobby['lobby_id']: order}, nx=True)
+        if delta['removed']:
+            self._client.hdel(key, *delta['removed'])
+            self._client.zrem(index, *delta['removed'])
+
+    def lobby_views(self):
+        return [json.loads(value) for value in self._client.hgetall(self._key('lobbies')).values()]
+
+    def query_lobby_views(self, match, cursor=0, limit=20, chunk=100):
+        """
+        Lobby di tutti i nodi per cui `match(lobby)` è vero, in ordine di pubblicazione a partire
+        da `cursor`. Ritorna (lobby, cursore della pagina successiva o None), come
+        LobbyRegistry.query(): l'indice ordinato si scorre a blocchi di `chunk`, senza leggere
+        tutta la lista.
+        """
+        index = self._key('lobby_index')
+        page = []
+        low = f"({cursor}"
+        while True:
+            entries = self._client.zrangebyscore(index, low, '+inf', start=0, num=chunk, withscores=True)
+            if not entries:
+                return [lobby for lobby, _order in page], None
+            values = self._client.hmget(self._key('lobbies'), [member for member, _score in entries])
+            for (member, score), value in zip(entries, values):
+                if value is None:
+                    continue
+                lobby = json.loads(value)
+                if not match(lobby):
+                    continue
+                if len(page) == limit:
+                    return [lobby for lobby, _order in page], page[-1][1]
+                page.append((lobby, int(score)))
+            low = f"({entries[-1][1]}"
+
+
+def _text(value):
+    return value.decode('utf-8') if isinstance(value, bytes) else value
+
+
+def open_state_store(url, node_id, claim_ttl=30.0):
+    """StateStore su Redis (redis://...) oppure in memoria (None o memory://)."""
+    if not url or url.startswith('memory://'):
+        return StateStore(MemoryRedis(), node_id, claim_ttl=claim_ttl)
+    try:
+        import redis
+    except ImportError as e:
+        raise RuntimeError("Per uno state store condiviso serve il pacchetto 'redis' (pip install redis).") from e
+    logger.info(f"State store condiviso su {url} (nodo {node_id}).")
+    return StateStore(redis.Redis.from_url(url), node_id, claim_ttl=claim_ttl)
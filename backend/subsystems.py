@@ -0,0 +1,150 @@
+# subsystems.py
+
+import importlib
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+PENDING = 'pending'
+LOADING = 'loading'
+READY = 'ready'
+FAILED = 'failed'
+
+# Tempi di import dei moduli pesanti (secondi), per tenere d'occhio le regressioni del cold start
+IMPORT_TIMES = {}
+
+
+def timed_import(module_name):
+    """Importa un modulo misurandone il tempo e lo registra in IMPORT_TIMES."""
+    start = time.perf_counter()
+    module = importlib.import_module(module_name)
+    elapsed = time.perf_counter() - start
+    IMPORT_TIMES.setdefault(module_name, round(elapsed, 4))
+    logger.info(f"Import di '{module_name}' completato in {elapsed:.3f}s.")
+    return module
+
+
+class _Subsystem:
+    def __init__(self, name, loader, warmup, event_factory):
+        self.name = name
+        self.loader = loader
+        self.warmup = warmup
+        self.state = PENDING
+        self.value = None
+        self.error = None
+        self.load_seconds = None
+        self.warmup_seconds = None
+        self.done = event_factory()
+
+
+class SubsystemRegistry:
+    """
+    Registro dei sottosistemi pesanti (modello, MediaPipe, OpenCV, Supabase, Gemini).
+
+    Ogni sottosistema viene caricato al primo `get()` oppure in anticipo da un task in
+    background; chi lo richiede mentre è in caricamento attende la fine senza ricaricarlo.
+    Dopo il caricamento viene eseguita l'eventuale funzione di warmup.
+    """
+
+    def __init__(self, event_factory=None, sleep=None):
+        self._event_factory = event_factory or threading.Event
+        self._sleep = sleep or (lambda seconds: None)
+        self._lock = threading.Lock()
+        self._subsystems = {}
+
+    def register(self, name, loader, warmup=None):
+        self._subsystems[name] = _Subsystem(name, loader, warmup, self._event_factory)
+
+    def is_ready(self, name):
+        return self._subsystems[name].state == READY
+
+    def get(self, name):
+        sub = self._subsystems[name]
+        # Sezione critica breve e senza yield: sicura sia con thread reali sia con greenlet
+        with self._lock:
+            if sub.state == READY:
+                return sub.value
+            owner = sub.state in (PENDING, FAILED)
+            if owner:
+                if sub.state == FAILED:
+                    # Nuovo tentativo dopo un errore: serve un evento non ancora segnalato
+                    sub.done = self._event_factory()
+                sub.state = LOADING
+                sub.error = None
+            done = sub.done
+
+        if owner:
+            self._load(sub)
+        else:
+            done.wait()
+
+        if sub.state != READY:
+            raise RuntimeError(f"Sottosistema '{name}' non disponibile: {sub.error}")
+        return sub.value
+
+    def _load(self, sub):
+        start = time.perf_counter()
+        try:
+            value = sub.loader()
+            sub.load_seconds = round(time.perf_counter() - start, 4)
+            if sub.warmup is not None:
+                warmup_start = time.perf_counter()
+                sub.warmup(value)
+                sub.warmup_seconds = round(time.perf_counter() - warmup_start, 4)
+            sub.value = value
+            sub.state = READY
+            logger.info(f"Sottosistema '{sub.name}' pronto in {time.perf_counter() - start:.3f}s.")
+        except Exception as e:
+            sub.error = str(e)
+            sub.state = FAILED
+            logger.error(f"Errore nel caricamento del sottosistema '{sub.name}': {e}")
+        finally:
+            sub.done.set()
+
+    def load_all(self):
+        """Carica tutti i sottosistemi in sequenza; ritorna True se sono tutti pronti."""
+        for name in list(self._subsystems):
+            try:
+                self.get(name)
+            except RuntimeError:
+                pass
+            # Cede il controllo tra un sottosistema e l'altro (utile sotto eventlet)
+            self._sleep(0)
+        return all(sub.state == READY for sub in self._subsystems.values())
+
+    def load_all_in_background(self, start_background_task):
+        return start_background_task(self.load_all)
+
+    def status(self):
+        subsystems = {}
+        for name, sub in self._subsystems.items():
+            subsystems[name] = {
+                'state': sub.state,
+                'load_seconds': sub.load_seconds,
+                'warmup_seconds': sub.warmup_seconds,
+                'error': sub.error
+            }
+        return {
+            'ready': all(sub.state == READY for sub in self._subsystems.values()),
+            'subsystems': subsystems,
+            'import_times': dict(IMPORT_TIMES)
+        }
+
+
+class LazyProxy:
+    """Oggetto segnaposto che inoltra gli attributi al sottosistema, caricandolo al primo accesso."""
+
+    def __init__(self, registry, name):
+        object.__setattr__(self, '_registry', registry)
+        object.__setattr__(self, '_name', name)
+
+    def __getattr__(self, attr):
+        return getattr(self._registry.get(self._name), attr)
+
+    def __call__(self, *args, **kwargs):
+        return self._registry.get(self._name)(*args, **kwargs)
+
+    def __repr__(self):
+        return f"<LazyProxy '{self._name}'>"
@@ -0,0 +1,27 @@
+# Test del backend: i moduli stanno nella cartella padre e si importano senza package
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import subprocess
+import textwrap
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def run_under_eventlet():
+    """
+    Esegue `code` in un processo Python separato, con eventlet ma senza monkey patching (come
+    `python backend.py`), e ne ritorna lo stdout. Un hub bloccato fa scadere il timeout invece
+    di bloccare pytest.
+    """
+    def run(code, timeout=30):
+        result = subprocess.run([sys.executable, '-W', 'ignore', '-c', textwrap.dedent(code)], cwd=BACKEND_DIR,
+                                capture_output=True, text=True, timeout=timeout)
+        assert result.returncode == 0, result.stderr
+        return result.stdout
+    return run
@@ -0,0 +1,180 @@
+import threading
+import time
+
+import pytest
+
+from data_access import DataAccess, DataAccessTimeout, OffloadExecutor
+from fake_supabase import FakeSupabase
+from lobby_store import Lobby, LobbyRegistry
+
+
+def _in_threads(fn, count):
+    results = [None] * count
+
+    def run(i):
+        results[i] = fn()
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_identical_reads_in_flight_are_coalesced():
+    client = FakeSupabase({'users': [{'id': 'u1', 'username': 'anna'}]}, latency=0.05)
+    data = DataAccess(client, pool_size=4)
+
+    results = _in_threads(lambda: data.table('users').select('id, username').eq('id', 'u1').execute(), 5)
+
+    assert all(r.data == [{'id': 'u1', 'username': 'anna'}] for r in results)
+    assert client.requests == 1
+    assert data.stats()['operations']['users.select']['coalesced'] == 4
+
+
+def test_writes_are_never_coalesced():
+    client = FakeSupabase(latency=0.02)
+    data = DataAccess(client, pool_size=4)
+
+    _in_threads(lambda: data.table('users').insert({'username': 'anna'}).execute(), 3)
+
+    assert client.requests == 3
+    assert len(client.tables['users']) == 3
+
+
+def test_slow_call_times_out_and_is_not_reused():
+    client = FakeSupabase({'users': []}, latency=0.2)
+    data = DataAccess(client, pool_size=2, timeout=0.05)
+
+    with pytest.raises(DataAccessTimeout):
+        data.table('users').select('*').execute()
+    assert data.stats()['in_flight_reads'] == 0
+    assert data.stats()['operations']['users.select']['timeouts'] == 1
+
+
+def test_insert_many_sends_one_request_per_batch():
+    client = FakeSupabase()
+    data = DataAccess(client, batch_size=2)
+
+    inserted = data.insert_many('lobby_players', [{'lobby_id': 'l1', 'user_id': f"u{i}"} for i in range(5)])
+
+    assert client.requests == 3
+    assert [row['user_id'] for row in inserted] == ['u0', 'u1', 'u2', 'u3', 'u4']
+    assert all(row['is_ready'] is False for row in client.tables['lobby_players'])
+
+
+def test_delete_many_batches_values_and_applies_filters():
+    rows = [{'lobby_id': lobby, 'user_id': f"u{i}"} for lobby in ('l1', 'l2') for i in range(4)]
+    client = FakeSupabase({'lobby_players': rows})
+    data = DataAccess(client, batch_size=3)
+
+    data.delete_many('lobby_players', 'user_id', ['u0', 'u1', 'u2', 'u3'], lobby_id='l1')
+
+    assert client.requests == 2
+    assert {row['lobby_id'] for row in client.tables['lobby_players']} == {'l2'}
+
+
+def test_calls_after_shutdown_run_directly():
+    client = FakeSupabase({'users': [{'id': 'u1'}]})
+    data = DataAccess(client)
+    data.shutdown()
+
+    assert data.table('users').select('id').execute().data == [{'id': 'u1'}]
+
+
+def _thread_starter(fn, *args):
+    thread = threading.Thread(target=fn, args=args, daemon=True)
+    thread.start()
+    return thread
+
+
+def test_offload_executor_bounds_concurrency():
+    running = []
+    peak = []
+    lock = threading.Lock()
+
+    def work(i):
+        with lock:
+            running.append(i)
+            peak.append(len(running))
+        time.sleep(0.02)
+        with lock:
+            running.remove(i)
+        return i * 2
+
+    executor = OffloadExecutor(lambda fn, *args: fn(*args), _thread_starter, max_workers=2)
+    futures = [executor.submit(work, i) for i in range(6)]
+
+    assert [f.result(timeout=2) for f in futures] == [0, 2, 4, 6, 8, 10]
+    assert max(peak) == 2
+
+
+def test_offload_executor_skips_calls_cancelled_while_queued():
+    release = threading.Event()
+    calls = []
+    executor = OffloadExecutor(lambda fn, *args: fn(*args), _thread_starter, max_workers=1)
+
+    first = executor.submit(lambda: release.wait(2))
+    queued = executor.submit(lambda: calls.append('queued'))
+    assert queued.cancel()
+    release.set()
+
+    assert first.result(timeout=2) is True
+    time.sleep(0.05)
+    assert calls == []
+
+
+def test_offload_executor_under_eventlet_with_more_callers_than_slots(run_under_eventlet):
+    # Con un semaforo di `threading` il terzo chiamante bloccherebbe l'hub: i primi due, in attesa
+    # del risultato di tpool, non ripartirebbero più
+    output = run_under_eventlet("""
+        import time
+        import eventlet
+        from eventlet import tpool
+        from data_access import OffloadExecutor
+        from vision_workers import wait_for_future
+
+        ticks = []
+        def ticker():
+            while True:
+                ticks.append(1)
+                eventlet.sleep(0.01)
+        eventlet.spawn(ticker)
+
+        executor = OffloadExecutor(tpool.execute, eventlet.spawn, 2, semaphore=eventlet.semaphore.BoundedSemaphore)
+        futures = [executor.submit(lambda i: time.sleep(0.1) or i, i) for i in range(5)]
+        print([wait_for_future(f, eventlet.sleep, timeout=10) for f in futures], len(ticks))
+    """)
+    results, ticks = output.rsplit(' ', 1)
+    assert results == '[0, 1, 2, 3, 4]'
+    # Tre turni da 0.1 s: il ticker ha continuato a girare mentre si aspettavano gli slot
+    assert int(ticks) >= 15
+
+
+def test_data_access_over_offload_executor():
+    client = FakeSupabase({'users': [{'id': 'u1'}]})
+    executor = OffloadExecutor(lambda fn, *args: fn(*args), _thread_starter, max_workers=2)
+    data = DataAccess(client, executor=executor)
+
+    assert data.table('users').select('id').execute().data == [{'id': 'u1'}]
+    data.shutdown()
+    with pytest.raises(RuntimeError):
+        executor.submit(lambda: None)
+
+
+def test_registry_flush_writes_players_in_batches():
+    client = FakeSupabase({'lobbies': [{'id': 'db1', 'lobby_id': 'ABC123'}]})
+    registry = LobbyRegistry(DataAccess(client, batch_size=2))
+    registry.add_lobby(Lobby('db1', 'ABC123', 'Classe', 'pub', 5, None, 'u0'), 'anna')
+    for i in range(1, 5):
+        registry.add_player('ABC123', f"u{i}", f"studente{i}")
+
+    assert registry.flush() == 1
+    assert client.requests == 3
+    assert sorted(row['user_id'] for row in client.tables['lobby_players']) == ['u0', 'u1', 'u2', 'u3', 'u4']
+
+    for i in range(4):
+        registry.remove_player('ABC123', f"u{i}")
+    registry.flush()
+    assert [row['user_id'] for row in client.tables['lobby_players']] == ['u4']
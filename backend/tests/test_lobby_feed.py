@@ -0,0 +1,98 @@
+import threading
+
+from lobby_feed import LobbyFeed
+
+
+def _feed(lobbies, **kwargs):
+    sent = []
+    feed = LobbyFeed(get_lobby=lambda code: lobbies.get(code), list_lobbies=lambda: list(lobbies.values()),
+                     emit=sent.append, start_background_task=lambda fn: None, sleep=lambda s: None, **kwargs)
+    return feed, sent
+
+
+def test_new_lobby_is_added_then_updated_then_removed():
+    lobbies = {'AAA': {'lobby_id': 'AAA', 'current_players': 1}}
+    feed, sent = _feed(lobbies)
+
+    feed.mark_changed('AAA')
+    feed.flush()
+    lobbies['AAA'] = {'lobby_id': 'AAA', 'current_players': 2}
+    feed.mark_changed('AAA')
+    feed.flush()
+    del lobbies['AAA']
+    feed.mark_changed('AAA')
+    feed.flush()
+
+    assert [(d['seq'], len(d['added']), len(d['updated']), d['removed']) for d in sent] == \
+        [(1, 1, 0, []), (2, 0, 1, []), (3, 0, 0, ['AAA'])]
+
+
+def test_recovered_lobbies_are_sent_as_updates():
+    lobbies = {'AAA': {'lobby_id': 'AAA'}, 'BBB': {'lobby_id': 'BBB'}}
+    loads = []
+    feed, sent = _feed(lobbies, known_lobbies=lambda: loads.append(1) or ['AAA', 'BBB'])
+
+    feed.mark_changed('AAA')
+    feed.flush()
+    del lobbies['BBB']
+    feed.mark_changed('BBB')
+    feed.flush()
+
+    assert sent[0]['added'] == [] and sent[0]['updated'] == [{'lobby_id': 'AAA'}]
+    assert sent[1]['removed'] == ['BBB']
+    assert loads == [1]
+
+
+def test_mark_changed_does_not_wait_for_a_blocked_known_lobbies():
+    # known_lobbies() attende il registro, il cui caricamento chiama mark_changed()
+    lobbies = {'AAA': {'lobby_id': 'AAA'}}
+    loading, loaded = threading.Event(), threading.Event()
+
+    def known_lobbies():
+        loading.set()
+        assert loaded.wait(5)
+        return ['AAA']
+
+    feed, sent = _feed(lobbies, known_lobbies=known_lobbies)
+    snapshots = []
+    reader = threading.Thread(target=lambda: snapshots.append(feed.snapshot()))
+    reader.start()
+    assert loading.wait(5)
+
+    marker = threading.Thread(target=feed.mark_changed, args=('AAA',))
+    marker.start()
+    marker.join(2)
+    assert not marker.is_alive()
+
+    loaded.set()
+    reader.join(5)
+    assert snapshots[0]['lobbies'] == [{'lobby_id': 'AAA'}]
+    feed.flush()
+    assert sent[0]['updated'] == [{'lobby_id': 'AAA'}]
+
+
+def test_mark_changed_does_not_wait_for_a_blocked_get_lobby():
+    release = threading.Event()
+    lobbies = {'AAA': {'lobby_id': 'AAA'}, 'BBB': {'lobby_id': 'BBB'}}
+
+    def get_lobby(code):
+        if code == 'AAA':
+            assert release.wait(5)
+        return lobbies.get(code)
+
+    sent = []
+    feed = LobbyFeed(get_lobby=get_lobby, list_lobbies=lambda: list(lobbies.values()), emit=sent.append,
+                     start_background_task=lambda fn: None, sleep=lambda s: None)
+    feed.mark_changed('AAA')
+    flusher = threading.Thread(target=feed.flush)
+    flusher.start()
+
+    marker = threading.Thread(target=feed.mark_changed, args=('BBB',))
+    marker.start()
+    marker.join(2)
+    assert not marker.is_alive()
+
+    release.set()
+    flusher.join(5)
+    feed.flush()
+    assert [d['added'] for d in sent] == [[{'lobby_id': 'AAA'}], [{'lobby_id': 'BBB'}]]
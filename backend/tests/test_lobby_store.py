@@ -0,0 +1,191 @@
+from data_access import DataAccess
+from fake_supabase import FakeSupabase
+from lobby_store import Lobby, LobbyRegistry
+
+
+class RejectingSupabase(FakeSupabase):
+    """Rifiuta gli inserimenti in lobby_players che riferiscono una lobby non più esistente (FK)."""
+
+    def _execute(self, query):
+        if query._table == 'lobby_players' and query._operation == 'insert':
+            lobby_ids = {row['id'] for row in self.tables.get('lobbies', [])}
+            rows = query._payload if isinstance(query._payload, list) else [query._payload]
+            if any(row['lobby_id'] not in lobby_ids for row in rows):
+                raise RuntimeError('violates foreign key constraint "lobby_players_lobby_id_fkey"')
+        return super()._execute(query)
+
+
+def _registry(client, **kwargs):
+    return LobbyRegistry(DataAccess(client), **kwargs)
+
+
+def _add(registry, db_id, code, players):
+    registry.add_lobby(Lobby(db_id, code, code, 'pub', 8, None, players[0]), players[0])
+    for uid in players[1:]:
+        registry.add_player(code, uid, uid)
+
+
+def test_rejected_lobby_does_not_block_the_others():
+    client = RejectingSupabase({'lobbies': [{'id': 'db1', 'lobby_id': 'AAA'}]})
+    registry = _registry(client)
+    _add(registry, 'db1', 'AAA', ['u1', 'u2'])
+    # Riga della lobby eliminata da un'altra parte prima del flush
+    _add(registry, 'db2', 'BBB', ['u3'])
+
+    assert registry.flush() == 1
+    assert sorted(row['user_id'] for row in client.tables['lobby_players']) == ['u1', 'u2']
+    assert registry.flush_errors == 1
+
+    # Un'altra modifica alla lobby sana viene salvata anche se BBB continua a fallire
+    registry.set_ready('AAA', 'u1', True)
+    registry.flush()
+    assert {row['user_id']: row['is_ready'] for row in client.tables['lobby_players']} == {'u1': True, 'u2': False}
+
+
+def test_failing_lobby_is_retried_a_limited_number_of_times():
+    client = RejectingSupabase()
+    registry = _registry(client, max_flush_retries=3)
+    _add(registry, 'db1', 'AAA', ['u1'])
+
+    for _ in range(5):
+        registry.flush()
+
+    assert registry.flush_errors == 3
+    assert registry.flush_dropped == 1
+    assert client.tables.get('lobby_players', []) == []
+
+
+def test_partial_failure_keeps_persisted_state_in_step():
+    client = RejectingSupabase({'lobbies': [{'id': 'db1', 'lobby_id': 'AAA'}, {'id': 'db2', 'lobby_id': 'BBB'}]})
+    registry = _registry(client)
+    _add(registry, 'db1', 'AAA', ['u1', 'u2'])
+    _add(registry, 'db2', 'BBB', ['u3', 'u4'])
+    registry.flush()
+
+    # Nello stesso flush: AAA chiusa (delete riuscito), BBB perde un giocatore e ne guadagna uno
+    # mentre la sua riga sparisce, quindi l'inserimento fallisce dopo il delete già applicato
+    registry.remove_player('AAA', 'u1')
+    registry.remove_player('AAA', 'u2')
+    registry.remove_player('BBB', 'u3')
+    registry.add_player('BBB', 'u5', 'u5')
+    client.tables['lobbies'] = [row for row in client.tables['lobbies'] if row['id'] != 'db2']
+
+    assert registry.flush() == 1
+    assert [(row['lobby_id'], row['user_id']) for row in client.tables['lobby_players']] == [('db2', 'u4')]
+
+    # Ripristinata la riga, il flush successivo ritenta solo ciò che mancava: l'inserimento e il
+    # passaggio di creatore (u3 era il creatore), non il delete già applicato
+    client.tables['lobbies'].append({'id': 'db2', 'lobby_id': 'BBB', 'creator_id': 'u3'})
+    requests = client.requests
+    registry.flush()
+    assert client.requests == requests + 2
+    assert sorted(row['user_id'] for row in client.tables['lobby_players']) == ['u4', 'u5']
+    assert client.tables['lobbies'][0]['creator_id'] == registry.get('BBB').creator_id != 'u3'
+
+
+def _expected_page(registry, lobby_type, is_locked, min_free_seats, cursor, limit):
+    matching = sorted((lobby for lobby in registry._by_code.values()
+                       if (lobby_type is None or lobby.type == lobby_type)
+                       and (is_locked is None or lobby.is_locked == is_locked)
+                       and lobby.free_seats >= min_free_seats and lobby.order > cursor),
+                      key=lambda lobby: lobby.order)
+    return [lobby.lobby_id for lobby in matching[:limit]], len(matching) > limit
+
+
+def test_lobby_taken_over_by_another_node():
+    client = FakeSupabase({'lobbies': [{'id': 'db1', 'lobby_id': 'AAA', 'lobby_name': 'AAA', 'type': 'pub',
+                                        'num_players': 8, 'password': None, 'creator_id': 'u1'}]})
+    get_usernames = lambda user_ids: {uid: uid.upper() for uid in user_ids}
+    old_node = _registry(client, get_usernames=get_usernames)
+    _add(old_node, 'db1', 'AAA', ['u1', 'u2'])
+    old_node.flush()
+    old_node.set_ready('AAA', 'u2', True)
+
+    new_node = _registry(client, get_usernames=get_usernames)
+    lobby = new_node.load_lobby('AAA')
+    assert sorted(lobby.players) == ['u1', 'u2'] and lobby.players['u2']['username'] == 'U2'
+    assert new_node.load_lobby('AAA') is lobby and new_node.load_lobby('ZZZ') is None
+
+    # Il nodo che ha perso la lobby non salva più le sue modifiche pendenti
+    assert old_node.evict('AAA') is not None and old_node.get('AAA') is None
+    assert old_node.flush() == 0
+    assert not any(row['is_ready'] for row in client.tables['lobby_players'])
+
+
+class EvictingSupabase(FakeSupabase):
+    """Alla prima scrittura su lobby_players toglie la lobby al registro, come un evict concorrente."""
+
+    registry = None
+
+    def _execute(self, query):
+        result = super()._execute(query)
+        if query._table == 'lobby_players' and self.registry is not None:
+            self.registry.evict('AAA')
+            self.registry = None
+        return result
+
+
+def test_lobby_evicted_during_a_flush():
+    client = EvictingSupabase({'lobbies': [{'id': 'db1', 'lobby_id': 'AAA'}]})
+    registry = _registry(client)
+    _add(registry, 'db1', 'AAA', ['u1', 'u2'])
+    _add(registry, 'db2', 'BBB', ['u3'])
+    client.registry = registry
+
+    # Le scritture già partite vanno a buon fine anche se AAA non è più di questo nodo
+    assert registry.flush() == 2
+    assert registry.get('AAA') is None and 'AAA' not in registry._persisted
+    assert registry._persisted['BBB']['players'] == {'u3': False}
+
+
+def test_write_behind_survives_an_unexpected_error():
+    registry = _registry(FakeSupabase())
+    _add(registry, 'db1', 'AAA', ['u1'])
+    calls = []
+
+    def flush():
+        calls.append(len(calls))
+        if len(calls) == 1:
+            raise RuntimeError('boom')
+        if len(calls) == 3:
+            raise KeyboardInterrupt
+
+    registry.flush = flush
+    try:
+        registry.run_write_behind(lambda _interval: None)
+    except KeyboardInterrupt:
+        pass
+    assert calls == [0, 1, 2]
+
+
+def test_query_pages_match_a_full_scan():
+    import random
+    rng = random.Random(7)
+    registry = _registry(FakeSupabase())
+    for i in range(300):
+        code = f"L{i}"
+        registry.add_lobby(Lobby(f"db{i}", code, code, rng.choice(['pub', 'priv', 'mat']), rng.randint(2, 6),
+                                 rng.choice([None, 'pw']), f"c{i}"), f"c{i}")
+        for j in range(rng.randint(0, 4)):
+            try:
+                registry.add_player(code, f"p{i}.{j}", 'x', password='pw')
+            except Exception:
+                pass
+    for i in rng.sample(range(300), 80):
+        for uid in list(registry.get(f"L{i}").players):
+            registry.remove_player(f"L{i}", uid)
+
+    for lobby_type in (None, 'pub', 'mat'):
+        for is_locked in (None, True, False):
+            for min_free_seats in (0, 1, 3):
+                cursor, seen = 0, []
+                while True:
+                    page, next_cursor = registry.query(lobby_type, is_locked, min_free_seats, cursor, limit=7)
+                    expected, has_more = _expected_page(registry, lobby_type, is_locked, min_free_seats, cursor, 7)
+                    assert [lobby['lobby_id'] for lobby in page] == expected
+                    assert (next_cursor is not None) == has_more
+                    seen += expected
+                    if next_cursor is None:
+                        break
+                    cursor = next_cursor
+                assert len(seen) == len(set(seen))
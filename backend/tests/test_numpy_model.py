@@ -0,0 +1,86 @@
+import json
+
+import h5py
+import numpy as np
+
+from numpy_model import NumpyModel
+
+EPSILON = 1e-3
+
+
+def _write_h5(path, input_dim, layers):
+    """File .h5 nel formato di Keras: layers è una lista di (class_name, config, [(nome peso, array)])."""
+    layer_configs = [{'class_name': 'InputLayer', 'config': {'name': 'input', 'batch_input_shape': [None, input_dim]}}]
+    with h5py.File(path, 'w') as f:
+        weights_root = f.create_group('model_weights')
+        for class_name, config, weights in layers:
+            layer_configs.append({'class_name': class_name, 'config': config})
+            group = weights_root.create_group(config['name'])
+            names = [f"{config['name']}/{weight_name}:0" for weight_name, _ in weights]
+            group.attrs['weight_names'] = [name.encode('utf-8') for name in names]
+            for name, (_weight_name, value) in zip(names, weights):
+                group.create_dataset(name, data=value)
+        f.attrs['model_config'] = json.dumps({'class_name': 'Sequential', 'config': {'layers': layer_configs}})
+
+
+def _dense(name, kernel, bias, activation):
+    return 'Dense', {'name': name, 'activation': activation}, [('kernel', kernel), ('bias', bias)]
+
+
+def _batchnorm(name, gamma, beta, mean, variance):
+    return ('BatchNormalization', {'name': name, 'epsilon': EPSILON},
+            [('gamma', gamma), ('beta', beta), ('moving_mean', mean), ('moving_variance', variance)])
+
+
+def _bn_reference(x, gamma, beta, mean, variance):
+    return gamma * (x - mean) / np.sqrt(variance + EPSILON) + beta
+
+
+def _softmax_reference(x):
+    e = np.exp(x - x.max(axis=1, keepdims=True))
+    return e / e.sum(axis=1, keepdims=True)
+
+
+def _params(rng, dim):
+    return (rng.uniform(0.5, 2, dim), rng.normal(size=dim), rng.normal(size=dim), rng.uniform(0.1, 3, dim))
+
+
+def test_batchnorm_after_linear_and_relu_dense_is_folded(tmp_path):
+    rng = np.random.default_rng(3)
+    w1, b1 = rng.normal(size=(4, 6)), rng.normal(size=6)
+    w2, b2 = rng.normal(size=(6, 5)), rng.normal(size=5)
+    w3, b3 = rng.normal(size=(5, 3)), rng.normal(size=3)
+    bn1, bn2 = _params(rng, 6), _params(rng, 5)
+    path = str(tmp_path / 'model.h5')
+    _write_h5(path, 4, [
+        _dense('dense', w1, b1, 'linear'),
+        _batchnorm('bn', *bn1),
+        ('Dropout', {'name': 'dropout', 'rate': 0.5}, []),
+        _dense('dense_1', w2, b2, 'relu'),
+        _batchnorm('bn_1', *bn2),
+        _dense('dense_2', w3, b3, 'softmax'),
+    ])
+
+    model = NumpyModel.from_h5(path)
+    # Ogni BatchNormalization è fusa in una Dense: restano tre matmul
+    assert len(model.layers) == 3 and model.input_shape == (None, 4) and model.output_shape == (None, 3)
+
+    x = rng.normal(size=(8, 4))
+    h = _bn_reference(x @ w1 + b1, *bn1)
+    h = _bn_reference(np.maximum(h @ w2 + b2, 0), *bn2)
+    expected = _softmax_reference(h @ w3 + b3)
+    np.testing.assert_allclose(model.predict(x), expected, rtol=1e-4, atol=1e-5)
+
+
+def test_trailing_batchnorm_after_an_activation(tmp_path):
+    rng = np.random.default_rng(5)
+    w, b = rng.normal(size=(3, 4)), rng.normal(size=4)
+    bn = _params(rng, 4)
+    path = str(tmp_path / 'model.h5')
+    _write_h5(path, 3, [_dense('dense', w, b, 'tanh'), _batchnorm('bn', *bn)])
+
+    model = NumpyModel.from_h5(path)
+    x = rng.normal(size=(5, 3))
+    np.testing.assert_allclose(model.predict(x), _bn_reference(np.tanh(x @ w + b), *bn), rtol=1e-4, atol=1e-5)
+    # Un solo campione (vettore 1-D) come in keras.Model.predict con batch implicito
+    np.testing.assert_allclose(model.predict(x[0]), model.predict(x[:1]), rtol=1e-6)
@@ -0,0 +1,55 @@
+import pytest
+
+from password_hashing import PasswordHasher, PasswordHasherBusy
+
+
+def test_hash_and_verify():
+    hasher = PasswordHasher(rounds=4, pool_size=1)
+    hashed = hasher.hash('segreta')
+
+    assert hasher.verify('segreta', hashed)
+    assert not hasher.verify('sbagliata', hashed)
+    assert hasher.rehash('segreta', hashed) is None
+    assert hasher.needs_rehash(PasswordHasher(rounds=5, pool_size=1).hash('segreta'))
+    hasher.shutdown()
+
+
+def test_full_queue_is_rejected():
+    hasher = PasswordHasher(rounds=4, pool_size=1, max_queue=0)
+
+    with pytest.raises(PasswordHasherBusy):
+        hasher.hash('segreta')
+    assert hasher.stats()['rejected'] == 1
+    hasher.shutdown()
+
+
+def test_more_logins_than_slots_under_eventlet(run_under_eventlet):
+    # Con un semaforo di `threading` il terzo login fermerebbe l'hub (e il ticker) fino al timeout
+    output = run_under_eventlet("""
+        import time
+        import eventlet
+        from eventlet import tpool
+        from password_hashing import PasswordHasher
+
+        ticks = []
+        def ticker():
+            while True:
+                ticks.append(1)
+                eventlet.sleep(0.01)
+        eventlet.spawn(ticker)
+
+        hasher = PasswordHasher(rounds=4, pool_size=2, timeout=5, sleep=eventlet.sleep,
+                                offload=lambda fn, *args: tpool.execute(lambda: time.sleep(0.1) or fn(*args)),
+                                semaphore=eventlet.semaphore.BoundedSemaphore)
+        hashed = hasher.hash('segreta')
+        start = time.monotonic()
+        ticks.clear()
+        pool = eventlet.GreenPool()
+        results = list(pool.imap(lambda _: hasher.verify('segreta', hashed), range(5)))
+        print(all(results), len(ticks), round(time.monotonic() - start, 2))
+    """)
+    ok, ticks, elapsed = output.split()
+    assert ok == 'True'
+    # Tre turni da 0.1 s: il ticker ha continuato a girare mentre si aspettavano gli slot
+    assert float(elapsed) < 2
+    assert int(ticks) >= 15
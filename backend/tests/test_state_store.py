@@ -0,0 +1,73 @@
+from state_store import MemoryRedis, StateStore
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _nodes(*node_ids, claim_ttl=30):
+    clock = Clock()
+    redis = MemoryRedis(clock=clock)
+    return clock, [StateStore(redis, node_id, claim_ttl=claim_ttl) for node_id in node_ids]
+
+
+def test_claim_expires_without_heartbeat_and_is_taken_over():
+    clock, (a, b) = _nodes('a', 'b')
+
+    assert a.claim_lobby('AAA')
+    assert not b.claim_lobby('AAA')
+    clock.now = 20
+    assert a.renew_claims(['AAA']) == []
+    clock.now = 40
+    # Rinnovata a t=20: ancora di 'a'
+    assert a.lobby_node('AAA') == 'a' and not b.claim_lobby('AAA')
+
+    clock.now = 51
+    assert a.lobby_node('AAA') is None
+    assert b.claim_lobby('AAA')
+    assert a.renew_claims(['AAA']) == ['AAA']
+
+
+def test_node_url_is_exclusive_and_expires():
+    clock, (a, b) = _nodes('a', 'b')
+
+    assert a.register_node('http://host:5001')
+    assert not b.register_node('http://host:5001')
+    assert b.register_node('http://host:5002')
+    assert a.node_url('a') == 'http://host:5001'
+
+    clock.now = 31
+    assert a.node_url('a') is None
+    assert b.register_node('http://host:5001')
+
+
+def test_release_frees_only_own_keys():
+    _clock, (a, b) = _nodes('a', 'b')
+    a.register_node('http://host:5001')
+    a.claim_lobby('AAA')
+    b.claim_lobby('BBB')
+
+    b.release_lobbies(['AAA'])
+    a.release_lobbies(['AAA', 'BBB'])
+    a.release_node('http://host:5001')
+
+    assert a.lobby_node('AAA') is None and a.lobby_node('BBB') == 'b'
+    assert a.node_url('a') is None and b.register_node('http://host:5001')
+
+
+def test_query_lobby_views_pages_in_publication_order():
+    _clock, (a, b) = _nodes('a', 'b')
+    for i, store in enumerate([a, b, a, b, a]):
+        store.publish_lobby_delta({'added': [{'lobby_id': f'L{i}', 'free': i % 2}], 'updated': [], 'removed': []})
+    a.publish_lobby_delta({'added': [], 'updated': [{'lobby_id': 'L0', 'free': 1}], 'removed': ['L3']})
+
+    match = lambda lobby: lobby['free'] == 1
+    page, cursor = b.query_lobby_views(match, limit=1, chunk=2)
+    assert [lobby['lobby_id'] for lobby in page] == ['L0'] and cursor is not None
+    # L3 (l'altra lobby con un posto libero) è stata rimossa: L1 è l'ultima pagina
+    page, cursor = b.query_lobby_views(match, cursor=cursor, limit=1, chunk=2)
+    assert [lobby['lobby_id'] for lobby in page] == ['L1'] and cursor is None
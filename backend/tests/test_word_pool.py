@@ -0,0 +1,41 @@
+import sqlite3
+
+from word_pool import WordPool
+
+WORDS = ['casa', 'cane', 'sole', 'mare', 'luna', 'pane', 'naso', 'topo', 'vino', 'neve']
+
+
+def _stored(path):
+    with sqlite3.connect(path) as db:
+        return {word for (word,) in db.execute("SELECT word FROM words WHERE difficulty = 'facile'")}
+
+
+def test_consumed_words_are_deleted_in_batches(tmp_path):
+    path = str(tmp_path / 'words.sqlite3')
+    pool = WordPool(path, lambda difficulty: [], lambda fn, *args: None,
+                    low_watermark=0, delete_batch_size=4)
+    assert pool.add('facile', WORDS) == 10
+
+    first = pool.sample('facile', 3)
+    assert pool.size('facile') == 7 and _stored(path) == set(WORDS)
+
+    # Raggiunto il blocco, le parole consumate vengono cancellate insieme
+    second = pool.sample('facile', 2)
+    assert _stored(path) == set(WORDS) - set(first) - set(second)
+
+    third = pool.sample('facile', 1)
+    pool.flush_consumed()
+    assert _stored(path) == set(WORDS) - set(first) - set(second) - set(third)
+
+
+def test_consumed_words_are_not_served_again_after_a_restart(tmp_path):
+    path = str(tmp_path / 'words.sqlite3')
+    pool = WordPool(path, lambda difficulty: [], lambda fn, *args: None, low_watermark=0)
+    pool.add('facile', WORDS)
+    served = pool.sample('facile', 4)
+    # Una parola consumata e rigenerata torna nel pool: la cancellazione precede l'inserimento
+    pool.add('facile', served[:1] + ['gatto'])
+
+    restarted = WordPool(path, lambda difficulty: [], lambda fn, *args: None, low_watermark=0)
+    assert restarted.size('facile') == 8
+    assert set(served[1:]).isdisjoint(restarted.sample('facile', 8))
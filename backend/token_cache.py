@@ -0,0 +1,50 @@
+# token_cache.py
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+class TokenCache:
+    """
+    Cache dei JWT già verificati: chiave = sha256 del token, valore = claims decodificati.
+
+    Un token viene verificato (firma, scadenza, tipo) da `decode(token)` solo la prima volta;
+    le volte successive i claims arrivano dalla cache finché non si raggiunge il suo `exp`, dopo
+    di che viene verificato di nuovo (e `decode` solleva l'errore di token scaduto). I token
+    non validi non vengono memorizzati. Oltre `max_size` token vengono scartati i meno usati.
+    """
+
+    def __init__(self, decode, max_size=10000, clock=time.time):
+        self._decode = decode
+        self.max_size = max_size
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def verify(self, token):
+        """Claims del token; solleva l'eccezione di `decode` se il token non è valido."""
+        key = hashlib.sha256(token.encode('utf-8')).digest()
+        now = self._clock()
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None and (cached[0] is None or cached[0] > now):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return cached[1]
+            self._entries.pop(key, None)
+            self.misses += 1
+
+        claims = self._decode(token)
+        with self._lock:
+            self._entries[key] = (claims.get('exp'), claims)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return claims
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._entries), 'max_size': self.max_size, 'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,91 @@
+# user_cache.py
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class UserCache:
+    """
+    Cache dei profili utente (id, username, email, points) per user_id, con scadenza e LRU.
+
+    I profili mancanti o scaduti vengono letti con `load_users(user_ids)` (una sola richiesta
+    per più utenti); login e registrazione la riempiono con `put()`. I punti cambiano fuori dal
+    backend, quindi un profilo in cache può restare indietro al più di `ttl` secondi (o fino a
+    `invalidate()`). Oltre `max_size` profili vengono scartati i meno usati.
+    """
+
+    def __init__(self, load_users, ttl=300.0, max_size=10000):
+        self._load_users = load_users
+        self.ttl = ttl
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def put(self, profile):
+        """Salva (o sostituisce) il profilo; campi extra come la password non vengono tenuti."""
+        entry = {key: profile.get(key) for key in ('id', 'username', 'email', 'points')}
+        with self._lock:
+            self._entries[entry['id']] = (time.monotonic() + self.ttl, entry)
+            self._entries.move_to_end(entry['id'])
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return entry
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def _lookup_locked(self, user_id, now):
+        cached = self._entries.get(user_id)
+        if cached is None:
+            return None
+        expires, entry = cached
+        if expires < now:
+            del self._entries[user_id]
+            return None
+        self._entries.move_to_end(user_id)
+        return entry
+
+    def get_many(self, user_ids):
+        """Profili {user_id: profilo} degli utenti esistenti tra `user_ids` (da non modificare)."""
+        now = time.monotonic()
+        result = {}
+        missing = []
+        with self._lock:
+            for user_id in dict.fromkeys(user_ids):
+                entry = self._lookup_locked(user_id, now)
+                if entry is None:
+                    missing.append(user_id)
+                else:
+                    result[user_id] = entry
+            self.hits += len(result)
+            self.misses += len(missing)
+        if missing:
+            for row in self._load_users(missing):
+                result[row['id']] = self.put(row)
+        return result
+
+    def get(self, user_id):
+        """Profilo dell'utente, o None se non esiste."""
+        return self.get_many([user_id]).get(user_id)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+    def __len__(self):
+        return len(self._entries)
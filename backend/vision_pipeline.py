@@ -0,0 +1,161 @@
+# vision_pipeline.py
+#
+# Passi della pipeline di riconoscimento che non dipendono da Flask: usati sia da backend.py
+# sia dai processi worker di vision_workers.py.
+
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+labels_dict = {i: chr(65 + i) for i in range(26)}
+
+# Tag EXIF "Orientation" (0x0112): fisso nello standard, niente ricerca in ExifTags.TAGS
+EXIF_ORIENTATION_TAG = 0x0112
+
+# Orientamento EXIF -> numero di quarti di giro in senso antiorario per raddrizzare l'immagine
+# (orientamenti speculari 2/4/5/7 non prodotti dalle fotocamere dei telefoni: ignorati)
+_ORIENTATION_QUARTER_TURNS = {3: 2, 6: 3, 8: 1}
+
+def read_jpeg_orientation(data):
+    """
+    Legge l'orientamento EXIF scorrendo solo i marker dell'header JPEG (fino a SOS),
+    senza decodificare l'immagine. Ritorna 1 (normale) se assente o se i dati non sono JPEG.
+    """
+    view = memoryview(data)
+    if len(view) < 4 or view[0] != 0xFF or view[1] != 0xD8:
+        return 1
+    pos = 2
+    n = len(view)
+    while pos + 4 <= n:
+        if view[pos] != 0xFF:
+            return 1
+        marker = view[pos + 1]
+        if marker == 0xFF:  # byte di riempimento
+            pos += 1
+            continue
+        if marker in (0xD9, 0xDA):  # EOI / SOS: fine dell'header
+            return 1
+        seg_len = (view[pos + 2] << 8) | view[pos + 3]
+        seg_start = pos + 4
+        if marker == 0xE1 and bytes(view[seg_start:seg_start + 6]) == b'Exif\x00\x00':
+            return _parse_tiff_orientation(view[seg_start + 6:pos + 2 + seg_len])
+        pos += 2 + seg_len
+    return 1
+
+def _parse_tiff_orientation(tiff):
+    if len(tiff) < 8:
+        return 1
+    order = bytes(tiff[0:2])
+    if order == b'II':
+        big_endian = False
+    elif order == b'MM':
+        big_endian = True
+    else:
+        return 1
+
+    def u16(off):
+        a, b = tiff[off], tiff[off + 1]
+        return (a << 8 | b) if big_endian else (b << 8 | a)
+
+    def u32(off):
+        return (u16(off) << 16 | u16(off + 2)) if big_endian else (u16(off + 2) << 16 | u16(off))
+
+    ifd0 = u32(4)
+    if ifd0 + 2 > len(tiff):
+        return 1
+    for i in range(u16(ifd0)):
+        entry = ifd0 + 2 + i * 12
+        if entry + 12 > len(tiff):
+            break
+        if u16(entry) == EXIF_ORIENTATION_TAG:
+            return u16(entry + 8)
+    return 1
+
+def correct_image_orientation(image_data, platform, max_side=0):
+    """
+    Decodifica il JPEG una sola volta in un buffer RGB raddrizzato secondo l'EXIF
+    (e ruotato in verticale per Android). Con max_side > 0 l'immagine viene prima ridotta
+    perché il lato maggiore non superi max_side: i landmark di MediaPipe sono normalizzati,
+    quindi le feature non cambiano.
+    """
+    import cv2  # caricato dal sottosistema 'opencv', qui è già in sys.modules
+
+    try:
+        orientation = read_jpeg_orientation(image_data)
+        buffer = np.frombuffer(image_data, dtype=np.uint8)
+        img = cv2.imdecode(buffer, cv2.IMREAD_COLOR | cv2.IMREAD_IGNORE_ORIENTATION)
+        if img is None:
+            raise ValueError("Impossibile decodificare l'immagine.")
+
+        h, w = img.shape[:2]
+        if max_side and max(h, w) > max_side:
+            scale = max_side / max(h, w)
+            img = cv2.resize(img, (max(1, round(w * scale)), max(1, round(h * scale))),
+                             interpolation=cv2.INTER_AREA)
+            h, w = img.shape[:2]
+
+        # Rotazione EXIF e rotazione Android unite in un'unica rotazione
+        quarter_turns = _ORIENTATION_QUARTER_TURNS.get(orientation, 0)
+        if quarter_turns % 2 == 1:
+            w, h = h, w
+        if platform == 'android' and w > h:
+            quarter_turns += 1
+        quarter_turns %= 4
+
+        if quarter_turns == 1:
+            img = cv2.rotate(img, cv2.ROTATE_90_COUNTERCLOCKWISE)
+        elif quarter_turns == 2:
+            img = cv2.rotate(img, cv2.ROTATE_180)
+        elif quarter_turns == 3:
+            img = cv2.rotate(img, cv2.ROTATE_90_CLOCKWISE)
+
+        # BGR -> RGB sul posto, senza allocare un secondo frame
+        return cv2.cvtColor(img, cv2.COLOR_BGR2RGB, dst=img)
+    except Exception as e:
+        logger.error(f"Errore orientamento immagine: {e}")
+        return None
+
+def build_feature_vector(x_, y_, input_length):
+    """Landmark (x, y) di una mano -> vettore normalizzato su min x/y, con padding a input_length."""
+    min_x, min_y = min(x_), min(y_)
+    data_aux = []
+    for x, y in zip(x_, y_):
+        data_aux.append(x - min_x)
+        data_aux.append(y - min_y)
+
+    if len(data_aux) < input_length:
+        data_aux += [0]*(input_length - len(data_aux))
+    else:
+        data_aux = data_aux[:input_length]
+    return data_aux
+
+def extract_hand_features(results, input_length):
+    """Costruisce un vettore di feature (landmark normalizzati su min x/y, con padding) per ogni mano."""
+    features = []
+    hand_types = []
+    for idx, hlm in enumerate(results.multi_hand_landmarks):
+        x_ = [lm.x for lm in hlm.landmark]
+        y_ = [lm.y for lm in hlm.landmark]
+        features.append(build_feature_vector(x_, y_, input_length))
+
+        hand_types.append("Right Hand"
+                          if results.multi_handedness[idx].classification[0].label == "Right"
+                          else "Left Hand")
+    return features, hand_types
+
+def build_predictions(probabilities, hand_types):
+    predictions = []
+    for idx, prediction in enumerate(probabilities):
+        pred_index = int(np.argmax(prediction))
+        confidence = float(np.max(prediction))*100
+        predicted_character = labels_dict.get(pred_index, '')
+
+        predictions.append({
+            'hand': idx+1,
+            'hand_type': hand_types[idx],
+            'character': predicted_character,
+            'confidence': confidence
+        })
+    return predictions
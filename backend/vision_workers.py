@@ -0,0 +1,147 @@
+# vision_workers.py
+
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Stato del processo worker (inizializzato da _init_worker)
+_worker = {}
+
+
+def _init_worker(model_path, model_backend, max_side):
+    """Eseguita una volta in ogni processo worker: carica modello e tracker MediaPipe."""
+    import mediapipe as mp
+    from numpy_model import load_classifier
+
+    _worker['model'] = load_classifier(model_path, model_backend)
+    # I frame di un utente possono finire su worker diversi: niente stato di tracking tra frame
+    _worker['hands'] = mp.solutions.hands.Hands(static_image_mode=True, max_num_hands=2,
+                                                min_detection_confidence=0.5)
+    _worker['shm'] = {}
+    _worker['max_side'] = max_side
+
+
+def _attach_shared(name):
+    shm = _worker['shm'].get(name)
+    if shm is None:
+        # Con 'spawn' il worker condivide il resource tracker del processo principale,
+        # che resta l'unico responsabile dell'unlink del segmento
+        shm = shared_memory.SharedMemory(name=name)
+        _worker['shm'][name] = shm
+    return shm
+
+
+def _process_frame(image_data, platform):
+    from vision_pipeline import correct_image_orientation, extract_hand_features, build_predictions
+
+    timings = {}
+    t0 = time.perf_counter()
+    frame_rgb = correct_image_orientation(image_data, platform, _worker['max_side'])
+    if frame_rgb is None:
+        return {'error': "Impossibile correggere l'orientamento."}
+    t1 = time.perf_counter()
+    timings['decode_ms'] = (t1 - t0) * 1000
+
+    results = _worker['hands'].process(frame_rgb)
+    t2 = time.perf_counter()
+    timings['hands_ms'] = (t2 - t1) * 1000
+
+    predictions = []
+    if results.multi_hand_landmarks:
+        model = _worker['model']
+        features, hand_types = extract_hand_features(results, model.input_shape[1])
+        t3 = time.perf_counter()
+        timings['features_ms'] = (t3 - t2) * 1000
+        probabilities = model.predict(np.array(features, dtype=np.float32), verbose=0)
+        timings['model_ms'] = (time.perf_counter() - t3) * 1000
+        predictions = build_predictions(probabilities, hand_types)
+        probabilities = np.asarray(probabilities).tolist()
+    else:
+        probabilities = []
+
+    return {'predictions': predictions, 'probabilities': probabilities, 'timings': timings}
+
+
+def _process_shared_frame(shm_name, length, platform):
+    shm = _attach_shared(shm_name)
+    return _process_frame(bytes(shm.buf[:length]), platform)
+
+
+class VisionWorkerPool:
+    """
+    Esegue decode JPEG, orientamento, MediaPipe e modello in un pool di processi,
+    lasciando libero il processo web (e il suo event loop eventlet).
+
+    I byte del frame vengono copiati in uno slot di memoria condivisa e il worker li legge
+    da lì; se non ci sono slot liberi o il frame è più grande di uno slot, i byte vengono
+    passati normalmente (pickle). `submit()` ritorna un concurrent.futures.Future.
+    """
+
+    def __init__(self, num_workers, model_path, model_backend='numpy', max_side=0,
+                 slot_size=2 * 1024 * 1024, num_slots=None):
+        self.num_workers = num_workers
+        self.slot_size = slot_size
+        self._executor = ProcessPoolExecutor(
+            max_workers=num_workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(model_path, model_backend, max_side)
+        )
+        self._lock = threading.Lock()
+        self._slots = [shared_memory.SharedMemory(create=True, size=slot_size)
+                       for _ in range(num_slots or num_workers * 2)]
+        self._free_slots = list(self._slots)
+
+        self.submitted = 0
+        self.shared_submissions = 0
+
+    def _acquire_slot(self, length):
+        if length > self.slot_size:
+            return None
+        with self._lock:
+            return self._free_slots.pop() if self._free_slots else None
+
+    def _release_slot(self, slot):
+        with self._lock:
+            self._free_slots.append(slot)
+
+    def submit(self, image_data, platform):
+        self.submitted += 1
+        slot = self._acquire_slot(len(image_data))
+        if slot is None:
+            return self._executor.submit(_process_frame, image_data, platform)
+
+        self.shared_submissions += 1
+        slot.buf[:len(image_data)] = image_data
+        future = self._executor.submit(_process_shared_frame, slot.name, len(image_data), platform)
+        future.add_done_callback(lambda _f: self._release_slot(slot))
+        return future
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        for slot in self._slots:
+            slot.close()
+            slot.unlink()
+        self._slots = []
+        self._free_slots = []
+
+
+def wait_for_future(future, sleep, poll_interval=0.002, timeout=None):
+    """
+    Attende un Future cedendo il controllo con `sleep` (es. socketio.sleep) tra un controllo
+    e l'altro, così sotto eventlet gli altri greenlet continuano a girare.
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while not future.done():
+        if deadline is not None and time.monotonic() > deadline:
+            future.cancel()
+            raise TimeoutError("Timeout in attesa del worker di visione.")
+        sleep(poll_interval)
+    return future.result()
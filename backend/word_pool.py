@@ -0,0 +1,201 @@
+# word_pool.py
+
+import json
+import logging
+import random
+import re
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Lunghezza minima e massima delle parole per ogni difficoltà
+DIFFICULTY_LENGTHS = {
+    'facile': (3, 5),
+    'medio': (6, 8),
+    'difficile': (8, 20)
+}
+
+# Dizionario di riserva, usato quando il pool è vuoto e la generazione non è disponibile (es. offline)
+FALLBACK_WORDS = {
+    'facile': [
+        'casa', 'cane', 'gatto', 'sole', 'mare', 'luna', 'pane', 'fiore', 'porta', 'libro',
+        'mano', 'naso', 'topo', 'vino', 'neve', 'treno', 'palla', 'carta', 'sedia', 'lago',
+        'nave', 'uva', 'rosa', 'orso', 'mela', 'pera', 'sale', 'olio', 'bosco', 'notte'
+    ],
+    'medio': [
+        'tavolo', 'finestra', 'giardino', 'montagna', 'scuola', 'farfalla', 'cavallo', 'bottone',
+        'cucina', 'stagione', 'pianeta', 'ombrello', 'cuscino', 'formica', 'tramonto', 'pittore',
+        'lavagna', 'quaderno', 'matita', 'regalo', 'candela', 'tempesta', 'gelato', 'zucchero',
+        'castello', 'foresta', 'sorriso', 'balcone', 'coniglio', 'cammino'
+    ],
+    'difficile': [
+        'bicicletta', 'calendario', 'biblioteca', 'temporale', 'ospedale', 'elefante', 'dinosauro',
+        'astronave', 'pomodoro', 'arcobaleno', 'fotografia', 'computer', 'montagnoso', 'pavimento',
+        'lampadario', 'termometro', 'passeggiata', 'cioccolato', 'girasole', 'primavera',
+        'universita', 'telescopio', 'coccodrillo', 'aeroplano', 'tartaruga', 'ventilatore',
+        'maglione', 'frigorifero', 'grattacielo', 'supermercato'
+    ]
+}
+
+_VALID_WORD = re.compile(r'^[a-z]+$')
+
+
+def load_fallback_words(path=None):
+    """Dizionario di riserva: FALLBACK_WORDS oppure un file JSON {"facile": [...], "medio": [...], ...}."""
+    if not path:
+        return FALLBACK_WORDS
+    with open(path, encoding='utf-8') as f:
+        words = json.load(f)
+    return {difficulty: words.get(difficulty, FALLBACK_WORDS[difficulty]) for difficulty in DIFFICULTY_LENGTHS}
+
+
+def normalize_words(words, difficulty):
+    """Parole in minuscolo, senza accenti né caratteri speciali, della lunghezza giusta e senza doppioni."""
+    lmin, lmax = DIFFICULTY_LENGTHS[difficulty]
+    result = []
+    seen = set()
+    for word in words:
+        word = word.strip().lower()
+        if _VALID_WORD.match(word) and lmin <= len(word) <= lmax and word not in seen:
+            seen.add(word)
+            result.append(word)
+    return result
+
+
+class WordPool:
+    """
+    Pool di parole già generate per ogni difficoltà, salvato in SQLite.
+
+    `sample()` estrae parole casuali e distinte dal pool e le consuma, così partite consecutive
+    non ricevono le stesse parole. Quando un pool scende sotto `low_watermark` parole viene
+    avviato (una sola volta per difficoltà) un riempimento in background con `generate(difficulty)`
+    fino a `target_size` parole. Se il pool non basta si completa con il dizionario di riserva.
+
+    Le parole consumate escono subito dal pool in memoria, ma vengono cancellate da SQLite a blocchi
+    (un commit ogni `delete_batch_size` parole, o insieme agli inserimenti del riempimento) invece
+    che con un commit per ogni `sample()`. Se il processo termina prima, alcune parole già servite
+    restano nel DB e possono ricomparire dopo il riavvio.
+    """
+
+    def __init__(self, db_path, generate, start_background_task, fallback_words=None,
+                 low_watermark=30, target_size=100, max_generate_attempts=20, delete_batch_size=50):
+        self._generate = generate
+        self._start_background_task = start_background_task
+        self.fallback_words = {difficulty: normalize_words(words, difficulty)
+                               for difficulty, words in (fallback_words or FALLBACK_WORDS).items()}
+        self.low_watermark = low_watermark
+        self.target_size = target_size
+        self.max_generate_attempts = max_generate_attempts
+        self.delete_batch_size = delete_batch_size
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS words ("
+            " difficulty TEXT NOT NULL, word TEXT NOT NULL, PRIMARY KEY (difficulty, word))"
+        )
+        self._db.commit()
+        self._pools = {difficulty: set() for difficulty in DIFFICULTY_LENGTHS}
+        for difficulty, word in self._db.execute("SELECT difficulty, word FROM words"):
+            if difficulty in self._pools:
+                self._pools[difficulty].add(word)
+        self._refilling = set()
+        self._consumed = []
+
+        self.served_from_pool = 0
+        self.served_from_fallback = 0
+
+    def size(self, difficulty):
+        return len(self._pools[difficulty])
+
+    def sample(self, difficulty, count=10):
+        """Ritorna `count` parole distinte per la difficoltà (meno solo se anche la riserva non basta)."""
+        with self._lock:
+            pool = self._pools[difficulty]
+            words = random.sample(list(pool), min(count, len(pool)))
+            if words:
+                pool.difference_update(words)
+                self._consumed.extend((difficulty, word) for word in words)
+                if len(self._consumed) >= self.delete_batch_size:
+                    self._delete_consumed_locked()
+                    self._db.commit()
+            self.served_from_pool += len(words)
+            needs_refill = len(pool) < self.low_watermark and difficulty not in self._refilling
+            if needs_refill:
+                self._refilling.add(difficulty)
+
+        if needs_refill:
+            self._start_background_task(self.refill, difficulty)
+
+        missing = count - len(words)
+        if missing > 0:
+            candidates = [w for w in self.fallback_words.get(difficulty, []) if w not in words]
+            extra = random.sample(candidates, min(missing, len(candidates)))
+            self.served_from_fallback += len(extra)
+            words.extend(extra)
+        return words
+
+    def add(self, difficulty, words):
+        """Aggiunge parole al pool (ignorando quelle non valide o già presenti); ritorna quante ne ha aggiunte."""
+        words = normalize_words(words, difficulty)
+        with self._lock:
+            new_words = [w for w in words if w not in self._pools[difficulty]]
+            self._pools[difficulty].update(new_words)
+            # Le cancellazioni in sospeso viaggiano nello stesso commit degli inserimenti
+            self._delete_consumed_locked()
+            self._db.executemany("INSERT OR IGNORE INTO words (difficulty, word) VALUES (?, ?)",
+                                 [(difficulty, word) for word in new_words])
+            self._db.commit()
+        return len(new_words)
+
+    def flush_consumed(self):
+        """Cancella da SQLite le parole consumate non ancora rimosse (es. alla chiusura)."""
+        with self._lock:
+            if self._consumed:
+                self._delete_consumed_locked()
+                self._db.commit()
+
+    def _delete_consumed_locked(self):
+        if self._consumed:
+            self._db.executemany("DELETE FROM words WHERE difficulty = ? AND word = ?", self._consumed)
+            self._consumed = []
+
+    def refill(self, difficulty):
+        """Genera parole finché il pool non raggiunge target_size (o finché la generazione non fallisce)."""
+        try:
+            attempts = 0
+            fruitless = 0
+            while self.size(difficulty) < self.target_size and attempts < self.max_generate_attempts:
+                attempts += 1
+                try:
+                    generated = self._generate(difficulty)
+                except Exception as e:
+                    logger.warning(f"Generazione parole '{difficulty}' non riuscita: {e}")
+                    break
+                if not generated:
+                    break
+                # Il generatore continua a proporre parole già presenti o non valide: si riprova più tardi
+                fruitless = 0 if self.add(difficulty, generated) else fruitless + 1
+                if fruitless >= 3:
+                    break
+            logger.info(f"Pool parole '{difficulty}': {self.size(difficulty)} parole dopo {attempts} generazioni.")
+        finally:
+            with self._lock:
+                self._refilling.discard(difficulty)
+
+    def fill_all(self):
+        """Avvia il riempimento in background di tutti i pool sotto la soglia (es. all'avvio)."""
+        for difficulty in DIFFICULTY_LENGTHS:
+            with self._lock:
+                if self.size(difficulty) >= self.low_watermark or difficulty in self._refilling:
+                    continue
+                self._refilling.add(difficulty)
+            self._start_background_task(self.refill, difficulty)
+
+    def stats(self):
+        return {
+            'pools': {difficulty: len(pool) for difficulty, pool in self._pools.items()},
+            'served_from_pool': self.served_from_pool,
+            'served_from_fallback': self.served_from_fallback
+        }
@@ -110,7 +110,12 @@ class _ModalitaScreenState extends State<ModalitaScreen> {
 
   // --- NAVIGA ALLA SCHERMATA DI GIOCO (usando le parole) ---
   Future<void> _navigateToGameScreen(String difficulty) async {
-    final words = await fetchWords(difficulty);
+    // Le parole arrivano con vote_result (uguali per tutta la lobby); la richiesta HTTP resta
+    // solo come riserva per server che non le inviano
+    List<String> words = socketService.roundWords;
+    if (words.isEmpty) {
+      words = await fetchWords(difficulty);
+    }
     if (!mounted) return; // Evita errori se il widget è stato smontato
 
     if (words.isNotEmpty) {
@@ -16,6 +16,22 @@ class SocketService {
   bool _isDisposed = false;
   bool _isListenersInitialized = false;
 
+  // Nodo del backend a cui è collegato il socket (null = BackendConfig.baseUrl). Ogni lobby è
+  // gestita da un solo nodo: 'lobby_redirect' indica dove ricollegarsi e quale evento ripetere
+  String? _serverUrl;
+  MapEntry<String, dynamic>? _pendingEmit;
+
+  // Listener registrati con on(), da spostare sul nuovo socket dopo un redirect
+  final Map<String, List<Function(dynamic)>> _externalListeners = {};
+
+  // Copia locale delle lobby, tenuta aggiornata con 'lobby_snapshot' + 'lobby_delta'
+  final Map<String, Lobby> _lobbyCache = {};
+  int _lobbySeq = -1; // -1 = nessuno snapshot ricevuto
+
+  // Parole della partita corrente, generate dal server una volta per tutta la lobby (vote_result)
+  List<String> _roundWords = [];
+  List<String> get roundWords => List.unmodifiable(_roundWords);
+
   // StreamControllers per vari eventi
   final StreamController<List<Lobby>> _lobbiesStreamController =
       StreamController<List<Lobby>>.broadcast();
@@ -50,7 +66,8 @@ class SocketService {
   Stream<void> get gameFinishedStream => _gameFinishedStreamController.stream;
 
   // Listener per gli eventi
-  late void Function(dynamic) _updateLobbiesListener;
+  late void Function(dynamic) _lobbySnapshotListener;
+  late void Function(dynamic) _lobbyDeltaListener;
   late void Function(dynamic) _lobbyCreatedListener;
   late void Function(dynamic) _joinedLobbyListener;
   late void Function(dynamic) _gameStartedListener;
@@ -59,6 +76,7 @@ class SocketService {
   late void Function(dynamic) _startTimerListener;
   late void Function(dynamic) _gameFinishedListener;
   late void Function(dynamic) _errorListener; // Aggiunto
+  late void Function(dynamic) _lobbyRedirectListener;
 
   /// Inizializza la connessione Socket.IO con il token JWT
   Future<void> connect() async {
@@ -76,16 +94,16 @@ class SocketService {
     return;
   }
 
-  socket = IO.io(
-    BackendConfig.baseUrl,
-    IO.OptionBuilder()
-        .setTransports(['websocket'])
-        .setQuery({'token': token})
-        .enableAutoConnect()
-        .setReconnectionAttempts(0) // Riconnessione infinita
-        .setReconnectionDelay(2000)
-        .build(),
-  );
+  final options = IO.OptionBuilder()
+      .setTransports(['websocket'])
+      .setQuery({'token': token})
+      .enableAutoConnect()
+      .setReconnectionAttempts(0) // Riconnessione infinita
+      .setReconnectionDelay(2000);
+  if (_serverUrl != null) {
+    options.enableForceNew(); // Nuovo socket dopo un redirect, non quello in cache
+  }
+  socket = IO.io(_serverUrl ?? BackendConfig.baseUrl, options.build());
 
   socket?.connect();
 
@@ -93,12 +111,26 @@ class SocketService {
     print('Connesso a Socket.IO');
     if (!_isListenersInitialized) {
       listenToEvents();
+      _externalListeners.forEach((event, callbacks) {
+        for (final callback in callbacks) {
+          socket?.on(event, callback);
+        }
+      });
       _isListenersInitialized = true;
     }
+    // Snapshot iniziale (o dopo una riconnessione) da cui applicare i delta
+    getLobbies();
+    // Evento rifiutato dal nodo precedente con 'lobby_redirect'
+    final pending = _pendingEmit;
+    if (pending != null) {
+      _pendingEmit = null;
+      socket?.emit(pending.key, pending.value);
+    }
   });
 
   socket?.on('disconnect', (reason) {
     print('Disconnesso da Socket.IO: $reason');
+    _lobbySeq = -1;
     if (reason == 'io server disconnect') {
       print('Tentativo di riconnessione immediata...');
       socket?.connect();
@@ -124,9 +156,28 @@ void startPing() {
 
   /// Metodo generico per ascoltare un evento specifico
   void on(String event, Function(dynamic) callback) {
+    _externalListeners.putIfAbsent(event, () => []).add(callback);
     socket?.on(event, callback);
   }
 
+  /// Si ricollega al nodo che gestisce la lobby e vi ripete l'evento rifiutato
+  Future<void> _switchServer(String url, String event, dynamic payload) async {
+    if (url == (_serverUrl ?? BackendConfig.baseUrl)) {
+      // Redirect verso il nodo attuale: si evita un ciclo di riconnessioni
+      _errorStreamController.add('Lobby non raggiungibile.');
+      return;
+    }
+    print('Lobby gestita da $url: riconnessione e nuovo invio di "$event".');
+    _pendingEmit = MapEntry(event, payload);
+    final oldSocket = socket;
+    socket = null;
+    oldSocket?.dispose();
+    _serverUrl = url;
+    _isListenersInitialized = false;
+    _lobbySeq = -1;
+    await connect();
+  }
+
   /// Emmette l'evento 'create_lobby' con i dati della lobby
   void createLobby(Map<String, dynamic> lobbyData) {
     print('Emettendo evento "create_lobby" con dati: $lobbyData');
@@ -159,7 +210,7 @@ void startPing() {
     });
   }
 
-  /// Emmette l'evento 'get_lobbies' per ottenere la lista delle lobby
+  /// Emmette l'evento 'get_lobbies' per ottenere lo snapshot delle lobby ('lobby_snapshot')
   void getLobbies() {
     print('Emettendo evento "get_lobbies"');
     socket?.emit('get_lobbies');
@@ -254,27 +305,64 @@ void startPing() {
 
   /// Configura i listener per gli eventi Socket.IO
   void listenToEvents() {
-  // Listener per l'evento 'update_lobbies'
-  _updateLobbiesListener = (data) {
+  // Listener per l'evento 'lobby_snapshot': { "seq": n, "lobbies": [...] }
+  _lobbySnapshotListener = (data) {
     if (_isDisposed) return;
-    print('Ricevuto evento "update_lobbies" con dati: $data'); // Log aggiuntivo
+    print('Ricevuto evento "lobby_snapshot" (seq ${data['seq']})');
     try {
-      List<Lobby> list = [];
+      _lobbyCache.clear();
       if (data['lobbies'] is List) {
         for (var lbJson in data['lobbies']) {
           if (lbJson is Map<String, dynamic>) {
-            list.add(Lobby.fromJson(lbJson));
+            final lobby = Lobby.fromJson(lbJson);
+            _lobbyCache[lobby.lobbyId] = lobby;
           }
         }
       }
-      _lobbiesStreamController.add(list);
+      _lobbySeq = data['seq'] is int ? data['seq'] : 0;
+      _lobbiesStreamController.add(_lobbyCache.values.toList());
     } catch (e) {
-      print('Errore nel listener "update_lobbies": $e');
-      _errorStreamController.add('Errore nel listener "update_lobbies": $e');
+      print('Errore nel listener "lobby_snapshot": $e');
+      _errorStreamController.add('Errore nel listener "lobby_snapshot": $e');
     }
   };
 
-  socket?.on('update_lobbies', _updateLobbiesListener);
+  // Listener per l'evento 'lobby_delta': { "seq": n, "added": [...], "updated": [...], "removed": [lobby_id, ...] }
+  _lobbyDeltaListener = (data) {
+    if (_isDisposed) return;
+    try {
+      final seq = data['seq'];
+      if (_lobbySeq < 0 || seq is! int) return; // In attesa dello snapshot
+      if (seq <= _lobbySeq) return; // Già contenuto nello snapshot
+      if (seq != _lobbySeq + 1) {
+        // Delta perso: si riparte da uno snapshot
+        print('Sequenza delle lobby interrotta ($_lobbySeq -> $seq), richiedo snapshot.');
+        _lobbySeq = -1;
+        getLobbies();
+        return;
+      }
+      for (var key in ['added', 'updated']) {
+        if (data[key] is List) {
+          for (var lbJson in data[key]) {
+            if (lbJson is Map<String, dynamic>) {
+              final lobby = Lobby.fromJson(lbJson);
+              _lobbyCache[lobby.lobbyId] = lobby;
+            }
+          }
+        }
+      }
+      if (data['removed'] is List) {
+        for (var lobbyId in data['removed']) {
+          _lobbyCache.remove(lobbyId);
+        }
+      }
+      _lobbySeq = seq;
+      _lobbiesStreamController.add(_lobbyCache.values.toList());
+    } catch (e) {
+      print('Errore nel listener "lobby_delta": $e');
+      _errorStreamController.add('Errore nel listener "lobby_delta": $e');
+    }
+  };
 
     // Listener per l'evento 'lobby_created'
     _lobbyCreatedListener = (data) {
@@ -325,6 +413,7 @@ void startPing() {
       try {
         if (data is Map && data["mode_chosen"] is String) {
           print('Modalità scelta: ${data["mode_chosen"]}');
+          _roundWords = data["words"] is List ? List<String>.from(data["words"]) : [];
           _voteResultStreamController.add(data["mode_chosen"]);
         } else {
           throw Exception('Dati "vote_result" non validi.');
@@ -386,8 +475,20 @@ void startPing() {
       }
     };
 
+    // Listener per l'evento 'lobby_redirect': { "lobby_id", "node", "url", "event", "data" }
+    _lobbyRedirectListener = (data) {
+      if (_isDisposed) return;
+      print('Ricevuto evento "lobby_redirect" con dati: $data');
+      if (data is Map && data['url'] is String && data['event'] is String) {
+        _switchServer(data['url'], data['event'], data['data']);
+      } else {
+        _errorStreamController.add('Dati "lobby_redirect" non validi.');
+      }
+    };
+
     // Registra i listener
-    socket?.on('update_lobbies', _updateLobbiesListener);
+    socket?.on('lobby_snapshot', _lobbySnapshotListener);
+    socket?.on('lobby_delta', _lobbyDeltaListener);
     socket?.on('lobby_created', _lobbyCreatedListener);
     socket?.on('joined_lobby', _joinedLobbyListener);
     socket?.on('game_started', _gameStartedListener);
@@ -396,6 +497,7 @@ void startPing() {
     socket?.on('start_timer', _startTimerListener);
     socket?.on('game_finished', _gameFinishedListener);
     socket?.on('error', _errorListener); // Aggiunto
+    socket?.on('lobby_redirect', _lobbyRedirectListener);
   }
 
   /// Dispose del servizio SocketService
@@ -404,7 +506,8 @@ void startPing() {
     _isDisposed = true;
 
     // Rimuove i listener
-    socket?.off('update_lobbies', _updateLobbiesListener);
+    socket?.off('lobby_snapshot', _lobbySnapshotListener);
+    socket?.off('lobby_delta', _lobbyDeltaListener);
     socket?.off('lobby_created', _lobbyCreatedListener);
     socket?.off('joined_lobby', _joinedLobbyListener);
     socket?.off('game_started', _gameStartedListener);
@@ -413,6 +516,7 @@ void startPing() {
     socket?.off('start_timer', _startTimerListener);
     socket?.off('game_finished', _gameFinishedListener);
     socket?.off('error', _errorListener); // Aggiunto
+    socket?.off('lobby_redirect', _lobbyRedirectListener);
 
     // Chiude i StreamControllers
     _lobbiesStreamController.close();